@@ -0,0 +1,414 @@
+#!/usr/bin/env python
+
+"""
+export many runs from the databroker to files, in parallel
+
+One file is written for each run, by a pool of worker processes.
+Runs already exported are skipped (so an interrupted export can be
+resumed).  With a manifest, runs which have changed since they were
+exported are written again.
+
+USAGE::
+
+    (base) user@hostname .../pwd $ apstools_export -h
+    usage: apstools_export [-h] [-f {json,nexus,npz,spec}] [-n WORKERS]
+                           [--since SINCE] [--until UNTIL] [-q KEY=VALUE]
+                           [-m MEMORY_MB] [--manifest MANIFEST]
+                           [--overwrite] [-v]
+                           catalog directory
+
+    export many runs from the databroker to files, in parallel
+
+    positional arguments:
+      catalog               name of databroker v2 catalog, such as
+                            mongodb_config
+      directory             write files into this directory
+
+    optional arguments:
+      -h, --help            show this help message and exit
+      -f {json,nexus,npz,spec}, --format {json,nexus,npz,spec}
+                            file format, default: json
+      -n WORKERS, --workers WORKERS
+                            number of worker processes, default: 4
+      --since SINCE         only runs since this date & time
+      --until UNTIL         only runs until this date & time
+      -q KEY=VALUE, --query KEY=VALUE
+                            only runs with this start document value (can be
+                            repeated), such as -q plan_name=count
+      -m MEMORY_MB, --memory MEMORY_MB
+                            memory limit (MB) of each worker process
+      --manifest MANIFEST   export only runs new or changed since recorded in
+                            this manifest (SQLite file)
+      --overwrite           export all runs again (default: skip runs
+                            already exported)
+      -v, --version         show program's version number and exit
+
+.. autosummary::
+
+   ~export_cli
+   ~export_file_name
+   ~export_runs
+"""
+
+#-----------------------------------------------------------------------------
+# :author:    Pete R. Jemian
+# :email:     jemian@anl.gov
+# :copyright: (c) 2017-2020, UChicago Argonne, LLC
+#
+# Distributed under the terms of the Creative Commons Attribution 4.0 International Public License.
+#
+# The full license is in the file LICENSE.txt, distributed with this software.
+#-----------------------------------------------------------------------------
+
+
+import argparse
+import databroker
+import databroker.queries
+from event_model import NumpyEncoder
+import h5py
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+import zipfile
+
+from .filewriters import NXWriter
+from .filewriters import SpecWriterCallback
+from .utils import ExportManifest
+from .utils import fetch_runs
+from .utils import npz_write_run
+from .utils import run_fingerprint
+
+try:
+    import resource     # not available on Windows
+except ImportError:
+    resource = None
+
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FILE_EXTENSIONS = dict(json="jsonl", nexus="hdf", npz="npz", spec="dat")
+EXPORT_FORMATS = list(EXPORT_FILE_EXTENSIONS)
+EXPORT_WORKERS = 4          # default number of worker processes
+
+_worker = {}                # state of this worker process
+
+
+def export_file_name(directory, uid, fmt):
+    """name of the file for run ``uid`` exported with format ``fmt``"""
+    return os.path.join(directory, f"{uid}.{EXPORT_FILE_EXTENSIONS[fmt]}")
+
+
+def export_runs(
+        cat,
+        directory,
+        fmt="json",
+        workers=None,
+        memory_limit=None,
+        resume=True,
+        progress=None,
+        manifest=None):
+    """
+    export each run in catalog ``cat`` to a file, in parallel
+
+    Runs are divided among a pool of worker processes.  Each worker
+    reads a run from the catalog and replays its documents through
+    the writer for ``fmt``:
+
+    ==========  ===============================  ==========================
+    fmt         writer                           file
+    ==========  ===============================  ==========================
+    ``json``    JSON Lines, as ``json_export``   ``{uid}.jsonl``
+    ``nexus``   :class:`~apstools.filewriters.NXWriter`   ``{uid}.hdf``
+    ``npz``     columns, as ``npz_export``       ``{uid}.npz``
+    ``spec``    :class:`~apstools.filewriters.SpecWriterCallback`   ``{uid}.dat``
+    ==========  ===============================  ==========================
+
+    A file is written with a temporary name, then renamed when complete.
+    A run is skipped (when ``resume`` is True) if its file exists.
+    With a ``manifest``, a run is skipped only if its file exists *and*
+    the run has not changed (see :func:`~apstools.utils.run_fingerprint`)
+    since it was recorded.  Each run exported is recorded.
+
+    PARAMETERS
+
+    cat : object
+        Instance of databroker v2 ``catalog`` (such as from a search)
+        or v1 ``Broker``.  Must be usable from another process
+        (such as ``databroker.catalog["mongodb_config"]``).
+    directory : str
+        Write the files into this directory.  (Created if needed.)
+    fmt : str
+        One of ``EXPORT_FORMATS``.
+        (default: ``json``)
+    workers : int
+        Number of worker processes.
+        (default: ``EXPORT_WORKERS``)
+    memory_limit : int
+        Limit (bytes) of the memory (address space) of each worker.
+        A run which needs more is reported as failed.  The ``nexus``
+        writer spills its buffers to scratch files above half of this.
+        (default: ``None``, no limit)
+    resume : bool
+        Skip runs which have been exported.
+        (default: ``True``)
+    progress : obj
+        Function called as each run is done:
+        ``progress(n, total, uid, status, seconds)``.
+        (default: ``None``)
+    manifest : str or :class:`~apstools.utils.ExportManifest`
+        Record of the runs exported.  The stop document of each run
+        is read (by a pool of threads) to compare with the manifest.
+        (default: ``None``)
+
+    RETURNS
+
+    dict:
+        ``{uid: status}`` where status is ``exported``, ``skipped``,
+        or ``failed: ...`` (with the reason).
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"fmt={fmt} not one of {EXPORT_FORMATS}")
+    cat = getattr(cat, "v2", cat)
+    directory = os.path.abspath(directory)
+    os.makedirs(directory, exist_ok=True)
+
+    if manifest is not None:
+        if not isinstance(manifest, ExportManifest):
+            manifest = ExportManifest(manifest)
+        recorded = manifest.fingerprints()
+        fingerprints = {
+            uid: run_fingerprint(stop)
+            for uid, start, stop, latency in fetch_runs(cat, workers)
+        }
+        uids = list(fingerprints)
+    else:
+        uids = list(cat)
+
+    def is_current(uid):
+        if not os.path.exists(export_file_name(directory, uid, fmt)):
+            return False
+        if manifest is None:
+            return True
+        return (
+            fingerprints[uid] is not None
+            and recorded.get(uid) == fingerprints[uid]
+        )
+
+    results = {}
+    todo = []
+    for uid in uids:
+        if resume and is_current(uid):
+            results[uid] = "skipped"
+        else:
+            todo.append(uid)
+    logger.info(
+        "exporting %d runs (%d skipped) to %s", len(todo), len(results), directory
+    )
+
+    workers = max(1, min(workers or EXPORT_WORKERS, len(todo)))
+    chunksize = max(1, len(todo) // (4 * workers))
+    if len(todo) > 0:
+        with multiprocessing.Pool(
+            workers,
+            initializer=_init_worker,
+            initargs=(cat, directory, fmt, memory_limit),
+        ) as pool:
+            runs = pool.imap_unordered(_export_run, todo, chunksize)
+            for n, (uid, status, seconds) in enumerate(runs, start=1):
+                results[uid] = status
+                if manifest is not None and status == "exported":
+                    manifest.record(
+                        uid,
+                        fingerprints[uid],
+                        export_file_name(directory, uid, fmt)
+                    )
+                if progress is not None:
+                    progress(n, len(todo), uid, status, seconds)
+
+    return {uid: results[uid] for uid in uids}
+
+
+def _init_worker(cat, directory, fmt, memory_limit):
+    """worker process: remember the export settings, limit the memory"""
+    if memory_limit is not None:
+        if resource is None:
+            logger.warning("memory_limit not available on %s", sys.platform)
+        else:
+            soft, hard = resource.getrlimit(resource.RLIMIT_AS)
+            resource.setrlimit(resource.RLIMIT_AS, (int(memory_limit), hard))
+    _worker.update(
+        cat=cat, directory=directory, fmt=fmt, memory_limit=memory_limit
+    )
+
+
+def _export_run(uid):
+    """worker process: export run ``uid``, return (uid, status, seconds)"""
+    t0 = time.time()
+    fmt = _worker["fmt"]
+    fname = export_file_name(_worker["directory"], uid, fmt)
+    # write with the final base name in a scratch directory beside it,
+    # then move into place: no partial file has the final name
+    scratch = tempfile.mkdtemp(prefix=".export-", dir=_worker["directory"])
+    partial = os.path.join(scratch, os.path.basename(fname))
+    try:
+        documents = _worker["cat"][uid].canonical(fill="no")
+        if fmt == "json":
+            with open(partial, "w") as fp:
+                for name, doc in documents:
+                    fp.write(json.dumps([name, doc], cls=NumpyEncoder))
+                    fp.write("\n")
+        elif fmt == "npz":
+            with zipfile.ZipFile(partial, "w", allowZip64=True) as zf:
+                npz_write_run(zf, documents)
+        elif fmt == "nexus":
+            writer = NXWriter()
+            writer.file_name = partial
+            if _worker["memory_limit"] is not None:
+                writer.spill_threshold = _worker["memory_limit"] // 2
+                writer.spill_directory = _worker["directory"]
+            for name, doc in documents:
+                writer.receiver(name, doc)
+            with h5py.File(partial, "r+") as root:
+                root.attrs["file_name"] = fname
+        else:
+            writer = SpecWriterCallback(filename=partial, auto_write=False)
+            for name, doc in documents:
+                writer.receiver(name, doc)
+            with open(partial, "w") as fp:
+                # as SpecWriterCallback.write_scan(), named as fname
+                fp.write("\n".join(writer.prepare_file_header(fname)))
+                fp.write("\n".join(writer.prepare_scan_contents() + [""]))
+        os.replace(partial, fname)
+        status = "exported"
+    except Exception as exc:   # such as MemoryError
+        logger.exception("export failed: uid=%s", uid)
+        status = f"failed: {exc!r}"
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+    return uid, status, time.time() - t0
+
+
+def get_args():
+    """
+    get command line arguments
+    """
+    from .__init__ import __version__
+    doc = __doc__.strip().splitlines()[0].strip()
+
+    parser = argparse.ArgumentParser(description=doc)
+
+    parser.add_argument('catalog', action='store',
+                        help="name of databroker v2 catalog, such as mongodb_config")
+
+    parser.add_argument('directory', action='store',
+                        help="write files into this directory")
+
+    # optional arguments
+    parser.add_argument('-f', '--format', action='store', dest='fmt',
+                        choices=EXPORT_FORMATS, default="json",
+                        help="file format, default: json")
+
+    parser.add_argument('-n', '--workers', action='store', type=int,
+                        default=EXPORT_WORKERS,
+                        help=f"number of worker processes, default: {EXPORT_WORKERS}")
+
+    parser.add_argument('--since', action='store',
+                        help="only runs since this date & time")
+
+    parser.add_argument('--until', action='store',
+                        help="only runs until this date & time")
+
+    text = """
+    only runs with this start document value (can be repeated),
+    such as -q plan_name=count
+    """
+    parser.add_argument('-q', '--query', action='append', dest='query',
+                        metavar='KEY=VALUE', help=text, default=[])
+
+    parser.add_argument('-m', '--memory', action='store', type=float,
+                        dest='memory_mb',
+                        help="memory limit (MB) of each worker process")
+
+    parser.add_argument('--manifest', action='store',
+                        help="export only runs new or changed since recorded in this manifest (SQLite file)")
+
+    parser.add_argument('--overwrite', action='store_false', dest='resume',
+                        help="export all runs again (default: skip runs already exported)")
+
+    parser.add_argument('-v', '--version',
+                        action='version', version=__version__)
+
+    return parser.parse_args()
+
+
+def parse_query(terms):
+    """``["key=value", ...]`` as dict, values are JSON (such as numbers) or text"""
+    query = {}
+    for term in terms:
+        parts = term.split("=", 1)
+        if len(parts) != 2:
+            raise ValueError(f"incorrect query {term}, must specify key=value")
+        key, value = parts[0].strip(), parts[1].strip()
+        try:
+            query[key] = json.loads(value)
+        except ValueError:
+            query[key] = value
+    return query
+
+
+def export_cli():
+    """
+    export runs from the databroker (command line)
+
+    Exit status is 1 if any run could not be exported.
+    """
+    args = get_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    cat = databroker.catalog[args.catalog]
+    time_range = {
+        k: v
+        for k, v in dict(since=args.since, until=args.until).items()
+        if v is not None
+    }
+    if len(time_range) > 0:
+        cat = cat.search(databroker.queries.TimeRange(**time_range))
+    query = parse_query(args.query)
+    if len(query) > 0:
+        cat = cat.search(query)
+
+    def progress(n, total, uid, status, seconds):
+        print(f"[{n}/{total}] {uid[:7]} {status} ({seconds:.2f}s)")
+
+    t0 = time.time()
+    memory_limit = None
+    if args.memory_mb is not None:
+        memory_limit = int(args.memory_mb * 1024 * 1024)
+    results = export_runs(
+        cat,
+        args.directory,
+        fmt=args.fmt,
+        workers=args.workers,
+        memory_limit=memory_limit,
+        resume=args.resume,
+        progress=progress,
+        manifest=args.manifest,
+    )
+
+    census = {}
+    for status in results.values():
+        key = status.split(":")[0]
+        census[key] = census.get(key, 0) + 1
+    summary = ", ".join([f"{k}={v}" for k, v in sorted(census.items())])
+    print(f"{len(results)} runs: {summary} in {time.time()-t0:.1f}s")
+    if census.get("failed", 0) > 0:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    export_cli()
@@ -7,9 +7,12 @@ about the state of the document sequence.
 
 .. autosummary::
 
+   ~ColumnBuffer
    ~FileWriterCallbackBase
    ~NXWriterAPS
    ~NXWriter
+   ~SpecDataFileReader
+   ~SpecScanIndex
    ~SpecWriterCallback
    ~spec_comment
 """
@@ -25,15 +28,23 @@ about the state of the document sequence.
 #-----------------------------------------------------------------------------
 
 
+import atexit
 from collections import OrderedDict
+import copy
 import datetime
+import event_model
 import getpass
 import h5py
+import json
 import logging
+import mmap
 import numpy as np
 import os
 import pyRestTable
+import queue
 import socket
+import tempfile
+import threading
 import time
 import yaml
 
@@ -42,8 +53,11 @@ logger = logging.getLogger(__name__)
 
 
 NEXUS_FILE_EXTENSION = "hdf"      # use this file extension for the output
+NEXUS_EXTERNAL_DATA_MODES = "copy link vds".split()    # NXWriter.external_data
+NEXUS_COPY_MEMORY_LIMIT = 64 * 1024 * 1024  # bytes: buffer to copy external data
 NEXUS_RELEASE = 'v2020.1'   # NeXus release to which this file is written
 SPEC_TIME_FORMAT = "%a %b %d %H:%M:%S %Y"
+SPEC_INDEX_FILE_EXTENSION = "idx"   # sidecar scan index: {spec_filename}.idx
 SCAN_ID_RESET_VALUE = 0
 
 
@@ -101,6 +115,310 @@ def _rebuild_scan_command(doc):
     return f"{scan_id}  {cmd}"
 
 
+class SpecScanIndex:
+    """
+    Index of the scans in a SPEC data file, kept in a sidecar file.
+
+    For each ``#S`` line in the SPEC data file, the index records
+    the scan number, the byte offset of the ``#S`` line, and the
+    run uid (from the ``#MD uid = ...`` line written by
+    :class:`~SpecWriterCallback`).  Repeated scan numbers are
+    made unique (``5``, ``5.1``, ``5.2``, ...) as in
+    ``spec2nexus.spec.SpecDataFile``.
+
+    The index is saved as JSON in ``{spec_filename}.idx`` with the
+    size and modification time of the data file.  :meth:`refresh`
+    reads only the part of the data file not yet indexed.  The
+    index is rebuilt from the full data file if it is found to be
+    stale (file was replaced, truncated, or changed in place).
+
+    .. autosummary::
+
+       ~clear
+       ~load
+       ~rebuild
+       ~refresh
+       ~save
+       ~scan_numbers
+    """
+
+    def __init__(self, spec_filename):
+        self.spec_filename = spec_filename
+        self.index_filename = f"{spec_filename}.{SPEC_INDEX_FILE_EXTENSION}"
+        self.clear()
+        self.load()
+
+    def __contains__(self, uid):
+        return uid in self.uids
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def clear(self):
+        """reset to an empty index"""
+        self.offsets = OrderedDict()    # byte offset of #S line, keyed by scan number
+        self.uids = {}                  # scan number, keyed by run uid
+        self.size = 0                   # number of bytes indexed
+        self.mtime = None               # data file modification time when indexed
+
+    def load(self):
+        """read the sidecar index file, if it exists"""
+        self.clear()
+        if not os.path.exists(self.index_filename):
+            return
+        try:
+            with open(self.index_filename, "r") as f:
+                index = json.load(f)
+            for scan_number, offset, uid in index["scans"]:
+                self._add(scan_number, offset, uid)
+            self.size = index["size"]
+            self.mtime = index["mtime"]
+        except (ValueError, KeyError, TypeError) as exc:
+            logger.warning(
+                "ignoring unreadable index file %s: %s",
+                self.index_filename, exc)
+            self.clear()
+
+    def save(self):
+        """write the sidecar index file"""
+        index = dict(
+            spec_file=os.path.basename(self.spec_filename),
+            size=self.size,
+            mtime=self.mtime,
+            scans=[
+                [k, v, self._uid_of.get(k)]
+                for k, v in self.offsets.items()
+            ],
+        )
+        tmp_filename = self.index_filename + ".tmp"
+        try:
+            with open(tmp_filename, "w") as f:
+                json.dump(index, f)
+            os.replace(tmp_filename, self.index_filename)
+        except OSError as exc:
+            logger.warning(
+                "could not write index file %s: %s",
+                self.index_filename, exc)
+
+    def rebuild(self):
+        """index the full data file"""
+        self.clear()
+        self._read_scans()
+
+    def refresh(self):
+        """
+        bring the index up to date with the data file
+
+        Only the content appended since the last refresh is read.
+        """
+        if not os.path.exists(self.spec_filename):
+            self.clear()
+            return
+        st = os.stat(self.spec_filename)
+        if st.st_size == self.size and st.st_mtime == self.mtime:
+            return          # up to date
+        if self._is_stale(st.st_size):
+            logger.info("rebuilding stale index: %s", self.index_filename)
+            self.clear()
+        self._read_scans()
+        self.save()
+
+    def scan_numbers(self):
+        """list of the scan numbers, in file order"""
+        return list(self.offsets.keys())
+
+    def _add(self, scan_number, offset, uid=None):
+        self.offsets[scan_number] = offset
+        if uid is not None:
+            self.uids[uid] = scan_number
+
+    @property
+    def _uid_of(self):
+        return {v: k for k, v in self.uids.items()}
+
+    def _is_stale(self, size):
+        """Has the already-indexed part of the data file changed?"""
+        if size < self.size:
+            return True
+        with open(self.spec_filename, "rb") as f:
+            if self.size > 0:
+                f.seek(self.size - 1)
+                if f.read(1) != b"\n":
+                    return True
+            if len(self.offsets) > 0:
+                f.seek(list(self.offsets.values())[-1])
+                if not f.read(3) == b"#S ":
+                    return True
+        return False
+
+    def _read_scans(self):
+        """index the data file, starting after the indexed part"""
+        with open(self.spec_filename, "rb") as f:
+            buf = _mmap_file(f)
+            # only complete lines, the last one may still be written
+            end = max(buf.rfind(b"\n") + 1, self.size)
+            for offset, label, next_offset in _spec_scan_offsets(buf, self.size, end):
+                scan_number = _unique_scan_number(label, self.offsets)
+                uid = None
+                p = buf.find(b"\n#MD uid = ", offset, next_offset)
+                if p >= 0:
+                    p += len(b"\n#MD uid = ")
+                    uid = _line_at(buf, p).strip().decode(errors="replace")
+                self._add(scan_number, offset, uid)
+            self.size = end
+            if isinstance(buf, mmap.mmap):
+                buf.close()
+        self.mtime = os.path.getmtime(self.spec_filename)
+
+
+class SpecDataFileReader:
+    """
+    Random-access reader for (large) SPEC data files.
+
+    The file is memory-mapped and the byte offset of each ``#S``
+    line is found in one pass.  The content of any scan is read
+    from its offset without parsing any other scans.
+
+    EXAMPLE::
+
+        with SpecDataFileReader("/tmp/cerium.spec") as reader:
+            print(reader.scan_numbers())
+            data = reader.get_scan_data("108")
+            print(data["Epoch"])
+
+    .. autosummary::
+
+       ~close
+       ~get_scan_data
+       ~get_scan_labels
+       ~get_scan_text
+       ~scan_numbers
+    """
+
+    def __init__(self, filename):
+        if not os.path.exists(filename):
+            raise IOError(f"file {filename} does not exist")
+        self.filename = filename
+        self._file = open(filename, "rb")
+        self._buf = _mmap_file(self._file)
+        self.offsets = OrderedDict()    # (start, end) of scan, keyed by scan number
+        for offset, label, next_offset in _spec_scan_offsets(self._buf):
+            scan_number = _unique_scan_number(label, self.offsets)
+            self.offsets[scan_number] = (offset, next_offset)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def close(self):
+        """release the memory-map and close the file"""
+        if isinstance(self._buf, mmap.mmap):
+            self._buf.close()
+        self._buf = b""
+        self._file.close()
+
+    def get_scan_data(self, scan_number):
+        """
+        data block of the scan as NumPy arrays
+
+        :param str scan_number: as given by :meth:`scan_numbers()`
+        :returns: OrderedDict of 1-D ``numpy.ndarray``, keyed by ``#L`` label
+        """
+        labels = []
+        rows = []
+        for line in self.get_scan_text(scan_number).splitlines():
+            if line.startswith("#L "):
+                labels = line[3:].strip().split("  ")
+            elif len(line.strip()) > 0 and not line.startswith("#"):
+                rows.append(line)
+        if len(rows) > 0:
+            table = np.loadtxt(rows, ndmin=2)
+        else:
+            table = np.empty((0, len(labels)))
+        return OrderedDict(
+            (label, table[:, i])
+            for i, label in enumerate(labels[:table.shape[1]])
+        )
+
+    def get_scan_labels(self, scan_number):
+        """column labels (from the ``#L`` line) of the scan"""
+        start, end = self.offsets[str(scan_number)]
+        p = self._buf.find(b"\n#L ", start, end)
+        if p < 0:
+            return []
+        p += len(b"\n#L ")
+        text = _line_at(self._buf, p).decode(errors="replace")
+        return text.strip().split("  ")
+
+    def get_scan_text(self, scan_number):
+        """full text of the scan, starting with the ``#S`` line"""
+        start, end = self.offsets[str(scan_number)]
+        return self._buf[start:end].decode(errors="replace")
+
+    def scan_numbers(self):
+        """list of the scan numbers, in file order"""
+        return list(self.offsets.keys())
+
+
+def _mmap_file(f):
+    """read-only memory-map of open file ``f`` (empty bytes if empty file)"""
+    if os.fstat(f.fileno()).st_size == 0:
+        return b""
+    return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def _spec_scan_offsets(buf, start=0, end=None):
+    """
+    locate the #S lines in ``buf`` (bytes or mmap)
+
+    ``start`` must be at the beginning of a line.
+
+    :returns: [(offset, scan_label, next_offset)] where ``next_offset``
+        is where the next scan starts (or ``end``)
+    """
+    end = len(buf) if end is None else end
+    offsets = []
+    if start == 0 and buf[:3] == b"#S ":
+        offsets.append(0)
+    p = buf.find(b"\n#S ", max(start - 1, 0), end)
+    while p >= 0:
+        offsets.append(p + 1)
+        p = buf.find(b"\n#S ", p + 1, end)
+
+    results = []
+    for i, offset in enumerate(offsets):
+        parts = _line_at(buf, offset, end).split()
+        if len(parts) < 2:
+            continue
+        next_offset = offsets[i+1] if i+1 < len(offsets) else end
+        results.append((offset, parts[1].decode(errors="replace"), next_offset))
+    return results
+
+
+def _line_at(buf, start, end=None):
+    """the line in ``buf`` from ``start`` (without the newline)"""
+    end = len(buf) if end is None else end
+    p = buf.find(b"\n", start, end)
+    if p < 0:
+        p = end
+    return buf[start:p]
+
+
+def _unique_scan_number(label, existing):
+    """repeated scan numbers become 5, 5.1, 5.2, ... (as spec2nexus)"""
+    scan_number = label
+    i = 0
+    while scan_number in existing:
+        i += 1
+        scan_number = f"{label}.{i}"
+    return scan_number
+
+
 # TODO: consider refactor to use FileWriterCallbackBase()
 class SpecWriterCallback(object):
     """
@@ -134,6 +452,25 @@ class SpecWriterCallback(object):
         highest scan number in existing SPEC data file.
         default: False
 
+        The scan numbers and run uids in the SPEC data file are found
+        from a :class:`~SpecScanIndex` kept in a sidecar file
+        (``{filename}.idx``).
+
+    streaming : boolean, optional
+        If True, write the scan header (``#S``, ``#D``, ``#C``, ``#MD``,
+        ``#L``) once the *primary* ``descriptor`` document is received,
+        append each data row as its ``event`` document is received,
+        and only add the trailing comments when the *stop* document
+        is received.  Memory use does not grow with the number of
+        points in the scan.  (``auto_write`` has no effect on
+        streamed scans.)
+        default: False
+
+    use_descriptor_precision : boolean, optional
+        If True, round floating point data columns to the
+        ``precision`` given for that signal in the descriptor document.
+        default: False
+
     User Interface methods
 
     .. autosummary::
@@ -143,6 +480,7 @@ class SpecWriterCallback(object):
        ~usefile
        ~make_default_filename
        ~clear
+       ~prepare_file_header
        ~prepare_scan_contents
        ~write_scan
 
@@ -154,8 +492,10 @@ class SpecWriterCallback(object):
        ~start
        ~descriptor
        ~event
+       ~event_page
        ~bulk_events
        ~datum
+       ~datum_page
        ~resource
        ~stop
     """
@@ -164,11 +504,15 @@ class SpecWriterCallback(object):
     # writes one or more scans to a SPEC data file using a jupyter notebook.
 
 
-    def __init__(self, filename=None, auto_write=True, RE=None, reset_scan_id=False):
+    def __init__(self, filename=None, auto_write=True, RE=None, reset_scan_id=False, streaming=False, use_descriptor_precision=False):
+        self._scan_index = None
         self.clear()
         self.buffered_comments = self._empty_comments_dict()
         self.spec_filename = filename
         self.auto_write = auto_write
+        self.streaming = streaming
+        self.stream_flush_interval = 1.0    # seconds between flushes when streaming
+        self.use_descriptor_precision = use_descriptor_precision
         self.uid_short_length = 8
         self.write_file_header = False
         self.spec_epoch = None      # for both #E & #D line in header, also offset for all scans
@@ -191,6 +535,12 @@ class SpecWriterCallback(object):
 
     def clear(self):
         """reset all scan data defaults"""
+        if getattr(self, "_stream_file", None) is not None:
+            # previous scan did not end with a stop document
+            self._stream_file.close()
+        self._stream_file = None            # open file while streaming a scan
+        self._stream_last_flush = None
+        self._streamed_comments = {}        # number of comments already streamed
         self.uid = None
         self.scan_epoch = None      # absolute epoch to report in scan #D line
         self.time = None            # full time from document
@@ -208,6 +558,7 @@ class SpecWriterCallback(object):
         # wait for case with baseline data that needs #O/#P lines
         #
         self.columns = OrderedDict()        # #L in scan
+        self.precisions = {}                # from descriptor, keyed by #L label
         self.scan_command = None            # #S line
         self.scanning = False
 
@@ -236,8 +587,10 @@ class SpecWriterCallback(object):
             start = self.start,
             descriptor = self.descriptor,
             event = self.event,
+            event_page = self.event_page,
             bulk_events = self.bulk_events,
             datum = self.datum,
+            datum_page = self.datum_page,
             resource = self.resource,
             stop = self.stop,
         )
@@ -246,10 +599,13 @@ class SpecWriterCallback(object):
             uid = document.get("uid") or document.get("datum_id")
             logger.debug("%s document, uid=%s", key, str(uid))
             ts = document.get("time")
+            if isinstance(ts, list):
+                # event_page: use the most recent time
+                ts = ts[-1] if len(ts) > 0 else None
             if ts is None:
                 ts = datetime.datetime.now()
             else:
-                ts = datetime.datetime.fromtimestamp(document["time"])
+                ts = datetime.datetime.fromtimestamp(ts)
             self._datetime = ts
             xref[key](document)
         else:
@@ -344,6 +700,14 @@ class SpecWriterCallback(object):
         epoch_keys = "Epoch_float Epoch".split()
 
         self.data.update({k: [] for k in first_keys+epoch_keys+middle_keys+last_keys})
+        self.precisions.update({
+            k: v["precision"]
+            for k, v in doc["data_keys"].items()
+            if isinstance(v.get("precision"), int)
+        })
+
+        if self.streaming:
+            self._start_streaming()
 
     def event(self, doc):
         """
@@ -359,6 +723,7 @@ class SpecWriterCallback(object):
                     msg = f"unexpected failure here, key {k} not found"
                     raise KeyError(msg)
                     #return                  # not our expected event data
+            row = []
             for k in self.data.keys():
                 if k == "Epoch":
                     v = int(doc["time"] - self.time + 0.5)
@@ -366,17 +731,65 @@ class SpecWriterCallback(object):
                     v = doc["time"] - self.time
                 else:
                     v = doc["data"].get(k, 0)   # like SPEC, default to 0 if not found by name
-                self.data[k].append(v)
-            self.num_primary_data += 1
+                row.append(v)
+            self._append_columns([[v] for v in row], 1)
+
+    def event_page(self, doc):
+        """
+        handle *event_page* documents
+
+        The page is taken in column by column.
+        """
+        stream_doc = self._streams.get(doc["descriptor"])
+        if stream_doc is None:
+            fmt = "descriptor UID {} not found"
+            raise KeyError(fmt.format(doc["descriptor"]))
+        if stream_doc["name"] == "primary":
+            for k in doc["data"].keys():
+                if k not in self.data.keys():
+                    msg = f"unexpected failure here, key {k} not found"
+                    raise KeyError(msg)
+            num_rows = len(doc["time"])
+            if num_rows == 0:
+                return
+            t = np.asarray(doc["time"], dtype=float) - self.time
+            columns = []
+            for k in self.data.keys():
+                if k == "Epoch":
+                    v = (t + 0.5).astype(int).tolist()
+                elif k == "Epoch_float":
+                    v = t.tolist()
+                else:
+                    # like SPEC, default to 0 if not found by name
+                    v = doc["data"].get(k, [0] * num_rows)
+                columns.append(v)
+            self._append_columns(columns, num_rows)
+
+    def _append_columns(self, columns, num_rows):
+        """add rows of primary data, given as columns in order of ``self.data``"""
+        if self._stream_file is not None:
+            self._write_stream_lines(
+                self._format_data_rows(self.num_primary_data, columns))
+        else:
+            for k, v in zip(self.data.keys(), columns):
+                self.data[k].extend(v)
+        self.num_primary_data += num_rows
 
     def bulk_events(self, doc):
-        """handle *bulk_events* documents"""
-        pass
+        """handle *bulk_events* documents (deprecated, as *event_page* documents)"""
+        for events in doc.values():
+            if len(events) > 0:
+                self.event_page(event_model.pack_event_page(*events))
 
     def datum(self, doc):
         """handle *datum* documents"""
         self._cmt("datum", "datum " + str(doc))
 
+    def datum_page(self, doc):
+        """handle *datum_page* documents"""
+        for datum in event_model.unpack_datum_page(doc):
+            self.datum(datum)
+
     def resource(self, doc):
         """handle *resource* documents"""
         self._cmt("resource", "resource " + str(doc))
@@ -391,7 +804,9 @@ class SpecWriterCallback(object):
         else:
             self._cmt("stop", "exit_status = not available")
 
-        if self.auto_write:
+        if self._stream_file is not None:
+            self._finish_streaming()
+        elif self.auto_write:
             self.write_scan()
 
         self.scanning = False
@@ -402,6 +817,14 @@ class SpecWriterCallback(object):
 
         :returns: [str] a list of lines to append to the data file
         """
+        lines = self._scan_header_lines()
+        if len(self.data.keys()) > 0 and self.num_primary_data > 0:
+            lines += self._format_data_rows(0, list(self.data.values()))
+        lines += self._scan_trailer_lines()
+        return lines
+
+    def _scan_header_lines(self):
+        """format the scan header, up to the #L line"""
         dt = datetime.datetime.fromtimestamp(self.scan_epoch)
         lines = []
         lines.append("")
@@ -425,25 +848,83 @@ class SpecWriterCallback(object):
         lines.append("#N " + str(len(self.data.keys())))
         if len(self.data.keys()) > 0:
             lines.append("#L " + "  ".join(self.data.keys()))
-            for i in range(self.num_primary_data):
-                str_data = OrderedDict()
-                s = []
-                for k in self.data.keys():
-                    datum = self.data[k][i]
-                    if isinstance(datum, str):
-                        # SPEC scan data is expected to be numbers
-                        # this is text, substitute the row number
-                        # and report after this line in a #U line
-                        str_data[k] = datum
-                        datum = i
-                    s.append(str(datum))
-                lines.append(" ".join(s))
-                for k in str_data.keys():
-                    # report the text data
-                    lines.append(f"#U {i} {k} {str_data[k]}")
         else:
             lines.append("#C no data column labels identified")
+        return lines
+
+    def _format_column(self, key, values, first):
+        """
+        format one column of scan data, all rows at once
+
+        Columns of one numeric type are formatted as NumPy arrays.
+        SPEC scan data is expected to be numbers: a text value
+        is replaced by its row number and reported in a #U line.
+        Columns of mixed types are formatted cell by cell, as
+        ``str()`` of each value.
+
+        :returns: (cells, text) where ``text`` is a
+            dict of text values, keyed by row number
+        """
+        precision = self.precisions.get(key)
+        if not self.use_descriptor_precision:
+            precision = None
+        types = set(map(type, values))
+        if types == {str}:
+            rows = range(first, first + len(values))
+            return [str(i) for i in rows], dict(zip(rows, values))
+        if len(types) == 1:
+            try:
+                arr = np.asarray(values)
+            except ValueError:          # ragged content
+                arr = None
+            if arr is not None and arr.ndim == 1 and arr.dtype.kind in "biuf":
+                if precision is not None and arr.dtype.kind == "f":
+                    arr = np.round(arr, precision)
+                return arr.astype(str), {}
+
+        # mixed or non-scalar content: cell by cell
+        cells = []
+        text = {}
+        for i, datum in enumerate(values, start=first):
+            if isinstance(datum, str):
+                text[i] = datum
+                datum = i
+            elif precision is not None and isinstance(datum, float):
+                datum = round(datum, precision)
+            cells.append(str(datum))
+        return cells, text
+
+    def _format_data_rows(self, first, columns):
+        """
+        format rows of scan data
+
+        :param int first: row number (starting from zero) of first row
+        :param [[obj]] columns: values, in order of ``self.data.keys()``
+        :returns: [str] the data lines, each followed by any #U lines
+        """
+        cells = []
+        text = []
+        for k, values in zip(self.data.keys(), columns):
+            c, t = self._format_column(k, values, first)
+            cells.append(c)
+            if len(t) > 0:
+                text.append((k, t))
+        rows = [" ".join(row) for row in zip(*cells)]
+        if len(text) == 0:
+            return rows
 
+        lines = []
+        for i, row in enumerate(rows, start=first):
+            lines.append(row)
+            for k, t in text:
+                if i in t:
+                    # report the text data
+                    lines.append(f"#U {i} {k} {t[i]}")
+        return lines
+
+    def _scan_trailer_lines(self):
+        """format the comments that follow the scan data"""
+        lines = []
         for v in self.comments["event"]:
             lines.append("#C " + v)
 
@@ -463,18 +944,81 @@ class SpecWriterCallback(object):
         with open(self.spec_filename, mode) as f:
             f.write("\n".join(lines))
 
-    def write_header(self):
-        """write the header section of a SPEC data file"""
+    def _start_streaming(self):
+        """write the scan header and keep the file open for data rows"""
+        self._check_uid_not_in_file()
+        if self.write_file_header:
+            self.write_header()
+            logger.info("wrote header to SPEC file: %s", self.spec_filename)
+        lines = self._scan_header_lines()
+        # comments received after this are written with the trailer
+        self._streamed_comments = {
+            k: len(self.comments[k])
+            for k in ("start", "descriptor")
+        }
+        self._stream_file = open(self.spec_filename, "a")
+        self._stream_last_flush = time.time()
+        self._write_stream_lines(lines)
+
+    def _write_stream_lines(self, lines):
+        """append lines to the streamed scan, flush periodically"""
+        self._stream_file.write("\n".join(lines) + "\n")
+        if time.time() - self._stream_last_flush >= self.stream_flush_interval:
+            self._stream_file.flush()
+            self._stream_last_flush = time.time()
+
+    def _finish_streaming(self):
+        """write the trailing comments and close the streamed scan"""
+        lines = []
+        for k, n in self._streamed_comments.items():
+            lines += ["#C " + v for v in self.comments[k][n:]]
+        lines += self._scan_trailer_lines()
+        if len(lines) > 0:
+            self._stream_file.write("\n".join(lines) + "\n")
+        self._stream_file.close()
+        self._stream_file = None
+        self.scan_index.refresh()
+        logger.info("wrote scan %d to SPEC file: %s", self.scan_id, self.spec_filename)
+
+    def _check_uid_not_in_file(self):
+        """raise ValueError if the scan uid is already in the file"""
+        index = self.scan_index
+        index.refresh()
+        if self.uid in index:
+            # raise exception if uid is already in the file!
+            msg = f"{self.spec_filename} already contains uid={self.uid}"
+            raise ValueError(msg)
+
+    @property
+    def scan_index(self):
+        """:class:`~SpecScanIndex` of the SPEC data file"""
+        index = self._scan_index
+        if index is None or index.spec_filename != self.spec_filename:
+            index = self._scan_index = SpecScanIndex(self.spec_filename)
+        return index
+
+    def prepare_file_header(self, filename=None):
+        """
+        format the header section of a SPEC data file
+
+        :param str filename: name recorded in the ``#F`` line
+            (default: ``self.spec_filename``)
+        :returns: [str] a list of lines to write at the start of the file
+        """
         dt = datetime.datetime.fromtimestamp(self.spec_epoch)
         lines = []
-        lines.append(f"#F {self.spec_filename}")
+        lines.append(f"#F {filename or self.spec_filename}")
         lines.append(f"#E {self.spec_epoch}")
         lines.append(f"#D {datetime.datetime.strftime(dt, SPEC_TIME_FORMAT)}")
         lines.append(f"#C Bluesky  user = {self.spec_user}  host = {self.spec_host}")
         lines.append("#O0 ")
         lines.append("#o0 ")
         lines.append("")
+        return lines
 
+    def write_header(self):
+        """write the header section of a SPEC data file"""
+        lines = self.prepare_file_header()
         if os.path.exists(self.spec_filename):
             lines.insert(0, "")
         self._write_lines_(lines, mode="a+")
@@ -490,14 +1034,7 @@ class SpecWriterCallback(object):
 
         note:  does nothing if there are no lines to be written
         """
-        if os.path.exists(self.spec_filename):
-            with open(self.spec_filename) as f:
-                buf = f.read()
-                if buf.find(self.uid) >= 0:
-                    # raise exception if uid is already in the file!
-                    msg = f"{self.spec_filename} already contains uid={self.uid}"
-                    raise ValueError(msg)
-        logger = logging.getLogger(__name__)
+        self._check_uid_not_in_file()
         lines = self.prepare_scan_contents()
         lines.append("")
         if lines is not None:
@@ -505,6 +1042,7 @@ class SpecWriterCallback(object):
                 self.write_header()
                 logger.info("wrote header to SPEC file: %s", self.spec_filename)
             self._write_lines_(lines, mode="a")
+            self.scan_index.refresh()
             logger.info("wrote scan %d to SPEC file: %s", self.scan_id, self.spec_filename)
 
     def make_default_filename(self):
@@ -520,15 +1058,15 @@ class SpecWriterCallback(object):
         """
         self.clear()
         filename = filename or self.make_default_filename()
+        self.spec_filename = filename
         if os.path.exists(filename):
-            from spec2nexus.spec import SpecDataFile
-            sdf = SpecDataFile(filename)
-            scan_list = sdf.getScanNumbers()
+            index = self.scan_index
+            index.refresh()
+            scan_list = index.scan_numbers()
             l = len(scan_list)
             m = max(map(float, scan_list))
             highest = int(max(l, m) + 0.9999)     # solves issue #128
             scan_id = max(scan_id or 0, highest)
-        self.spec_filename = filename
         self.spec_epoch = int(time.time())  # ! no roundup here!!!
         self.spec_host = socket.gethostname() or 'localhost'
         self.spec_user = getpass.getuser() or 'BlueskyUser'
@@ -578,16 +1116,14 @@ class SpecWriterCallback(object):
             if len(p) > 4 and p[2] == "user":
                 username = p[4]
 
-            # find the highest scan number used
-            key = "#S"
-            scan_ids = []
-            for line in f.readlines():
-                if line.startswith(key+" ") and len(line.split())>1:
-                    scan_id = int(line.split()[1])
-                    scan_ids.append(scan_id)
-            scan_id = max(scan_ids)
-
         self.spec_filename = filename
+
+        # find the highest scan number used
+        index = self.scan_index
+        index.refresh()
+        scan_ids = [int(float(k)) for k in index.scan_numbers()]
+        scan_id = max(scan_ids)
+
         self.spec_epoch = epoch
         self.spec_user = username
         return scan_id
@@ -669,6 +1205,245 @@ def spec_comment(comment, doc=None, writer=None):
         writer._cmt(doc, line)
 
 
+class ColumnBuffer:
+    """
+    Growable column of data (one row per event), stored in a NumPy array.
+
+    The storage array is allocated for more rows than are used
+    and grows geometrically (doubles) when full.  Each row
+    has the same ``shape``.  A ``shape`` given before any rows are
+    received is replaced by the shape of the first rows, if different.
+    Values that cannot be stored
+    with the ``dtype`` (such as ``None``, or rows of a different shape)
+    change the storage to ``dtype=object`` (like a Python list).
+
+    Call :meth:`spill` to move the storage to a (temporary)
+    memory-mapped scratch file on disk.  The buffer is used the same way
+    after that.  The scratch file is removed by :meth:`clear` (or
+    when the buffer is deleted).
+
+    PARAMETERS
+
+    dtype
+        *str* or *numpy.dtype* :
+        data type of each value (default: ``None`` means
+        decide from the first values received)
+
+    shape
+        *tuple* :
+        shape of each row (default: ``None`` means
+        decide from the first values received)
+
+    .. autosummary::
+
+       ~append
+       ~array
+       ~clear
+       ~extend
+       ~from_data_key
+       ~nbytes
+       ~on_disk
+       ~spill
+    """
+
+    initial_bytes = 1024 * 1024     # limit first allocation (large rows)
+    initial_rows = 16               # first allocation (small rows)
+
+    def __init__(self, dtype=None, shape=None):
+        self.dtype = None if dtype is None else np.dtype(dtype)
+        self.shape = None if shape is None else tuple(shape)
+        self._scratch = None
+        self._scratch_directory = None
+        self.clear()
+
+    @classmethod
+    def from_data_key(cls, entry):
+        """
+        make a buffer for the descriptor ``data_keys`` ``entry``
+
+        Strings and the datum ids of externally-stored data are
+        stored as objects.  Each row of other data is expected to have
+        the ``shape`` given in the ``entry`` (the shape of the first
+        rows received is used, if different).  The NumPy data type is decided
+        from the first values received (the ``dtype`` of an ``entry``,
+        such as ``number``, does not say how many bits) and promoted,
+        if needed, by later values (such as ``int64`` to ``float64``).
+        """
+        if entry.get("external") is not None or entry.get("dtype") == "string":
+            return cls(dtype=object)
+        shape = entry.get("shape") or []
+        if not all(isinstance(n, int) and n > 0 for n in shape):
+            shape = None    # decide from the first values
+        return cls(shape=shape)
+
+    def __array__(self, dtype=None, copy=None):
+        if dtype is None and not copy:
+            return self.array
+        return np.array(self.array, dtype=dtype)
+
+    def __eq__(self, other):
+        if isinstance(other, ColumnBuffer):
+            other = other.array
+        elif not isinstance(other, (list, tuple, np.ndarray)):
+            return NotImplemented
+        return len(self) == len(other) and np.array_equal(self.array, other)
+
+    def __getitem__(self, key):
+        return self.array[key]
+
+    def __iter__(self):
+        return iter(self.array)
+
+    def __len__(self):
+        return self._length
+
+    def __repr__(self):
+        return (
+            f"{self.__class__.__name__}"
+            f"(dtype={self.dtype}, shape={self.shape}, rows={len(self)})"
+        )
+
+    @property
+    def array(self):
+        """the rows received (a view of the storage, not a copy)"""
+        if self._storage is None:
+            return np.empty((0,) + (self.shape or ()), dtype=self.dtype or float)
+        return self._storage[:self._length]
+
+    @property
+    def nbytes(self):
+        """bytes of storage in memory (not counting storage on disk)"""
+        if self._storage is None or self.on_disk:
+            return 0
+        return self._storage.nbytes
+
+    @property
+    def on_disk(self):
+        """is the storage in a scratch file?"""
+        return self._scratch is not None
+
+    def append(self, value):
+        """add one row"""
+        self.extend([value])
+
+    def clear(self):
+        """remove all rows (and the storage)"""
+        self._storage = None
+        self._length = 0
+        if self._scratch is not None:
+            self._scratch.close()   # temporary file is removed
+            self._scratch = None
+
+    def spill(self, directory=None):
+        """
+        move the storage to a memory-mapped scratch file
+
+        The scratch file is a temporary file in ``directory``
+        (default: the system's directory for temporary files).
+        Nothing is moved if the storage is empty, already on disk,
+        or stores objects.
+        """
+        if self.on_disk or self._storage is None or self.dtype == object:
+            return
+        self._scratch_directory = directory
+        self._scratch = tempfile.TemporaryFile(
+            prefix="apstools-", suffix=".buffer", dir=directory
+        )
+        storage = np.memmap(
+            self._scratch, dtype=self.dtype, mode="w+", shape=self._storage.shape
+        )
+        storage[:self._length] = self._storage[:self._length]
+        self._storage = storage
+
+    def extend(self, values):
+        """add rows (such as the column of an *event_page*)"""
+        if len(values) == 0:
+            return
+        if self.dtype == object:
+            rows = np.empty(len(values), dtype=object)
+            for i, value in enumerate(values):
+                rows[i] = value
+        else:
+            try:
+                rows = np.asarray(values)
+                if rows.dtype == object:
+                    raise TypeError("not numeric")
+                if self.shape is not None and rows.shape[1:] != self.shape:
+                    if len(self) > 0:
+                        raise ValueError("shape")   # ragged rows
+                    # descriptor shape is not the shape received
+                    # (such as a waveform with NORD < NELM)
+                    self.clear()
+                    self.shape = None
+                dtype = self.dtype
+                if dtype is None:
+                    dtype = rows.dtype
+                elif (dtype.kind in "SU") != (rows.dtype.kind in "SU"):
+                    raise TypeError("numbers and text")
+                elif not np.can_cast(rows.dtype, dtype):
+                    # keep all the information (such as: int64 to float64)
+                    dtype = np.result_type(dtype, rows.dtype)
+            except (TypeError, ValueError):     # also DTypePromotionError
+                self._use_objects()
+                self.extend(values)
+                return
+            if self.shape is None:
+                self.shape = rows.shape[1:]
+            if self.dtype is None or dtype != self.dtype:
+                self.dtype = dtype
+                if self._storage is not None:
+                    self._promote_storage()
+        self._reserve(self._length + len(rows))
+        self._storage[self._length:self._length + len(rows)] = rows
+        self._length += len(rows)
+
+    def _allocate(self, rows):
+        """new storage for ``rows`` rows, filled from the old storage"""
+        shape = (rows,) + (self.shape or ())
+        if self.on_disk:
+            # grow the scratch file, rows already written stay in place
+            self._storage.flush()
+            storage = np.memmap(self._scratch, dtype=self.dtype, mode="r+", shape=shape)
+        else:
+            storage = np.empty(shape, dtype=self.dtype)
+            if self._storage is not None:
+                storage[:self._length] = self._storage[:self._length]
+        self._storage = storage
+
+    def _promote_storage(self):
+        """convert the storage to ``self.dtype``"""
+        storage = np.array(self._storage, dtype=self.dtype)
+        if self.on_disk:
+            directory = self._scratch_directory
+            self._scratch.close()
+            self._scratch = None
+            self._storage = storage
+            self.spill(directory)
+        else:
+            self._storage = storage
+
+    def _reserve(self, rows):
+        """grow the storage (if needed) to hold at least ``rows`` rows"""
+        capacity = 0 if self._storage is None else len(self._storage)
+        if rows <= capacity:
+            return
+        if capacity == 0:
+            row_bytes = np.dtype(self.dtype).itemsize * int(np.prod(self.shape or ()))
+            capacity = max(1, min(self.initial_rows, self.initial_bytes // max(1, row_bytes)))
+        while capacity < rows:
+            capacity *= 2
+        self._allocate(capacity)
+
+    def _use_objects(self):
+        """store (any) values as objects, such as a Python list"""
+        rows = list(self.array)
+        self.dtype = np.dtype(object)
+        self.shape = ()
+        self.clear()
+        if len(rows) > 0:
+            self.extend(rows)
+
+
 class FileWriterCallbackBase:
     """
     Base class for filewriter callbacks.
@@ -681,11 +1456,35 @@ class FileWriterCallbackBase:
     Content is collected here from each document until the stop document.
     The content is written once the stop document is received.
 
+    The data (and timestamps) of each signal in a stream are collected
+    in a :class:`ColumnBuffer`, a NumPy array with rows of the ``shape``
+    from the descriptor document.  The ``writer()`` method
+    can read these arrays directly (``buffer.array``).
+
+    On very long runs, the buffers could use all the available memory.
+    When ``spill_threshold`` is set (bytes), the largest buffers are moved
+    (after an *event* or *event_page*) to memory-mapped scratch files
+    in ``spill_directory`` until the buffers in memory use no more
+    than ``spill_threshold``.  The ``writer()`` method reads the arrays
+    the same way.  The scratch files are removed when the buffers are
+    deleted (such as when the next run starts).
+
+    When ``background_writer`` is True, the ``writer()`` method
+    is called from a worker thread so the next run can start without
+    waiting for the file to be written.  The content of the run is
+    handed to the worker when the stop document is received.  At most
+    ``background_queue_size`` runs wait to be written, then the
+    stop document handler waits (back-pressure).  Call ``flush()``
+    to wait for all queued runs to be written.  Runs still queued
+    when the Python session ends are written before it exits
+    (``join()`` is registered with :mod:`atexit`).
 
     User Interface methods
 
     .. autosummary::
 
+       ~flush
+       ~join
        ~receiver
 
     Internal methods
@@ -702,8 +1501,10 @@ class FileWriterCallbackBase:
 
        ~bulk_events
        ~datum
+       ~datum_page
        ~descriptor
        ~event
+       ~event_page
        ~resource
        ~start
        ~stop
@@ -712,22 +1513,92 @@ class FileWriterCallbackBase:
     file_extension = "dat"
     file_name = None
     file_path = None
+    background_writer = False   # call writer() from a worker thread
+    background_queue_size = 2   # runs waiting for the background writer
+    spill_threshold = None      # bytes: above this, move column buffers to disk
+    spill_directory = None      # directory for scratch files (None: system default)
 
     # convention: methods written in alphabetical order
 
     def __init__(self, *args, **kwargs):
         """Initialize: clear and reset."""
         self.clear()
+        self.writer_errors = []     # (uid, exception) from background writer
+        self._writer_queue = None
+        self._writer_thread = None
         self.xref = dict(
             bulk_events = self.bulk_events,
             datum = self.datum,
+            datum_page = self.datum_page,
             descriptor = self.descriptor,
             event = self.event,
+            event_page = self.event_page,
             resource = self.resource,
             start = self.start,
             stop = self.stop,
             )
 
+    def _background_writer_(self):
+        """worker thread: write each run received from the queue"""
+        while True:
+            run = self._writer_queue.get()
+            try:
+                if run is None:
+                    break
+                run.writer()
+            except Exception as exc:
+                logger.exception("background writer, uid=%s", run.uid)
+                self.writer_errors.append((run.uid, exc))
+            finally:
+                self._writer_queue.task_done()
+
+    def flush(self):
+        """
+        wait until the background writer has written all queued runs
+
+        Raises ``RuntimeError`` if any of those runs could not be
+        written.  (Details are in the log.)
+        """
+        if self._writer_queue is not None:
+            self._writer_queue.join()
+        if len(self.writer_errors) > 0:
+            errors, self.writer_errors = self.writer_errors, []
+            uid, exc = errors[0]
+            raise RuntimeError(
+                f"{len(errors)} run(s) not written,"
+                f" first: uid={uid}: {exc!r}"
+            ) from exc
+
+    def join(self):
+        """write all queued runs (see ``flush()``), then stop the background writer"""
+        if self._writer_thread is not None:
+            atexit.unregister(self.join)
+            self._writer_queue.put(None)
+            self._writer_thread.join()
+            self._writer_queue = None
+            self._writer_thread = None
+        self.flush()
+
+    def _spill_buffers_(self):
+        """move the largest column buffers to disk, if above ``spill_threshold``"""
+        buffers = [
+            v[key]
+            for acquisition in self.acquisitions.values()
+            for v in acquisition["data"].values()
+            for key in ("data", "time")
+        ]
+        in_memory = sum([buf.nbytes for buf in buffers])
+        if in_memory <= self.spill_threshold:
+            return
+        for buf in sorted(buffers, key=lambda buf: buf.nbytes, reverse=True):
+            nbytes = buf.nbytes
+            buf.spill(self.spill_directory)
+            if buf.on_disk:
+                in_memory -= nbytes
+                logger.debug("spilled %d bytes to disk: %s", nbytes, buf)
+            if in_memory <= self.spill_threshold:
+                break
+
     def receiver(self, key, doc):
         """
         bluesky callback (handles a stream of documents)
@@ -839,9 +1710,9 @@ class FileWriterCallbackBase:
         """Deprecated. Use EventPage instead."""
         if not self.scanning:
             return
-        logger.info("not handled yet")
-        logger.info(doc)
-        logger.info("-"*40)
+        for events in doc.values():
+            if len(events) > 0:
+                self.event_page(event_model.pack_event_page(*events))
 
     def datum(self, doc):
         """
@@ -863,6 +1734,15 @@ class FileWriterCallbackBase:
         ext = self.externals[doc["datum_id"]] = dict(doc)
         ext["_document_type_"] = "datum"
 
+    def datum_page(self, doc):
+        """
+        a "page" of datum documents, taken one by one
+        """
+        if not self.scanning:
+            return
+        for datum in event_model.unpack_datum_page(doc):
+            self.datum(datum)
+
     def descriptor(self, doc):
         """
         description of the data stream to be acquired
@@ -893,8 +1773,8 @@ class FileWriterCallbackBase:
             dd["upper_ctrl_limit"] = entry.get("upper_ctrl_limit", '')
             dd["precision"] = entry.get("precision", 0)
             dd["object_name"] = entry.get("object_name", k)
-            dd["data"] = []    # entry data goes here
-            dd["time"] = []    # entry time stamps here
+            dd["data"] = ColumnBuffer.from_data_key(entry)    # entry data goes here
+            dd["time"] = ColumnBuffer("float64")    # entry time stamps here
             dd["external"] = entry.get("external") is not None
             # logger.debug("dd %s: %s", k, data[k])
 
@@ -918,6 +1798,26 @@ class FileWriterCallbackBase:
                 else:
                     data["data"].append(v)
                     data["time"].append(doc["timestamps"][k])
+            if self.spill_threshold is not None:
+                self._spill_buffers_()
+
+    def event_page(self, doc):
+        """
+        a "page" of rows of data, taken in column by column
+        """
+        if not self.scanning:
+            return
+        descriptor = self.acquisitions.get(doc["descriptor"])
+        if descriptor is not None:
+            for k, v in doc["data"].items():
+                data = descriptor["data"].get(k)
+                if data is None:
+                    print("entry key %s not found in descriptor of %s" % (k, descriptor["stream"]))
+                else:
+                    data["data"].extend(v)
+                    data["time"].extend(doc["timestamps"][k])
+            if self.spill_threshold is not None:
+                self._spill_buffers_()
 
     def resource(self, doc):
         """
@@ -959,7 +1859,19 @@ class FileWriterCallbackBase:
         self.stop_time = doc["time"]
         self.scanning = False
 
-        self.writer()
+        if self.background_writer:
+            if self._writer_thread is None:
+                self._writer_queue = queue.Queue(maxsize=self.background_queue_size)
+                self._writer_thread = threading.Thread(
+                    target=self._background_writer_, daemon=True)
+                self._writer_thread.start()
+                # do not lose queued runs when the session ends
+                atexit.register(self.join)
+            # start() replaces (does not modify) the collected content,
+            # a shallow copy is a snapshot of this run
+            self._writer_queue.put(copy.copy(self))
+        else:
+            self.writer()
 
 
 class NXWriter(FileWriterCallbackBase):
@@ -970,6 +1882,25 @@ class NXWriter(FileWriterCallbackBase):
 
     One scan is written to one HDF5/NeXus file.
 
+    When ``streaming`` is True, the file is created when the
+    *start* document is received.  Each *descriptor* creates the group
+    for its stream.  The first *event* (or *event_page*) creates
+    resizable (chunked) datasets, with ``dtype`` and ``shape`` of its
+    data, and the data from each *event* is appended to those datasets.
+    Data that does not fit (such as rows of a different shape) is
+    collected in memory from then on, as when not streaming.
+    The rest of the NeXus structure
+    (metadata, links, ...) is written when the *stop* document is
+    received.  Data from external resources (such as area detector
+    images) is written when the *stop* document is received.
+
+    Data from external resources is copied into the file, unless
+    ``external_data`` is ``"link"`` (HDF5 external link) or ``"vds"``
+    (HDF5 virtual dataset).  See :meth:`write_stream_external`.
+    The copy is made in blocks of frames (aligned with the chunks
+    of the source dataset), each no larger than
+    ``external_memory_limit`` bytes, with ``external_compression``.
+
     METHODS
 
     .. autosummary::
@@ -978,6 +1909,7 @@ class NXWriter(FileWriterCallbackBase):
        ~h5string
        ~add_dataset_attributes
        ~assign_signal_type
+       ~copy_dataset
        ~create_NX_group
        ~get_sample_title
        ~get_stream_link
@@ -992,6 +1924,8 @@ class NXWriter(FileWriterCallbackBase):
        ~write_sample
        ~write_slits
        ~write_source
+       ~write_stream_group
+       ~write_stream_rows
        ~write_streams
        ~write_user
     """
@@ -1001,6 +1935,10 @@ class NXWriter(FileWriterCallbackBase):
     nxdata_signal = None        # name of dataset for Y axis on plot
     nxdata_signal_axes = None   # name of dataset for X axis on plot
     root = None                 # instance of h5py.File
+    streaming = False           # write stream data as it arrives
+    external_data = "copy"      # one of NEXUS_EXTERNAL_DATA_MODES
+    external_compression = "lzf"  # copy: None, "lzf", "gzip", or gzip level 0..9
+    external_memory_limit = NEXUS_COPY_MEMORY_LIMIT  # copy: max bytes in memory
 
     # convention: methods written in alphabetical order
 
@@ -1041,11 +1979,70 @@ class NXWriter(FileWriterCallbackBase):
             else:
                 signal_type = "other"
             v.attrs["signal_type"] = signal_type            # group
+            if isinstance(v.get("value", getlink=True), h5py.ExternalLink):
+                continue    # do not modify the external file
             try:
                 v["value"].attrs["signal_type"] = signal_type   # dataset
             except KeyError:
                 logger.warning("Could not assign %s as signal type %s", k, signal_type)
 
+    def copy_dataset(self, source, parent, name):
+        """
+        copy HDF5 dataset ``source`` to ``parent[name]``, block by block
+
+        Blocks of frames (along the first axis) are aligned with the
+        chunks of ``source``.  Each block is no larger than
+        ``self.external_memory_limit`` bytes (but at least one frame),
+        so the memory used does not depend on the size of ``source``.
+
+        Compression is chosen by ``self.external_compression``:
+        ``None`` (fastest, no compression), ``"lzf"``, ``"gzip"``,
+        or a gzip compression level (``0`` .. ``9``).
+        """
+        compression = self.external_compression
+        kwargs = dict(fletcher32=True)
+        if compression is None:
+            pass
+        elif compression == "lzf":
+            kwargs.update(compression="lzf", shuffle=True)
+        elif compression == "gzip" or (
+            isinstance(compression, int) and 0 <= compression <= 9
+        ):
+            kwargs.update(compression="gzip", shuffle=True)
+            if compression != "gzip":
+                kwargs["compression_opts"] = compression
+        else:
+            raise ValueError(
+                f"external_compression={compression!r} not one of"
+                " None, 'lzf', 'gzip', or 0..9"
+            )
+
+        shape = source.shape
+        if len(shape) == 0 or 0 in shape:   # nothing to compress
+            return parent.create_dataset(name, data=source[()])
+
+        frame_shape = shape[1:]
+        chunks = source.chunks or (1,) + frame_shape
+        # such as: fewer frames captured than frames per chunk
+        chunks = tuple(min(c, n) for c, n in zip(chunks, shape))
+        ds = parent.create_dataset(
+            name, shape=shape, dtype=source.dtype, chunks=chunks, **kwargs
+        )
+
+        frame_bytes = max(1, int(np.prod(frame_shape)) * source.dtype.itemsize)
+        block = max(1, int(self.external_memory_limit) // frame_bytes)
+        if block >= chunks[0]:
+            block -= block % chunks[0]  # whole chunks
+        block = min(block, shape[0])
+        buffer = np.empty((block,) + frame_shape, dtype=source.dtype)
+        for start in range(0, shape[0], block):
+            n = min(block, shape[0] - start)
+            source.read_direct(
+                buffer, np.s_[start:start+n], np.s_[0:n]
+            )
+            ds.write_direct(buffer, np.s_[0:n], np.s_[start:start+n])
+        return ds
+
     def create_NX_group(self, parent, specification):
         """
         create an h5 group with named NeXus class (specification)
@@ -1053,11 +2050,45 @@ class NXWriter(FileWriterCallbackBase):
         local_address, nx_class = specification.split(":")
         if not nx_class.startswith("NX"):
             raise ValueError(f"NeXus base class must start with 'NX', received {nx_class}")
+        if local_address in parent:
+            group = parent[local_address]
+            if group.attrs.get("NX_class") == nx_class:
+                return group    # already created (when streaming)
         group = parent.create_group(local_address)
         group.attrs["NX_class"] = nx_class
         group.attrs["target"] = group.name      # for use as NeXus link
         return group
 
+    def descriptor(self, doc):
+        """
+        description of the data stream to be acquired
+        """
+        super().descriptor(doc)
+        if self.streaming and self.scanning:
+            self.write_stream_group(doc["uid"])
+
+    def event(self, doc):
+        """
+        a single "row" of data
+        """
+        if not self.streaming:
+            super().event(doc)
+        elif self.scanning:
+            self.write_stream_rows(
+                doc["descriptor"],
+                {k: [v] for k, v in doc["data"].items()},
+                {k: [v] for k, v in doc["timestamps"].items()},
+            )
+
+    def event_page(self, doc):
+        """
+        a "page" of rows of data, taken in column by column
+        """
+        if not self.streaming:
+            super().event_page(doc)
+        elif self.scanning:
+            self.write_stream_rows(doc["descriptor"], doc["data"], doc["timestamps"])
+
     def getResourceFile(self, resource_id):
         """
         full path to the resource file specified by uid ``resource_id``
@@ -1111,13 +2142,40 @@ class NXWriter(FileWriterCallbackBase):
         text = text or ""
         return text.encode("utf8")
 
+    def start(self, doc):
+        """
+        beginning of a run, clear cache and collect metadata
+
+        When streaming, create the file.
+        """
+        if self.scanning and self.root is not None:
+            # previous run did not end with a stop document
+            self.root.close()
+        self.root = None
+        self._stream_datasets = {}      # (value, EPOCH), keyed by (uid, key)
+        super().start(doc)
+        if self.streaming:
+            fname = self.file_name or self.make_file_name()
+            self.root = h5py.File(fname, "w")
+            nxentry = self.create_NX_group(self.root, "entry:NXentry")
+            nxinstrument = self.create_NX_group(nxentry, "instrument:NXinstrument")
+            bluesky_group = self.create_NX_group(nxinstrument, "bluesky:NXnote")
+            self.create_NX_group(bluesky_group, "streams:NXnote")
+
     def writer(self):
         """
         write collected data to HDF5/NeXus data file
         """
         fname = self.file_name or self.make_file_name()
-        with h5py.File(fname, "w") as self.root:
-            self.write_root(fname)
+        if self.root is None:
+            with h5py.File(fname, "w") as self.root:
+                self.write_root(fname)
+        else:
+            # streaming: file was created by start()
+            try:
+                self.write_root(fname)
+            finally:
+                self.root.close()
 
         self.root = None
         logger.info(f"wrote NeXus file: {fname}")
@@ -1131,7 +2189,11 @@ class NXWriter(FileWriterCallbackBase):
 
         primary = parent["instrument/bluesky/streams/primary"]
         for k in primary.keys():
-            nxdata[k] = primary[k+"/value"]
+            link = primary[k].get("value", getlink=True)
+            if isinstance(link, h5py.ExternalLink):
+                nxdata[k] = h5py.ExternalLink(link.filename, link.path)
+            else:
+                nxdata[k] = primary[k+"/value"]
 
         # pick the timestamps from one of the datasets (the last one)
         nxdata["EPOCH"] = primary[k+"/time"]
@@ -1275,6 +2337,8 @@ class NXWriter(FileWriterCallbackBase):
         ds.attrs["target"] = ds.name
 
         for k, v in self.metadata.items():
+            if v is None:
+                continue    # HDF5 has no null value
             is_yaml = False
             if isinstance(v, (dict, tuple, list)):
                 # fallback technique: save complicated structures as YAML text
@@ -1416,50 +2480,215 @@ class NXWriter(FileWriterCallbackBase):
         return nxsource
 
     def write_stream_external(self, parent, d, subgroup, stream_name, k, v):
+        """
+        write the data from external resource(s) for signal ``k``
+
+        The method is chosen by ``self.external_data``:
+
+        ``"copy"`` (default)
+            Copy the data into this file.  Only one resource is allowed.
+
+        ``"link"``
+            HDF5 external link to the data in the resource file.
+            Nothing is copied.  (When the data spans more than one
+            resource, a virtual dataset is written instead.)
+
+        ``"vds"``
+            HDF5 virtual dataset which maps the data from each resource
+            file, in order.  Nothing is copied.
+
+        Links and virtual datasets refer to the resource files
+        by their absolute path.  The resource files must remain
+        available to read this data.
+        """
         # TODO: rabbit-hole alert! simplify
         # lots of variations possible
+        address = "/entry/data/data"    # in the EPICS AD data file
 
-        # count number of unique resources (expect only 1)
+        mode = self.external_data
+        if mode not in NEXUS_EXTERNAL_DATA_MODES:
+            raise ValueError(
+                f"external_data={mode} not one of {NEXUS_EXTERNAL_DATA_MODES}"
+            )
+
+        # count number of unique resources (expect only 1, unless vds)
         resource_id_list = []
         for datum_id in d:
             resource_id = self.externals[datum_id]["resource"]
             if resource_id not in resource_id_list:
                 resource_id_list.append(resource_id)
-        if len(resource_id_list) != 1:
+        if mode == "link" and len(resource_id_list) > 1:
+            logger.info("%s: data spans %d resources, using vds", k, len(resource_id_list))
+            mode = "vds"
+        if len(resource_id_list) == 0 or (mode != "vds" and len(resource_id_list) != 1):
             raise ValueError(
                 f"{len(resource_id_list)}"
                 f" unique resource UIDs: {resource_id_list}"
             )
 
-        fname = self.getResourceFile(resource_id)
-        logger.info("reading %s from EPICS AD data file: %s", k, fname)
-        with h5py.File(fname, "r") as hdf_image_file_root:
-            h5_obj = hdf_image_file_root["/entry/data/data"]
-            ds = subgroup.create_dataset(
-                "value",
-                data=h5_obj[()],
-                compression="lzf",
-                # compression="gzip",
-                # compression_opts=9,
-                shuffle=True,
-                fletcher32=True,
-                )
+        if mode == "vds":
+            sources = []
+            for resource_id in resource_id_list:
+                fname = os.path.abspath(self.getResourceFile(resource_id))
+                with h5py.File(fname, "r") as hdf_image_file_root:
+                    h5_obj = hdf_image_file_root[address]
+                    sources.append((fname, h5_obj.shape, h5_obj.dtype))
+            frame_shape = sources[0][1][1:]
+            for fname, shape, dtype in sources:
+                if shape[1:] != frame_shape:
+                    raise ValueError(
+                        f"{fname}: frame shape {shape[1:]}"
+                        f" differs from {frame_shape}"
+                    )
+            num_frames = sum([shape[0] for fname, shape, dtype in sources])
+            logger.info("mapping %s from %d EPICS AD data file(s)", k, len(sources))
+            layout = h5py.VirtualLayout(
+                shape=(num_frames,) + frame_shape,
+                dtype=sources[0][2])
+            offset = 0
+            for fname, shape, dtype in sources:
+                vsource = h5py.VirtualSource(fname, address, shape=shape)
+                layout[offset:offset+shape[0]] = vsource
+                offset += shape[0]
+            ds = subgroup.create_virtual_dataset("value", layout)
             ds.attrs["target"] = ds.name
-            ds.attrs["source_file"] = fname
-            ds.attrs["source_address"] = h5_obj.name
-            ds.attrs["resource_id"] = resource_id
+            ds.attrs["source_file"] = [fname for fname, shape, dtype in sources]
+            ds.attrs["source_address"] = address
+            ds.attrs["resource_id"] = resource_id_list
             ds.attrs["units"] = ""
 
+        elif mode == "link":
+            fname = os.path.abspath(self.getResourceFile(resource_id))
+            logger.info("linking %s to EPICS AD data file: %s", k, fname)
+            subgroup["value"] = h5py.ExternalLink(fname, address)
+            # attributes of an external link are in the external file
+            subgroup.attrs["source_file"] = fname
+            subgroup.attrs["source_address"] = address
+            subgroup.attrs["resource_id"] = resource_id
+
+        else:
+            fname = self.getResourceFile(resource_id)
+            logger.info("reading %s from EPICS AD data file: %s", k, fname)
+            with h5py.File(fname, "r") as hdf_image_file_root:
+                h5_obj = hdf_image_file_root[address]
+                ds = self.copy_dataset(h5_obj, subgroup, "value")
+                ds.attrs["target"] = ds.name
+                ds.attrs["source_file"] = fname
+                ds.attrs["source_address"] = h5_obj.name
+                ds.attrs["resource_id"] = resource_id
+                ds.attrs["units"] = ""
+
         subgroup.attrs["signal"] = "value"
 
+    def write_stream_group(self, uid):
+        """
+        streaming: create the group for descriptor ``uid``
+
+        group: /entry/instrument/bluesky/streams/STREAM:NXnote
+
+        The datasets are created by :meth:`write_stream_rows`.
+        """
+        acquisition = self.acquisitions[uid]
+        stream_name = acquisition["stream"]
+        uids = self.streams[stream_name]
+        if len(uids) != 1:
+            # reported (raised) when the stop document is received
+            logger.error(
+                "stream %s has %d descriptors, expecting only 1:"
+                " not streaming it", stream_name, len(uids))
+            for descriptor_uid in uids:
+                for k in self.acquisitions[descriptor_uid]["data"]:
+                    self._stop_streaming_key(descriptor_uid, k)
+            return
+        streams = self.root["/entry/instrument/bluesky/streams"]
+        group = self.create_NX_group(streams, stream_name+":NXnote")
+        group.attrs["uid"] = uid
+        for k, v in acquisition["data"].items():
+            shape = tuple(v["shape"] or [])
+            # datasets are created from the first rows received
+            v["streamed"] = not v["external"] and all(
+                isinstance(n, int) and n > 0
+                for n in shape
+            )
+
+    def _create_stream_datasets(self, uid, k, v, arr):
+        """streaming: resizable datasets for key ``k``, as ``arr`` (first rows)"""
+        stream_name = self.acquisitions[uid]["stream"]
+        group = self.root["/entry/instrument/bluesky/streams"][stream_name]
+        if arr.dtype.kind == "U":
+            dtype = h5py.string_dtype()
+        else:
+            dtype = arr.dtype
+        shape = arr.shape[1:]
+
+        subgroup = self.create_NX_group(group, k+":NXdata")
+        subgroup.attrs["signal"] = "value"
+        subgroup.attrs["axes"] = ["time",]
+        ds = subgroup.create_dataset(
+            "value",
+            shape=(0,) + shape,
+            maxshape=(None,) + shape,
+            dtype=dtype,
+            chunks=True,
+        )
+        ds.attrs["target"] = ds.name
+        self.add_dataset_attributes(ds, v, k)
+
+        ds_t = subgroup.create_dataset(
+            "EPOCH",
+            shape=(0,),
+            maxshape=(None,),
+            dtype="float64",
+            chunks=True,
+        )
+        ds_t.attrs["units"] = "s"
+        ds_t.attrs["long_name"] = "epoch time (s)"
+        ds_t.attrs["target"] = ds_t.name
+        self._stream_datasets[(uid, k)] = (ds, ds_t)
+        return ds, ds_t
+
+    def _stop_streaming_key(self, uid, k):
+        """
+        streaming: collect key ``k`` in memory from now on
+
+        The rows already streamed are moved back into the buffers
+        and the datasets are removed.  The data is written when
+        the stop document is received, as when not streaming.
+        """
+        v = self.acquisitions[uid]["data"][k]
+        v["streamed"] = False
+        datasets = self._stream_datasets.pop((uid, k), None)
+        if datasets is None:
+            return
+        ds, ds_t = datasets
+        if h5py.check_string_dtype(ds.dtype) is not None:
+            rows = ds.asstr()[()]
+        else:
+            rows = ds[()]
+        times = ds_t[()]
+        subgroup = ds.parent
+        del subgroup.parent[k]
+        v["data"].extend(rows)
+        v["time"].extend(times)
+
     def write_stream_internal(self, parent, d, subgroup, stream_name, k, v):
         subgroup.attrs["signal"] = "value"
         subgroup.attrs["axes"] = ["time",]
-        if isinstance(d, list) and len(d) > 0:
+        if isinstance(d, ColumnBuffer):
+            d = d.array if len(d) > 0 else []   # array is not a copy
+        if isinstance(d, (list, np.ndarray)) and len(d) > 0:
             if v["dtype"] in ("string",):
-                d = self.h5string(d)
+                d = self.h5string(list(d))
             elif v["dtype"] in ("integer", "number"):
-                d = np.array(d)
+                d = np.asarray(d)
+            if isinstance(d, np.ndarray) and d.dtype == object:
+                # rows of the same shape can be written as one array
+                try:
+                    rows = [np.asarray(row) for row in d]
+                    if len({(row.shape, row.dtype.kind) for row in rows}) == 1:
+                        d = np.stack(rows)
+                except (TypeError, ValueError):
+                    pass
         try:
             ds = subgroup.create_dataset("value", data=d)
             ds.attrs["target"] = ds.name
@@ -1479,6 +2708,57 @@ class NXWriter(FileWriterCallbackBase):
             self.add_dataset_attributes(ds, v, k)
             ds.attrs["target"] = ds.name
 
+    def write_stream_rows(self, uid, data, timestamps):
+        """
+        streaming: append rows to the datasets of descriptor ``uid``
+
+        ``data`` and ``timestamps`` are dictionaries (keyed by signal name)
+        of lists, as in an *event_page* document.
+        """
+        acquisition = self.acquisitions.get(uid)
+        if acquisition is None:
+            return
+        for k, values in data.items():
+            v = acquisition["data"].get(k)
+            if v is None:
+                print("entry key %s not found in descriptor of %s" % (k, acquisition["stream"]))
+            elif not v.get("streamed"):
+                v["data"].extend(values)
+                v["time"].extend(timestamps[k])
+            elif len(values) > 0:
+                try:
+                    arr = np.asarray(values)
+                except ValueError:      # ragged rows
+                    arr = np.empty(0, dtype=object)
+                datasets = self._stream_datasets.get((uid, k))
+                if datasets is None and arr.dtype != object:
+                    datasets = self._create_stream_datasets(uid, k, v, arr)
+                if datasets is None or not self._fits_stream_dataset(arr, datasets[0]):
+                    logger.info(
+                        "%s %s: rows do not fit the streamed dataset,"
+                        " collecting in memory", v["dtype"], k)
+                    self._stop_streaming_key(uid, k)
+                    v["data"].extend(values)
+                    v["time"].extend(timestamps[k])
+                    continue
+                ds, ds_t = datasets
+                if arr.dtype.kind == "U":
+                    arr = arr.astype(object)
+                n = ds.shape[0]
+                ds.resize(n + len(arr), axis=0)
+                ds[n:] = arr
+                ds_t.resize(n + len(arr), axis=0)
+                ds_t[n:] = timestamps[k]
+
+    @staticmethod
+    def _fits_stream_dataset(arr, ds):
+        """can rows ``arr`` be appended to dataset ``ds`` without loss?"""
+        if arr.dtype == object or arr.shape[1:] != ds.shape[1:]:
+            return False
+        if h5py.check_string_dtype(ds.dtype) is not None:
+            return arr.dtype.kind == "U"
+        return arr.dtype.kind != "U" and np.can_cast(arr.dtype, ds.dtype)
+
     def write_streams(self, parent):
         """
         group: /entry/instrument/bluesky/streams:NXnote
@@ -1496,20 +2776,34 @@ class NXWriter(FileWriterCallbackBase):
             group.attrs["uid"] = uid0
             acquisition = self.acquisitions[uid0]    # just get the one descriptor
             for k, v in acquisition["data"].items():
-                d = v["data"]
-                # NXlog is for time series data but NXdata makes an automatic plot
-                subgroup = self.create_NX_group(group, k+":NXdata")
-
-                if v["external"]:
-                    self.write_stream_external(parent, d, subgroup, stream_name, k, v)
+                if v.get("streamed") and (uid0, k) in self._stream_datasets:
+                    # value & EPOCH were written as data arrived
+                    subgroup = group[k]
+                    if stream_name == "baseline" and subgroup["value"].shape[0] > 0:
+                        # make it easier to pick single values
+                        # identify start/end of acquisition
+                        for ref, i in (("value_start", 0), ("value_end", -1)):
+                            ds = subgroup.create_dataset(ref, data=subgroup["value"][i])
+                            self.add_dataset_attributes(ds, v, k)
+                            ds.attrs["target"] = ds.name
+                    t = subgroup["EPOCH"][()]
+                    if len(t) == 0:
+                        continue
                 else:
-                    self.write_stream_internal(parent, d, subgroup, stream_name, k, v)
+                    d = v["data"]
+                    # NXlog is for time series data but NXdata makes an automatic plot
+                    subgroup = self.create_NX_group(group, k+":NXdata")
 
-                t = np.array(v["time"])
-                ds = subgroup.create_dataset("EPOCH", data=t)
-                ds.attrs["units"] = "s"
-                ds.attrs["long_name"] = "epoch time (s)"
-                ds.attrs["target"] = ds.name
+                    if v["external"]:
+                        self.write_stream_external(parent, d, subgroup, stream_name, k, v)
+                    else:
+                        self.write_stream_internal(parent, d, subgroup, stream_name, k, v)
+
+                    t = np.asarray(v["time"])
+                    ds = subgroup.create_dataset("EPOCH", data=t)
+                    ds.attrs["units"] = "s"
+                    ds.attrs["long_name"] = "epoch time (s)"
+                    ds.attrs["target"] = ds.name
 
                 t_start = t[0]
                 ds = subgroup.create_dataset("time", data=t - t_start)
@@ -6,6 +6,7 @@ Plans that might be useful at the APS when using Bluesky
    ~addDeviceDataAsStream
    ~execute_command_list
    ~get_command_list
+   ~iter_Excel_command_file
    ~lineup
    ~nscan
    ~parse_Excel_command_file
@@ -32,6 +33,8 @@ Plans that might be useful at the APS when using Bluesky
 
 from collections import OrderedDict
 import datetime
+import difflib
+import hashlib
 import logging
 import numpy as np
 import os
@@ -107,6 +110,9 @@ def execute_command_list(filename, commands, md=None):
         "/path/to/overnight.txt".
     commands : list[command]
         List of command tuples for use in ``execute_command_list()``
+        (or an iterator of them, such as from
+        :func:`iter_Excel_command_file`, to start executing before
+        all the commands are read)
 
     where
 
@@ -138,13 +144,17 @@ def execute_command_list(filename, commands, md=None):
     """
     full_filename = os.path.abspath(filename)
 
-    if len(commands) == 0:
-        yield from bps.null()
-        return
+    if isinstance(commands, (list, tuple)):
+        if len(commands) == 0:
+            yield from bps.null()
+            return
 
-    text = f"Command file: {filename}\n"
-    text += str(APS_utils.command_list_as_table(commands))
-    print(text)
+        text = f"Command file: {filename}\n"
+        text += str(APS_utils.command_list_as_table(commands))
+        print(text)
+    else:
+        # such as iter_Excel_command_file(): read as each command is needed
+        print(f"Command file: {filename}")
 
     for command in commands:
         action, args, i, raw_command = command
@@ -481,6 +491,98 @@ def parse_Excel_command_file(filename):
     return commands
 
 
+def iter_Excel_command_file(filename, labels_row=3):
+    """
+    generator: commands from an Excel spreadsheet, read row by row
+
+    Same commands as :func:`parse_Excel_command_file`, but the
+    spreadsheet is read (with ``openpyxl``, read-only) one row at a
+    time, as each command is needed.  Commands can be executed while
+    later rows have not been read yet::
+
+        RE(execute_command_list(filename, iter_Excel_command_file(filename)))
+
+    The table starts with the column labels in row ``labels_row``
+    (zero-based, default: `3`, Excel row 4) and ends at the first
+    empty label (columns) and the first empty row (rows).
+    Values are as found in the cells (a column of numbers is not
+    converted to one type, as when read by :mod:`pandas`).
+
+    If ``openpyxl`` is not available, or cannot read the file (such
+    as an ``.xls`` file), the commands come from
+    :func:`parse_Excel_command_file`.
+
+    PARAMETERS
+
+    filename : str
+        Name of input Excel spreadsheet file.
+    labels_row : int
+        Row (zero-based numbering) of Excel file with column labels,
+        default: `3` (Excel row 4)
+
+    YIELDS
+
+    command : tuple
+        ``(action, values, line_number, raw)``, as for
+        ``execute_command_list()``
+
+    RAISES
+
+    FileNotFoundError
+        if file cannot be found
+
+    SEE ALSO
+
+    .. autosummary::
+
+        ~execute_command_list
+        ~get_command_list
+        ~parse_Excel_command_file
+
+    """
+    full_filename = os.path.abspath(filename)
+    if not os.path.exists(full_filename):
+        raise FileNotFoundError(full_filename)
+    try:
+        import openpyxl
+        workbook = openpyxl.load_workbook(
+            full_filename, read_only=True, data_only=True
+        )
+    except Exception as exc:    # ImportError or not an .xlsx file
+        logger.debug("not streaming %s: %s", filename, exc)
+        yield from parse_Excel_command_file(filename)
+        return
+
+    def cell_value(v):
+        if isinstance(v, str):
+            v = v.strip()
+        return v
+
+    try:
+        rows = workbook.worksheets[0].iter_rows(
+            min_row=labels_row + 1, values_only=True
+        )
+        labels = next(rows, ())
+        ncols = len(labels)
+        for i, label in enumerate(labels):
+            if label is None or str(label).strip() == "":
+                ncols = i
+                break
+
+        for i, row in enumerate(rows):
+            raw = [cell_value(v) for v in (tuple(row) + (None,) * ncols)[:ncols]]
+            if len(raw) == 0 or raw.count(None) == len(raw):
+                break       # empty row: end of table
+
+            action, *values = raw
+            # trim off any None values from end
+            while len(values) > 0 and values[-1] is None:
+                values = values[:-1]
+            yield action, values, i+1, raw
+    finally:
+        workbook.close()
+
+
 def parse_text_command_file(filename):
     """
     parse a text file with commands, return as command list
@@ -594,13 +696,118 @@ def register_command_handler(handler=None):
     _COMMAND_HANDLER_ = handler or execute_command_list
 
 
-def run_command_file(filename, md=None):
+def _command_file_signature(filename):
+    """(mtime, size) of the command file, None if it cannot be found"""
+    try:
+        st = os.stat(filename)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+def _command_file_hash(filename):
+    with open(filename, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def _command_list_splice_point(old, new, executed):
+    """
+    index in ``new`` of the first command not yet executed
+
+    The first ``executed`` commands of ``old`` have been run.  Align
+    ``old`` with ``new`` (by the ``raw`` content of each command, so
+    edits that only move line numbers are not changes) and find where
+    that boundary falls in ``new``.  Also returns a count of the edits
+    to commands that have already run (those edits are not executed).
+    """
+    matcher = difflib.SequenceMatcher(
+        None,
+        [repr(c[3]) for c in old],
+        [repr(c[3]) for c in new],
+        autojunk=False)
+    position = 0
+    edits = 0
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if i1 >= executed:
+            break       # the rest has not been executed
+        if tag == "equal":
+            position = j1 + min(i2, executed) - i1
+        else:
+            edits += 1
+            position = min(j2, j1 + executed - i1)
+    return position, edits
+
+
+def _watch_command_file(filename, commands):
+    """
+    generator: commands from ``filename``, updated when the file is edited
+
+    Before each command is yielded, the file is checked (by mtime and
+    size, then content hash) for changes.  When changed, it is parsed
+    again and the commands not yet executed are replaced by those
+    from the new version of the file.  Changes to commands that have
+    already been executed are reported and ignored.
+    """
+    commands = list(commands)
+    signature = _command_file_signature(filename)
+    digest = _command_file_hash(filename)
+    executed = 0
+    while True:
+        sig = _command_file_signature(filename)
+        if sig is not None and sig != signature:
+            try:
+                new_digest = _command_file_hash(filename)
+                if new_digest != digest:
+                    new_commands = list(get_command_list(filename))
+            except Exception as exc:    # maybe a partially-saved file
+                logger.warning(
+                    "cannot re-read %s (will retry): %s", filename, exc)
+            else:
+                signature = sig
+                if new_digest != digest:
+                    digest = new_digest
+                    position, edits = _command_list_splice_point(
+                        commands, new_commands, executed)
+                    if edits > 0:
+                        print(
+                            f"Command file {filename} changed"
+                            " before the current command;"
+                            " those changes are not executed."
+                        )
+                    print(
+                        f"Command file {filename} changed:"
+                        f" {len(new_commands) - position} command(s)"
+                        " remaining"
+                    )
+                    commands, executed = new_commands, position
+        if executed >= len(commands):
+            return
+        executed += 1
+        yield commands[executed - 1]
+
+
+def run_command_file(filename, md=None, watch=False):
     """
     plan: execute a list of commands from a text or Excel file
 
     * Parse the file into a command list
     * yield the command list to the RunEngine (or other)
 
+    PARAMETERS
+
+    filename : str
+        Name of the text or Excel command file.
+    md : dict
+        metadata
+    watch : bool
+        If ``True``, check the command file for changes before each
+        command.  The commands not yet executed are replaced with
+        those from the edited file, so a queue can be extended (or
+        revised) while it runs.  Edits to commands already executed
+        are ignored.  The command handler must accept an iterator
+        of commands (as ``execute_command_list()`` does).
+        default: ``False``
+
     SEE ALSO
 
     .. autosummary::
@@ -617,6 +824,8 @@ def run_command_file(filename, md=None):
     _md = dict(command_file=filename)
     _md.update(md or {})
     commands = get_command_list(filename)
+    if watch:
+        commands = _watch_command_file(filename, commands)
     yield from _COMMAND_HANDLER_(filename, commands, md=_md)
 
 
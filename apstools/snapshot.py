@@ -42,7 +42,6 @@ import argparse
 from collections import OrderedDict
 from io import StringIO
 import sys
-import time
 import tkinter as tk
 import tkinter.ttk as ttk
 
@@ -131,8 +130,7 @@ def snapshot_cli():
     md = OrderedDict(purpose="archive a set of EPICS PVs")
     md.update(parse_metadata(args))
 
-    obj_dict = APS_utils.connect_pvlist(args.EPICS_PV, wait=False)
-    time.sleep(2)   # FIXME: allow time to connect
+    obj_dict = APS_utils.connect_pvlist(args.EPICS_PV)
 
     db = Broker.named(args.broker_config)
     RE = RunEngine({})
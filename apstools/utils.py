@@ -8,25 +8,38 @@ Various utilities
    ~connect_pvlist
    ~device_read2table
    ~dictionary_table
+   ~disable_pv_cache
    ~EmailNotifications
+   ~enable_pv_cache
    ~ExcelDatabaseFileBase
    ~ExcelDatabaseFileGeneric
    ~ExcelReadError
+   ~ExportManifest
+   ~fetch_runs
    ~full_dotted_name
    ~ipython_profile_name
    ~itemizer
+   ~iter_json_import
+   ~iter_npz_import
    ~json_export
    ~json_import
    ~listobjects
    ~listruns
+   ~npz_columns
+   ~npz_export
+   ~npz_write_run
    ~object_explorer
    ~pairwise
    ~plot_prune_fifo
    ~print_snapshot_list
    ~print_RE_md
+   ~PVValueCache
    ~redefine_motor_position
    ~replay
+   ~run_fingerprint
    ~run_in_thread
+   ~run_statistics
+   ~RunIndex
    ~safe_ophyd_name
    ~show_ophyd_symbols
    ~split_quoted_line
@@ -50,21 +63,33 @@ Various utilities
 
 from bluesky.callbacks.best_effort import BestEffortCallback
 from bluesky import plan_stubs as bps
-from collections import defaultdict, OrderedDict
+import bisect
+from collections import defaultdict, deque, OrderedDict
+import concurrent.futures
+from concurrent.futures import ThreadPoolExecutor
+import contextlib
 import databroker
 import databroker.queries
 import datetime
+import dateutil.tz
 from email.mime.text import MIMEText
+import event_model
 from event_model import NumpyEncoder
+import functools
+import io
 import json
 import logging
 import math
+import numpy as np
 import ophyd
 import os
 import pandas
 import pyRestTable
+import queue
 import re
 import smtplib
+import sqlite3
+import struct
 import subprocess
 import sys
 import threading
@@ -74,11 +99,30 @@ import xlrd
 import zipfile
 
 from .filewriters import _rebuild_scan_command
+from .filewriters import ColumnBuffer
 
 
 logger = logging.getLogger(__name__)
 
+BULK_READ_TIMEOUT = 5      # s, deadline to read all signals in object_explorer()
+BULK_READ_WORKERS = 32      # threads reading signals in object_explorer()
+EXCEL_TABLE_CACHE_SIZE = 16 # most tables kept by ExcelDatabaseFileBase.parse()
 MAX_EPICS_STRINGOUT_LENGTH = 40
+PV_CACHE_IDLE_TIMEOUT = 600  # s, PVValueCache removes signals not read for this long
+PV_CACHE_SIZE = 10000       # most signals kept by PVValueCache
+NPZ_ARCHIVE_VERSION = 1     # of the skeleton written by npz_export()
+NPZ_SKELETON = "skeleton.json"  # name (in each run) of npz_export() skeleton
+REPLAY_PREFETCH = 1000     # documents read ahead by replay()
+RUN_FETCH_LATENCY_BINS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)  # ms
+RUN_FETCH_WORKERS = 8       # threads reading runs from the catalog
+RUN_INDEX_COLUMNS = "uid scan_id plan_name exit_status".split()   # RunIndex.search()
+RUN_STATISTICS_PERIODS = "hour day week cycle".split()    # run_statistics()
+RUN_INDEX_KEYS = "iso8601 purpose".split()  # default start document keys in RunIndex
+RUN_INDEX_OPEN_WINDOW = 24 * 3600  # s, RunIndex re-reads runs not ended within this
+
+_excel_table_cache = OrderedDict()  # see _read_excel_table()
+_excel_table_lock = threading.Lock()
+_pv_cache = None            # process-wide PVValueCache, see enable_pv_cache()
 
 
 class ExcelReadError(xlrd.XLRDError): ...
@@ -121,18 +165,55 @@ def command_list_as_table(commands, show_raw=False):
     return tbl
 
 
-def device_read2table(device, show_ancient=True, use_datetime=True, printing=True):
+def device_read2table(
+        device,
+        show_ancient=True,
+        use_datetime=True,
+        printing=True,
+        timeout=None,
+        workers=None):
     """
     read an ophyd device and return a pyRestTable Table
 
     Include an option to suppress ancient values identified
     by timestamp from 1989.  These are values only defined in
     the original ``.db`` file.
+
+    The components of the device are read concurrently (see
+    :func:`object_explorer` for ``timeout`` and ``workers``).
+    A component not read by the deadline is shown as ``TIMEOUT``.
+    Signals are read through the :class:`PVValueCache`, if enabled
+    (see :func:`enable_pv_cache`).
     """
     table = pyRestTable.Table()
     table.labels = "name value timestamp".split()
     ANCIENT_YEAR = 1989
-    for k, rec in device.read().items():
+    if isinstance(device, ophyd.Device) and type(device).read is ophyd.Device.read:
+        components = [
+            getattr(device, attr)
+            for attr in device.read_attrs
+            if "." not in attr      # nested components are read by their parent
+        ]
+        def read(component):
+            if _pv_cache is not None and isinstance(component, ophyd.Signal):
+                return {component.name: _pv_cache.read(component)}
+            return component.read()
+
+        readings = OrderedDict()
+        for component, reading in zip(
+            components,
+            _bulk_call(read, components, timeout, workers)
+        ):
+            if reading == "TIMEOUT":
+                readings[component.name] = None
+            else:
+                readings.update(reading)
+    else:
+        readings = device.read()
+    for k, rec in readings.items():
+        if rec is None:
+            table.addRow((k, "TIMEOUT", ""))
+            continue
         value = rec["value"]
         ts = rec["timestamp"]
         dt = datetime.datetime.fromtimestamp(ts)
@@ -223,6 +304,48 @@ def _get_named_child(obj, nm):
         return "TIMEOUT"
 
 
+def _bulk_call(function, items, timeout=None, workers=None):
+    """
+    list of ``function(item)`` for each of ``items``, called concurrently
+
+    All the calls share one deadline, ``timeout`` (s) from now
+    (default: ``BULK_READ_TIMEOUT``), using a pool of ``workers``
+    threads (default: ``BULK_READ_WORKERS``).  The result of a call
+    not done by the deadline, or which timed out or found its PV
+    disconnected, is ``"TIMEOUT"``.
+    """
+    items = list(items)
+    timeout = BULK_READ_TIMEOUT if timeout is None else timeout
+    results = ["TIMEOUT"] * len(items)
+    if len(items) == 0:
+        return results
+
+    t0 = time.time()
+    pool = ThreadPoolExecutor(
+        max_workers=min(workers or BULK_READ_WORKERS, len(items))
+    )
+    try:
+        futures = {
+            pool.submit(function, item): i
+            for i, item in enumerate(items)
+        }
+        done, not_done = concurrent.futures.wait(futures, timeout=timeout)
+        for future in not_done:
+            future.cancel()     # calls not yet started
+        for future in done:
+            try:
+                results[futures[future]] = future.result()
+            except (TimeoutError, ophyd.utils.DisconnectedError) as exc:
+                item = items[futures[future]]
+                logger.debug("%s: %s", getattr(item, "name", item), exc)
+    finally:
+        pool.shutdown(wait=False)   # do not wait for calls still blocked
+    logger.debug(
+        "%d calls in %.3fs, %d not done", len(items), time.time() - t0, len(not_done)
+    )
+    return results
+
+
 def _get_pv(obj):
     """
     returns PV name, prefix of None from ophyd object
@@ -246,6 +369,8 @@ def listruns(
         db=None,
         catalog_name=None,
         exit_status=None,
+        index=None,
+        workers=None,
         **db_search_terms):
     """
     make a table of the most recent runs (scans)
@@ -274,6 +399,14 @@ def listruns(
         Name of databroker v2 catalog, used when supplied ``db`` is ``None``.
         (default: ``mongodb_config``)
         (new in release 1.3.0)
+    index : object
+        Instance of :class:`RunIndex`.  If given, answer from
+        this index instead of the databroker (``db`` is not used).
+        ``keys`` and ``db_search_terms`` must be in the index.
+        (default: ``None``)
+    workers : int
+        Number of threads to read runs from the databroker.
+        (default: ``RUN_FETCH_WORKERS``)
     db_search_terms : dict
         Any additional keyword arguments will be passed to
         the databroker to refine the search for matching runs.
@@ -317,16 +450,53 @@ def listruns(
 
     *new in apstools release 1.1.10*
     """
-    catalog_name = catalog_name or "mongodb_config"
-    db = (db or databroker.catalog[catalog_name]).v2
     keys = keys or []
-    num_runs_requested = min(abs(num), len(db))
 
     if show_command:
         labels = "scan_id  command".split() + keys
     else:
         labels = "scan_id  plan_name".split() + keys
 
+    def short_command(command):
+        command = command[command.find(" "):].strip()
+        maxlen = 40
+        if len(command) > maxlen:
+            suffix = " ..."
+            command = command[:maxlen-len(suffix)] + suffix
+        return command
+
+    table = pyRestTable.Table()
+    table.labels = "short_uid   date/time  exit".split() + labels
+
+    if index is not None:
+        for k in keys:
+            if k not in RUN_INDEX_COLUMNS + index.keys:
+                raise ValueError(f"key '{k}' is not in the index")
+        if exit_status is not None:
+            db_search_terms["exit_status"] = exit_status
+        for run in index.search(num=abs(num), **db_search_terms):
+            row = [
+                run["uid"][:7],
+                datetime.datetime.fromtimestamp(run["time"]),
+                run["exit_status"] or "",
+            ]
+            for k in labels:
+                if k == "command":
+                    row.append(short_command(run["command"]))
+                elif k in RUN_INDEX_COLUMNS:
+                    row.append("" if run[k] is None else run[k])
+                else:
+                    row.append(run["metadata"].get(k, ""))
+            table.addRow(row)
+
+        if printing:
+            print(table)
+        return table
+
+    catalog_name = catalog_name or "mongodb_config"
+    db = (db or databroker.catalog[catalog_name]).v2
+    num_runs_requested = min(abs(num), len(db))
+
     cat = db.search(
         databroker.queries.TimeRange(
             since=db_search_terms.pop("since", "1995-01-01"),
@@ -334,14 +504,11 @@ def listruns(
         )
     ).search(db_search_terms)
 
-    table = pyRestTable.Table()
-    table.labels = "short_uid   date/time  exit".split() + labels
-    for uid in cat:
+    runs = fetch_runs(cat, workers=workers)
+    for uid, start, stop, latency in runs:
         if len(table.rows) == num_runs_requested:
+            runs.close()    # stop reading
             break
-        run = cat[uid]
-        start = run.metadata["start"]
-        stop = run.metadata["stop"]
 
         if (exit_status is not None
             and stop.get("exit_status") != exit_status):
@@ -356,13 +523,7 @@ def listruns(
 
         for k in labels:
             if k == "command":
-                command = _rebuild_scan_command(start)
-                command = command[command.find(" "):].strip()
-                maxlen = 40
-                if len(command) > maxlen:
-                    suffix = " ..."
-                    command = command[:maxlen-len(suffix)] + suffix
-                row.append(command)
+                row.append(short_command(_rebuild_scan_command(start)))
             else:
                 row.append(start.get(k, ""))
         table.addRow(row)
@@ -372,6 +533,25 @@ def listruns(
     return table
 
 
+@functools.lru_cache(maxsize=None)
+def _ophyd_structure_paths(cls):
+    """
+    dotted names of the EPICS signals in ophyd class ``cls``
+
+    The structure of a class is walked once (then remembered),
+    without creating any of its components.
+    """
+    if issubclass(cls, ophyd.signal.EpicsSignalBase):
+        return ("",)
+    elif issubclass(cls, ophyd.Device):
+        paths = []
+        for nm in cls.component_names:
+            for path in _ophyd_structure_paths(getattr(cls, nm).cls):
+                paths.append(f"{nm}.{path}" if path else nm)
+        return tuple(paths)
+    return ()
+
+
 def _ophyd_structure_walker(obj):
     """
     walk the structure of the ophyd obj
@@ -380,24 +560,35 @@ def _ophyd_structure_walker(obj):
 
     list of ophyd objects that are children of ``obj``
     """
-    # import pdb; pdb.set_trace()
-    if isinstance(obj, ophyd.signal.EpicsSignalBase):
-        return [obj]
-    elif isinstance(obj, ophyd.Device):
-        items = []
-        for nm in obj.component_names:
-            child = _get_named_child(obj, nm)
+    items = []
+    for path in _ophyd_structure_paths(type(obj)):
+        child = obj
+        for nm in path.split(".") if path else []:
+            child = _get_named_child(child, nm)
             if child in (None, "TIMEOUT"):
-                continue
-            result = _ophyd_structure_walker(child)
-            if result is not None:
-                items.extend(result)
-        return items
+                break
+        else:
+            items.append(child)
+    return items
 
 
-def object_explorer(obj, sortby=None, fmt='simple', printing=True):
+def object_explorer(
+        obj,
+        sortby=None,
+        fmt='simple',
+        printing=True,
+        timeout=None,
+        workers=None):
     """
     print the contents of obj
+
+    The EPICS signals of ``obj`` are read concurrently, by a pool
+    of ``workers`` threads (default: ``BULK_READ_WORKERS``), all
+    with the same deadline, ``timeout`` (s) from now (default:
+    ``BULK_READ_TIMEOUT``).  A signal not read by the deadline
+    (such as a disconnected PV) is shown as ``TIMEOUT``.
+    Values are read through the :class:`PVValueCache`, if enabled
+    (see :func:`enable_pv_cache`).
     """
     t = pyRestTable.Table()
     t.addLabel("name")
@@ -418,8 +609,15 @@ def object_explorer(obj, sortby=None, fmt='simple', printing=True):
                 )
         return key
 
-    for item in sorted(items, key=sorter):
-        t.addRow((item.dotted_name, _get_pv(item), item.get()))
+    items = sorted(items, key=sorter)
+    def get(item):
+        if _pv_cache is not None:
+            return _pv_cache.get(item)
+        return item.get()
+
+    values = _bulk_call(get, items, timeout, workers)
+    for item, value in zip(items, values):
+        t.addRow((item.dotted_name, _get_pv(item), value))
     if printing:
         print(t.reST(fmt=fmt))
     return t
@@ -493,7 +691,7 @@ def pairwise(iterable):
     return zip(a, a)
 
 
-def replay(headers, callback=None, sort=True):
+def replay(headers, callback=None, sort=True, speed=None, prefetch=REPLAY_PREFETCH):
     """
     replay the document stream from one (or more) scans (headers)
 
@@ -504,8 +702,10 @@ def replay(headers, callback=None, sort=True):
         A *scan* is an instance of a Bluesky `databroker.Header`.
         see: https://nsls-ii.github.io/databroker/api.html?highlight=header#header-api
 
-    callback: scan or [scan]
-        The Bluesky callback to handle the stream of documents from a scan.
+    callback: callback or [callback]
+        The Bluesky callback(s) to handle the stream of documents from a scan.
+        Each document is given to all the callbacks (in one pass), such as
+        ``[specwriter.receiver, nxwriter.receiver, bec]``.
         If `None`, then use the `bec` (BestEffortCallback) from the IPython shell.
         (default:``None``)
 
@@ -513,12 +713,31 @@ def replay(headers, callback=None, sort=True):
         Sort the headers chronologically if True.
         (default:``True``)
 
+    speed: float
+        Pace of the replay.  If `None`, replay the documents as fast as
+        possible.  Otherwise, replay with the timing of the original
+        documents (within each scan), faster by this factor (such as
+        ``1`` for the original timing, ``10`` for ten times faster).
+        Use a recorded scan as a realistic load to test callbacks.
+        (default:``None``)
+
+    prefetch: int
+        Read at most this many documents ahead, in a background thread,
+        while the callbacks handle the current document (even in the
+        next scan).  If ``0``, read in the caller's thread.
+        (default:``REPLAY_PREFETCH``)
+
     *new in apstools release 1.1.11*
     """
     callback = callback or ipython_shell_namespace().get(
         "bec",                  # get from IPython shell
         BestEffortCallback(),   # make one, if we must
         )
+    callbacks = callback
+    if not isinstance(callbacks, (list, tuple)):
+        callbacks = [callbacks]
+    if speed is not None and speed <= 0:
+        raise ValueError(f"speed must be positive, received: {speed}")
     _headers = headers   # do not mutate the input arg
     if isinstance(_headers, databroker.Header):
         _headers = [_headers]
@@ -535,17 +754,188 @@ def replay(headers, callback=None, sort=True):
         False: decreasing_time_sorter
         }[sort]
 
-    for h in sorted(_headers, key=sorter):
+    _headers = sorted(_headers, key=sorter)
+    for h in _headers:
         if not isinstance(h, databroker.Header):
             raise TypeError(
                 f"Must be a databroker Header: received: {type(h)}: |{h}|"
             )
-        cmd = _rebuild_scan_command(h.start)
-        logger.debug(f"{cmd}")
 
+    def documents():
+        for h in _headers:
+            cmd = _rebuild_scan_command(h.start)
+            logger.debug(f"{cmd}")
+            yield from h.documents()    # get the stream
+
+    stream = documents()
+    if prefetch > 0:
+        stream = _read_ahead(stream, prefetch)
+
+    n = 0
+    t0 = time.time()
+    t_start = None
+    with contextlib.closing(stream):
         # at last, this is where the real action happens
-        for k, doc in h.documents():    # get the stream
-            callback(k, doc)            # play it through the callback
+        for k, doc in stream:
+            if speed is not None:
+                t_doc = doc.get("time")
+                if isinstance(t_doc, list):     # a *page* of documents
+                    t_doc = min(t_doc, default=None)
+                if k == "start":
+                    t_start, t_wall = t_doc, time.time()
+                elif t_doc is not None and t_start is not None:
+                    delay = t_wall + (t_doc - t_start) / speed - time.time()
+                    if delay > 0:
+                        time.sleep(delay)
+            for cb in callbacks:
+                cb(k, doc)              # play it through the callback(s)
+            n += 1
+    logger.debug("replayed %d documents in %.3fs", n, time.time() - t0)
+
+
+def _read_ahead(iterable, size):
+    """
+    generator: items of ``iterable``, read ahead by a background thread
+
+    At most ``size`` items are waiting.  An exception from
+    ``iterable`` is raised here.  When this generator is closed,
+    the thread stops reading.
+    """
+    items = queue.Queue(maxsize=size)
+    stopping = threading.Event()
+
+    def put(item):
+        while not stopping.is_set():
+            try:
+                items.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def reader():
+        try:
+            for item in iterable:
+                if not put(("item", item)):
+                    return      # reading was stopped
+            put(("done", None))
+        except Exception as exc:
+            put(("error", exc))
+
+    thread = threading.Thread(target=reader, daemon=True, name="read_ahead")
+    thread.start()
+    try:
+        while True:
+            kind, item = items.get()
+            if kind == "done":
+                break
+            if kind == "error":
+                raise item
+            yield item
+    finally:
+        stopping.set()
+        thread.join()
+
+
+def run_statistics(runs, period="day"):
+    """
+    statistics of runs, binned by ``period`` of start time and by plan_name
+
+    PARAMETERS
+
+    runs (obj) :
+        ``pandas.DataFrame`` with a row for each run and columns:
+        ``plan_name``, ``time`` (start), ``stop_time``, and ``exit_status``.
+        (Runs that have not ended have no ``stop_time``.)
+    period (str) :
+        Bin the runs by the (local) ``hour``, ``day``, ``week``
+        (starting Monday), or APS ``cycle`` (such as ``2020-1``)
+        of their start time.  One of ``RUN_STATISTICS_PERIODS``.
+        (default: ``day``)
+
+    RETURNS
+
+    ``pandas.DataFrame`` with a row for each period and plan_name
+    (the index) and columns:
+
+    ==============  ===================================================
+    column          description
+    ==============  ===================================================
+    runs            number of runs
+    duration_total  total of the run durations, s (stop - start time)
+    duration_mean   average duration of a run, s
+    duration_max    longest duration of a run, s
+    duty_cycle      ``duration_total`` / (length of the period)
+    *exit_status*   fraction of runs which ended with each *exit_status*
+                    (such as ``success``, ``abort``, ``fail``)
+    ==============  ===================================================
+
+    The duration of a run is counted in the period when it started.
+    The duty cycle of the instrument (all plans) is::
+
+        stats = run_statistics(runs, "cycle")
+        duty = stats["duty_cycle"].groupby(level="period").sum()
+        dead_time = 1 - duty
+    """
+    if period not in RUN_STATISTICS_PERIODS:
+        raise ValueError(
+            f"period={period} not one of {RUN_STATISTICS_PERIODS}"
+        )
+    if len(runs) == 0:
+        return pandas.DataFrame(
+            columns="runs duration_total duration_mean duration_max duty_cycle".split()
+        )
+    start = pandas.to_datetime(runs["time"].astype(float), unit="s", utc=True)
+    start = start.dt.tz_convert(dateutil.tz.tzlocal()).dt.tz_localize(None)
+    if period == "hour":
+        bin_start = start.dt.floor("h")
+        bin_end = bin_start + pandas.Timedelta(hours=1)
+    elif period == "day":
+        bin_start = start.dt.floor("D")
+        bin_end = bin_start + pandas.Timedelta(days=1)
+    elif period == "week":
+        bin_start = start.dt.floor("D") - pandas.to_timedelta(start.dt.dayofweek, unit="D")
+        bin_end = bin_start + pandas.Timedelta(weeks=1)
+    else:   # cycle: 4 months, as in devices.ApsCycleComputedRO
+        n = (start.dt.month - 1) // 4
+        bin_start = pandas.to_datetime(
+            dict(year=start.dt.year, month=4*n + 1, day=1)
+        )
+        bin_end = pandas.to_datetime(
+            dict(year=start.dt.year + (n + 1) // 3, month=(4*n + 4) % 12 + 1, day=1)
+        )
+    if period == "cycle":
+        label = start.dt.year.astype(str) + "-" + (n + 1).astype(str)
+    else:
+        label = bin_start
+
+    table = pandas.DataFrame(
+        dict(
+            period=label,
+            plan_name=runs["plan_name"].fillna("unknown"),
+            duration=runs["stop_time"].astype(float) - runs["time"].astype(float),
+            length=(bin_end - bin_start).dt.total_seconds(),
+            exit_status=runs["exit_status"].fillna("none"),
+        )
+    )
+    keys = ["period", "plan_name"]
+    groups = table.groupby(keys)
+    stats = pandas.DataFrame(
+        dict(
+            runs=groups.size(),
+            duration_total=groups["duration"].sum(),
+            duration_mean=groups["duration"].mean(),
+            duration_max=groups["duration"].max(),
+            duty_cycle=groups["duration"].sum() / groups["length"].first(),
+        )
+    )
+    rates = pandas.crosstab(
+        [table["period"], table["plan_name"]],
+        table["exit_status"],
+        normalize="index",
+    )
+    rates.columns.name = None
+    return stats.join(rates)
 
 
 def run_in_thread(func):
@@ -745,14 +1135,14 @@ def split_quoted_line(line):
     return parts
 
 
-def summarize_runs(since=None, db=None):
+def summarize_runs(since=None, db=None, index=None, workers=None, period="cycle"):
     """
     Report bluesky run metrics from the databroker.
 
     * How many different plans?
     * How many runs?
     * How many times each run was used?
-    * How frequently?  (TODO:)
+    * How frequently?  (see :func:`run_statistics`)
 
     PARAMETERS
 
@@ -761,19 +1151,58 @@ def summarize_runs(since=None, db=None):
     db (object) :
         Instance of ``databroker.Broker()``
         (default: ``db`` from the IPython shell)
+    index (object) :
+        Instance of :class:`RunIndex`.  If given, answer from
+        this index instead of the databroker.
+        (default: ``None``)
+    workers (int) :
+        Number of threads to read runs from the databroker.
+        (default: ``RUN_FETCH_WORKERS``)
+    period (str) :
+        Bin the run statistics by ``hour``, ``day``, ``week``, or
+        (APS) ``cycle``.
+        (default: ``cycle``)
+
+    RETURNS
+
+    ``pandas.DataFrame`` of run statistics, from :func:`run_statistics`
     """
-    db = db or ipython_shell_namespace()["db"]
     since = since or "1995"     # no APS X-ray experiment data before 1995!
+    if index is not None:
+        plans = defaultdict(list)
+        for run in index.search(since=since):
+            plans[run["plan_name"] or "unknown"].append(run)
+    else:
+        plans = _summarize_catalog(since, db, workers)
+
+    def sorter(plan_name):
+        return len(plans[plan_name])
+
+    table = pyRestTable.Table()
+    table.labels = "plan quantity".split()
+    for k in sorted(plans.keys(), key=sorter, reverse=True):
+        table.addRow((k, sorter(k)))
+    table.addRow(("TOTAL", sum([len(v) for v in plans.values()])))
+    print(table)
+
+    runs = pandas.DataFrame(
+        [run for v in plans.values() for run in v],
+        columns="uid scan_id plan_name time stop_time exit_status".split(),
+    )
+    return run_statistics(runs, period)
+
+
+def _summarize_catalog(since, db, workers=None):
+    """runs (by plan_name) in the databroker since the date & time"""
+    db = db or ipython_shell_namespace()["db"]
     cat = db.v2.search(databroker.queries.TimeRange(since=since))
     plans = defaultdict(list)
+    latencies = []
     t0 = time.time()
-    for n, uid in enumerate(cat):
-        t1 = time.time()
-        run = cat[uid]      # this step is very slow (0.01 - 0.5 seconds each!)
-        t2 = time.time()
-        plan_name = run.metadata["start"].get("plan_name", "unknown")
-        dt = datetime.datetime.fromtimestamp(run.metadata["start"]["time"]).isoformat()
-        scan_id = run.metadata["start"].get("scan_id", "unknown")
+    for uid, start, stop, latency in fetch_runs(cat, workers, latencies=latencies):
+        plan_name = start.get("plan_name", "unknown")
+        dt = datetime.datetime.fromtimestamp(start["time"]).isoformat()
+        scan_id = start.get("scan_id", "unknown")
         plans[plan_name].append(
             dict(
                 plan_name=plan_name,
@@ -781,27 +1210,95 @@ def summarize_runs(since=None, db=None):
                 time_start=dt,
                 uid=uid,
                 scan_id=scan_id,
+                time=start["time"],
+                stop_time=stop.get("time"),
+                exit_status=stop.get("exit_status"),
             )
         )
         logger.debug(
-            "%s %s dt1=%4.01fus dt2=%5.01fms %s",
+            "%s %s dt=%5.01fms %s",
             scan_id,
             dt,
-            (t1-t0)*1e6,
-            (t2-t1)*1e3,
+            latency*1e3,
             plan_name,
             )
-        t0 = time.time()
+    logger.info(
+        "read %d runs in %.3fs, latency of each:\n%s",
+        len(latencies),
+        time.time() - t0,
+        _latency_histogram(latencies),
+    )
+    return plans
 
-    def sorter(plan_name):
-        return len(plans[plan_name])
 
+def fetch_runs(cat, workers=None, window=None, latencies=None):
+    """
+    generator: ``(uid, start, stop, latency)`` of each run in catalog ``cat``
+
+    Reading a run from the catalog is slow (0.01 - 0.5 seconds each!),
+    mostly waiting for the database.  With more than one of ``workers``
+    (default: ``RUN_FETCH_WORKERS``), a pool of threads reads the runs.
+    At most ``window`` runs (default: 4 per worker) are read ahead.
+    The runs are generated in the same order as ``cat``.  The time (s)
+    to read each run is the ``latency`` (also appended to ``latencies``,
+    if given).  ``stop`` is ``{}`` if the run has not ended.
+
+    PARAMETERS
+
+    cat : object
+        databroker v2 catalog (or search result)
+    workers : int
+        number of threads (default: ``RUN_FETCH_WORKERS``)
+    window : int
+        at most this many runs read ahead (default: ``4 * workers``)
+    latencies : list
+        if given, the latency of each run is appended
+    """
+    def fetch(uid):
+        t0 = time.time()
+        run = cat[uid]
+        start = run.metadata["start"]
+        stop = run.metadata["stop"] or {}   # run has not ended
+        return uid, start, stop, time.time() - t0
+
+    def report(result):
+        if latencies is not None:
+            latencies.append(result[-1])
+        return result
+
+    workers = workers or RUN_FETCH_WORKERS
+    if workers <= 1:
+        for uid in cat:
+            yield report(fetch(uid))
+        return
+
+    window = window or 4 * workers
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        try:
+            for uid in cat:
+                pending.append(pool.submit(fetch, uid))
+                if len(pending) >= window:
+                    yield report(pending.popleft().result())
+            while len(pending) > 0:
+                yield report(pending.popleft().result())
+        finally:
+            for future in pending:  # such as when generator is closed
+                future.cancel()
+
+
+def _latency_histogram(latencies, bins=RUN_FETCH_LATENCY_BINS):
+    """table: how many reads (``latencies``, s) in each range of time (ms)"""
+    counts = [0] * (len(bins) + 1)
+    for latency in latencies:
+        counts[bisect.bisect_right(bins, latency*1e3)] += 1
+    edges = [0] + list(bins) + ["..."]
     table = pyRestTable.Table()
-    table.labels = "plan quantity".split()
-    for k in sorted(plans.keys(), key=sorter, reverse=True):
-        table.addRow((k, sorter(k)))
-    table.addRow(("TOTAL", n+1))
-    print(table)
+    table.labels = "latency_ms quantity".split()
+    for lo, hi, n in zip(edges, edges[1:], counts):
+        if n > 0:
+            table.addRow((f"{lo} - {hi}", n))
+    return table
 
 
 def text_encode(source):
@@ -859,10 +1356,15 @@ def unix(command, raises=True):
     return stdout, stderr
 
 
-def connect_pvlist(pvlist, wait=True, timeout=2, poll_interval=0.1):
+def connect_pvlist(pvlist, wait=True, timeout=2, poll_interval=0.1, latencies=None):
     """
     given a list of EPICS PV names, return a dictionary of EpicsSignal objects
 
+    All the PVs connect in parallel.  Each PV reports its connection
+    (with a callback), so this returns as soon as all have connected.
+    PVs not connected by the deadline (``timeout`` after the call)
+    are reported and not returned.
+
     PARAMETERS
 
     pvlist : list(str)
@@ -870,10 +1372,14 @@ def connect_pvlist(pvlist, wait=True, timeout=2, poll_interval=0.1):
     wait : bool
         should wait for EpicsSignal objects to connect, default: True
     timeout : float
-        maximum time to wait for PV connections, seconds, default: 2.0
+        maximum time to wait for (all) PV connections, seconds, default: 2.0
     poll_interval : float
-        time to sleep between checks for PV connections, seconds, default: 0.1
+        not used (PV connections are reported by callbacks)
+    latencies : list
+        If given, the time (s) for each PV to connect is appended.
+        (default: ``None``)
     """
+    t0 = time.time()
     obj_dict = OrderedDict()
     for item in pvlist:
         if len(item.strip()) == 0:
@@ -884,19 +1390,17 @@ def connect_pvlist(pvlist, wait=True, timeout=2, poll_interval=0.1):
         obj_dict[oname] = obj
 
     if wait:
-        times_up = time.time() + min(0, timeout)
-        poll_interval = min(0.01, poll_interval)
-        waiting = True
-        while waiting and time.time() < times_up:
-            time.sleep(poll_interval)
-            waiting = False in [o.connected for o in obj_dict.values()]
-        if waiting:
+        waiting = _wait_for_connections(
+            obj_dict.values(), timeout, t0=t0, latencies=latencies
+        )
+        if len(waiting) > 0:
+            stragglers = [id(v) for v in waiting]
             n = OrderedDict()
             for k, v in obj_dict.items():
-                if v.connected:
-                    n[k] = v
-                else:
+                if id(v) in stragglers:
                     print(f"Could not connect {v.pvname}")
+                else:
+                    n[k] = v
             if len(n) == 0:
                 raise RuntimeError("Could not connect any PVs in the list")
             obj_dict = n
@@ -904,6 +1408,227 @@ def connect_pvlist(pvlist, wait=True, timeout=2, poll_interval=0.1):
     return obj_dict
 
 
+def _wait_for_connections(objects, timeout, t0=None, latencies=None):
+    """
+    wait (until ``t0 + timeout``) for all the ophyd signals to connect
+
+    Each signal reports when it connects (a ``SUB_META`` callback).
+    The wait ends when all have connected, or at the deadline.
+    The time (s, from ``t0``) for each signal to connect is appended
+    to ``latencies`` (if given).  Returns the list of signals
+    not connected.
+    """
+    t0 = t0 or time.time()
+    objects = list(objects)
+    pending = {id(obj) for obj in objects}
+    connected = {}          # connection latency, by id
+    lock = threading.Lock()
+    all_connected = threading.Event()
+
+    def mark(obj):
+        with lock:
+            if id(obj) in pending:
+                pending.remove(id(obj))
+                connected[id(obj)] = time.time() - t0
+                if len(pending) == 0:
+                    all_connected.set()
+
+    def on_metadata(*args, obj=None, **kwargs):
+        if kwargs.get("connected"):
+            mark(obj)
+
+    subscriptions = [
+        (obj, obj.subscribe(on_metadata, event_type=obj.SUB_META, run=False))
+        for obj in objects
+    ]
+    try:
+        for obj in objects:
+            if obj.connected:       # before subscribing
+                mark(obj)
+        if len(objects) == 0:
+            all_connected.set()
+        all_connected.wait(max(0, t0 + timeout - time.time()))
+    finally:
+        for obj, cid in subscriptions:
+            obj.unsubscribe(cid)
+
+    with lock:
+        waiting = [obj for obj in objects if id(obj) in pending]
+        times = list(connected.values())
+    if latencies is not None:
+        latencies.extend(times)
+    logger.info(
+        "connected %d of %d in %.3fs, latency of each:\n%s",
+        len(times),
+        len(objects),
+        time.time() - t0,
+        _latency_histogram(times),
+    )
+    return waiting
+
+
+class PVValueCache(object):
+    """
+    cache of the values of ophyd signals (such as EPICS PVs), kept by monitors
+
+    The first time a signal is read, the cache subscribes to its
+    value (once for each PV, an EPICS monitor).  Each update from the
+    monitor is kept in memory, so later reads (while the value is
+    *fresh*) do not ask the IOC again.  A value is fresh while its
+    signal is connected and (if ``max_age`` is given) it was updated
+    within ``max_age`` seconds.  A value which is not fresh is read
+    again from the signal.
+
+    Subscriptions not used for ``idle_timeout`` seconds are removed,
+    as are the least recently used when there are more than ``max_size``.
+
+    See :func:`enable_pv_cache` to use one cache (in this process) for
+    :func:`object_explorer` and :func:`device_read2table`.
+
+    PARAMETERS
+
+    max_age : float
+        Values older than this (s) are read again.
+        (default: ``None``, a value kept by a monitor is fresh)
+    max_size : int
+        Most signals to keep.
+        (default: ``PV_CACHE_SIZE``)
+    idle_timeout : float
+        Remove signals not read for this long (s).
+        (default: ``PV_CACHE_IDLE_TIMEOUT``)
+
+    .. autosummary::
+
+       ~clear
+       ~get
+       ~prune
+       ~read
+    """
+
+    def __init__(
+            self,
+            max_age=None,
+            max_size=PV_CACHE_SIZE,
+            idle_timeout=PV_CACHE_IDLE_TIMEOUT):
+        self.max_age = max_age
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()   # least recently used first
+        self._lock = threading.RLock()
+
+    def __contains__(self, signal):
+        return self._key(signal) in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _key(self, signal):
+        """one entry for each PV (or signal, if not EPICS)"""
+        return getattr(signal, "pvname", None) or id(signal)
+
+    def clear(self):
+        """remove all signals (and their subscriptions)"""
+        with self._lock:
+            entries = list(self._entries.values())
+            self._entries.clear()
+        for entry in entries:
+            entry["signal"].unsubscribe(entry["cid"])
+
+    def get(self, signal):
+        """value of ``signal``, from memory if fresh"""
+        return self.read(signal)["value"]
+
+    def prune(self):
+        """remove idle signals, then the least recently used over ``max_size``"""
+        now = time.time()
+        evicted = []
+        with self._lock:
+            for key, entry in list(self._entries.items()):
+                if now - entry["used"] > self.idle_timeout:
+                    evicted.append(self._entries.pop(key))
+            while len(self._entries) > self.max_size:
+                evicted.append(self._entries.popitem(last=False)[1])
+        for entry in evicted:
+            entry["signal"].unsubscribe(entry["cid"])
+
+    def read(self, signal):
+        """reading (``value`` and ``timestamp``) of ``signal``, from memory if fresh"""
+        key = self._key(signal)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry["used"] = now
+                self._entries.move_to_end(key)
+                if signal.connected and (
+                    self.max_age is None
+                    or now - entry["updated"] <= self.max_age
+                ):
+                    self.hits += 1
+                    return dict(value=entry["value"], timestamp=entry["timestamp"])
+            self.misses += 1
+
+        reading = signal.read()[signal.name]     # from the IOC
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = dict(signal=signal, used=now)
+                self._entries[key] = entry
+                entry["cid"] = signal.subscribe(
+                    functools.partial(self._update, key),
+                    event_type=signal.SUB_VALUE,
+                    run=False,
+                )
+            entry.update(
+                value=reading["value"],
+                timestamp=reading["timestamp"],
+                updated=time.time(),
+            )
+        self.prune()
+        return dict(value=reading["value"], timestamp=reading["timestamp"])
+
+    def _update(self, key, *args, value=None, timestamp=None, **kwargs):
+        """monitor: new value of a signal"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry.update(
+                    value=value,
+                    timestamp=timestamp or time.time(),
+                    updated=time.time(),
+                )
+
+
+def enable_pv_cache(**kwargs):
+    """
+    use one :class:`PVValueCache` in this process (for the inspection tools)
+
+    :func:`object_explorer` and :func:`device_read2table` read the
+    values of signals through this cache.  Keyword arguments are
+    given to :class:`PVValueCache`.  Returns the cache.
+
+    EXAMPLE::
+
+        enable_pv_cache(max_age=60)
+        object_explorer(scaler)     # reads each PV from the IOC
+        object_explorer(scaler)     # from memory
+    """
+    global _pv_cache
+    disable_pv_cache()
+    _pv_cache = PVValueCache(**kwargs)
+    return _pv_cache
+
+
+def disable_pv_cache():
+    """stop using (and clear) the :class:`PVValueCache` of this process"""
+    global _pv_cache
+    if _pv_cache is not None:
+        _pv_cache.clear()
+    _pv_cache = None
+
+
 class EmailNotifications(object):
     """
     send email notifications when requested
@@ -987,33 +1712,23 @@ class ExcelDatabaseFileBase(object):
         raise NotImplementedError("subclass must override handleExcelRowEntry() method")
 
     def parse(self, labels_row_num=None, data_start_row_num=None, ignore_extra=True):
+        """
+        read the table from the Excel file
+
+        The file is read once (the table boundaries are found in the
+        same read).  The table is remembered (by file name, modification
+        time, and size) so a file which has not changed is not read again.
+        """
         labels_row_num = labels_row_num or self.LABELS_ROW
-        try:
-            if ignore_extra:
-                # ignore data outside of table in spreadsheet file
-                nrows, ncols = self.getTableBoundaries(labels_row_num)
-                xl = pandas.read_excel(
-                    self.fname,
-                    sheet_name=self.sheet_name,
-                    skiprows=labels_row_num,
-                    usecols=range(ncols),
-                    nrows=nrows,
-                    )
-            else:
-                xl = pandas.read_excel(
-                    self.fname,
-                    sheet_name=self.sheet_name,
-                    header=None,
-                    )
-        except xlrd.XLRDError as exc:
-            raise ExcelReadError(exc)
-        self.data_labels = list(map(str, xl.columns.values))
+        self.data_labels, rows = _read_excel_table(
+            self.fname, self.sheet_name, labels_row_num, ignore_extra
+        )
         # unused: data_start_row_num = data_start_row_num or labels_row_num+1
-        for row_data in xl.values:
+        for row_data in rows:
             entry = OrderedDict()
             for _col, label in enumerate(self.data_labels):
                 entry[label] = self._getExcelColumnValue(row_data, _col)
-                self.handle_single_entry(entry)
+            self.handle_single_entry(entry)
             self.handleExcelRowEntry(entry)
 
     def _getExcelColumnValue(self, row_data, col):
@@ -1027,9 +1742,7 @@ class ExcelDatabaseFileBase(object):
         return v
 
     def _isExcel_nan(self, value):
-        if not isinstance(value, float):
-            return False
-        return math.isnan(value)
+        return _isExcel_nan(value)
 
     def getTableBoundaries(self, labels_row_num=None):
         """
@@ -1037,22 +1750,87 @@ class ExcelDatabaseFileBase(object):
         """
         labels_row_num = labels_row_num or self.LABELS_ROW
         xl = pandas.read_excel(self.fname, sheet_name=self.sheet_name, skiprows=labels_row_num)
+        return _excel_table_boundaries(xl)
 
-        ncols = len(xl.columns)
-        for i, k in enumerate(xl.columns):
-            if k.startswith(f"Unnamed: {i}"):
-                # TODO: verify all values under this label are NaN
-                ncols = i
-                break
 
-        nrows = len(xl.values)
-        for j, r in enumerate(xl.values):
-            r = r[:ncols]
-            if False not in [self._isExcel_nan(value) for value in r]:
-                nrows = j
-                break
+def _excel_table_boundaries(xl):
+    """(nrows, ncols) of the table in DataFrame ``xl`` (read from Excel)"""
+    ncols = len(xl.columns)
+    for i, k in enumerate(xl.columns):
+        if str(k).startswith(f"Unnamed: {i}"):
+            # TODO: verify all values under this label are NaN
+            ncols = i
+            break
+
+    nrows = len(xl.values)
+    for j, r in enumerate(xl.values):
+        r = r[:ncols]
+        if False not in [_isExcel_nan(value) for value in r]:
+            nrows = j
+            break
+
+    return nrows, ncols
+
 
-        return nrows, ncols
+def _isExcel_nan(value):
+    if not isinstance(value, float):
+        return False
+    return math.isnan(value)
+
+
+def _read_excel_table(fname, sheet_name, labels_row_num, ignore_extra):
+    """
+    column labels and rows of the table in the Excel file (cached)
+
+    With ``ignore_extra``, the cells are read once (without conversion)
+    to find the boundaries of the table, then the data types of the
+    columns of the table are found, as if only the table had been read.
+    """
+    stat = os.stat(fname)
+    key = (os.path.abspath(fname), sheet_name, labels_row_num, ignore_extra)
+    signature = (stat.st_mtime_ns, stat.st_size)
+    with _excel_table_lock:
+        cached = _excel_table_cache.get(key)
+        if cached is not None and cached[0] == signature:
+            _excel_table_cache.move_to_end(key)
+            return cached[1]
+
+    t0 = time.time()
+    try:
+        if ignore_extra:
+            # ignore data outside of table in spreadsheet file
+            xl = pandas.read_excel(
+                fname,
+                sheet_name=sheet_name,
+                skiprows=labels_row_num,
+                dtype=object,
+                )
+            nrows, ncols = _excel_table_boundaries(xl)
+            xl = xl.iloc[:nrows, :ncols].infer_objects()
+            for label in xl.columns:
+                if xl[label].dtype == object:
+                    try:    # such as numbers entered as text
+                        xl[label] = pandas.to_numeric(xl[label])
+                    except (TypeError, ValueError):
+                        pass
+        else:
+            xl = pandas.read_excel(
+                fname,
+                sheet_name=sheet_name,
+                header=None,
+                )
+    except (xlrd.XLRDError, ValueError) as exc:
+        # such as: not an Excel file
+        raise ExcelReadError(exc)
+    table = list(map(str, xl.columns.values)), list(xl.values)
+    logger.debug("read %s in %.3fs", fname, time.time() - t0)
+
+    with _excel_table_lock:
+        _excel_table_cache[key] = (signature, table)
+        _excel_table_cache.move_to_end(key)
+        while len(_excel_table_cache) > EXCEL_TABLE_CACHE_SIZE:
+            _excel_table_cache.popitem(last=False)
+    return table
 
 
 class ExcelDatabaseFileGeneric(ExcelDatabaseFileBase):
@@ -1181,6 +1959,371 @@ class ExcelDatabaseFileGeneric(ExcelDatabaseFileBase):
         self._index_ += 1
 
 
+class RunIndex(object):
+    """
+    local (SQLite) index of the metadata of runs in a databroker catalog
+
+    Reading the metadata of a run from the catalog is slow (``cat[uid]``
+    takes 0.01 - 0.5 seconds).  The index keeps a summary of each run
+    (uid, time, scan_id, plan_name, exit_status, ...) and the
+    selected ``keys`` of its start document in a local SQLite file.
+    :func:`listruns`, :func:`summarize_runs`, and
+    :func:`print_snapshot_list` answer from the index
+    when given ``index=``.
+
+    Call :meth:`sync` to add new runs from the catalog.  Only runs
+    since the *watermark* (the time of the most recent run in the
+    index, or of the earliest run that had not yet ended) are read.
+    A run that never ends (such as when the session was killed) is
+    read again only while it started within ``open_window`` of the
+    most recent run in the index.
+
+    PARAMETERS
+
+    filename : str
+        Name of the SQLite file.  (Created if it does not exist.)
+    db : object
+        Instance of databroker v1 ``Broker`` or v2 ``catalog``
+        (default: see ``catalog_name`` keyword argument)
+    catalog_name : str
+        Name of databroker v2 catalog, used when supplied ``db`` is ``None``.
+        (default: ``mongodb_config``)
+    keys : [str]
+        Also keep these keys from the start document.
+        (default: ``RUN_INDEX_KEYS``)
+        If these are changed, the index is rebuilt on the next :meth:`sync`.
+    open_window : float
+        Runs (started within this many seconds of the most recent run)
+        which have not ended are read again by :meth:`sync`.
+        (default: ``RUN_INDEX_OPEN_WINDOW``, one day)
+
+    EXAMPLE::
+
+        index = RunIndex("~/.runs_index.sqlite", db=db, keys=["purpose", "file_name"])
+        index.sync()
+        listruns(index=index, keys=["file_name"], exit_status="fail")
+
+    .. autosummary::
+
+       ~clear
+       ~search
+       ~sync
+       ~watermark
+    """
+
+    def __init__(self, filename, db=None, catalog_name=None, keys=None, open_window=None):
+        self.filename = os.path.abspath(os.path.expanduser(filename))
+        self.db = db
+        self.catalog_name = catalog_name or "mongodb_config"
+        self.keys = list(keys or RUN_INDEX_KEYS)
+        if open_window is None:
+            open_window = RUN_INDEX_OPEN_WINDOW
+        self.open_window = open_window
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS runs ("
+                " uid TEXT PRIMARY KEY,"
+                " time REAL,"
+                " scan_id INTEGER,"
+                " plan_name TEXT,"
+                " exit_status TEXT,"
+                " stop_time REAL,"
+                " num_keys INTEGER,"
+                " command TEXT,"
+                " metadata TEXT)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS runs_time ON runs (time)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT)"
+            )
+
+    def __len__(self):
+        with self._connect() as conn:
+            n = conn.execute("SELECT COUNT(*) FROM runs").fetchone()[0]
+        return n
+
+    def _connect(self):
+        """connection to the SQLite file: commit (or rollback), then close"""
+        return _sqlite_connect(self.filename)
+
+    def clear(self):
+        """remove all runs from the index"""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM runs")
+            conn.execute("DELETE FROM settings")
+
+    def search(self, num=None, since=None, until=None, **terms):
+        """
+        summaries of the runs (most recent first) which match all ``terms``
+
+        PARAMETERS
+
+        num : int
+            At most this many runs.  (default: all)
+        since, until : str or float
+            Time range of the runs, as for ``databroker.queries.TimeRange``.
+        terms : dict
+            Each value must match exactly.  Keys may be any of
+            ``RUN_INDEX_COLUMNS`` or ``self.keys``.
+
+        RETURNS
+
+        list of dict:
+            summary of each run, ``metadata`` has the selected keys
+        """
+        where = []
+        params = []
+        if since is not None or until is not None:
+            kwargs = dict(since=since, until=until)
+            query = databroker.queries.TimeRange(
+                **{k: v for k, v in kwargs.items() if v is not None}
+            ).query["time"]
+            if "$gte" in query:
+                where.append("time >= ?")
+                params.append(query["$gte"])
+            if "$lt" in query:
+                where.append("time < ?")
+                params.append(query["$lt"])
+        metadata_terms = {}
+        for k, v in terms.items():
+            if k in RUN_INDEX_COLUMNS:
+                where.append(f"{k} = ?")
+                params.append(v)
+            elif k in self.keys:
+                metadata_terms[k] = v
+            else:
+                raise ValueError(
+                    f"Cannot search the index for '{k}'."
+                    f"  Not one of: {RUN_INDEX_COLUMNS + self.keys}"
+                )
+        sql = "SELECT * FROM runs"
+        if len(where) > 0:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY time DESC"
+
+        runs = []
+        with self._connect() as conn:
+            conn.row_factory = sqlite3.Row
+            for row in conn.execute(sql, params):
+                if num is not None and len(runs) >= num:
+                    break
+                run = dict(row)
+                run["metadata"] = json.loads(run["metadata"])
+                if all([
+                    run["metadata"].get(k) == v
+                    for k, v in metadata_terms.items()
+                ]):
+                    runs.append(run)
+        return runs
+
+    def sync(self, db=None, workers=None):
+        """
+        add (or update) the runs since the watermark from the catalog
+
+        All the runs are added (in one transaction) or none (such as
+        if interrupted).  Returns the number of runs read from the catalog.
+        ``workers`` is the number of threads to read runs from the
+        catalog (default: ``RUN_FETCH_WORKERS``).
+        """
+        db = db or self.db or databroker.catalog[self.catalog_name]
+        cat = db.v2
+
+        keys = json.dumps(self.keys)
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT value FROM settings WHERE key = 'keys'"
+            ).fetchone()
+        if row is not None and row[0] != keys:
+            logger.info("index keys changed, rebuilding: %s", self.filename)
+            self.clear()
+
+        watermark = self.watermark
+        if watermark is not None:
+            cat = cat.search(databroker.queries.TimeRange(since=watermark))
+
+        def jsonable(value):
+            try:
+                json.dumps(value, cls=NumpyEncoder)
+            except (TypeError, ValueError):
+                value = str(value)
+            return value
+
+        n = 0
+        t0 = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO settings (key, value) VALUES ('keys', ?)",
+                (keys,)
+            )
+            for uid, start, stop, latency in fetch_runs(cat, workers):
+                metadata = {
+                    k: jsonable(start[k])
+                    for k in self.keys
+                    if k in start
+                }
+                conn.execute(
+                    "INSERT OR REPLACE INTO runs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        start["uid"],
+                        start["time"],
+                        start.get("scan_id"),
+                        start.get("plan_name"),
+                        stop.get("exit_status"),
+                        stop.get("time"),
+                        len(start),
+                        _rebuild_scan_command(start),
+                        json.dumps(metadata, cls=NumpyEncoder),
+                    )
+                )
+                n += 1
+        logger.debug("synced %d runs in %.3fs: %s", n, time.time()-t0, self.filename)
+        return n
+
+    @property
+    def watermark(self):
+        """time from which :meth:`sync` reads the catalog (``None``: all)"""
+        with self._connect() as conn:
+            t_last = conn.execute("SELECT MAX(time) FROM runs").fetchone()[0]
+            if t_last is None:
+                return None
+            # recent runs that had not ended must be read again
+            # (older ones are orphans, such as from a killed session)
+            t_open = conn.execute(
+                "SELECT MIN(time) FROM runs"
+                " WHERE stop_time IS NULL AND time >= ?",
+                (t_last - self.open_window,)
+            ).fetchone()[0]
+        if t_open is not None:
+            return t_open
+        return t_last
+
+
+class ExportManifest(object):
+    """
+    local (SQLite) record of the runs exported, with their fingerprints
+
+    The *fingerprint* (see :func:`run_fingerprint`) of a run changes
+    when its stop document is written or replaced, or when the number
+    of its events changes.  Export tools (:func:`json_export`,
+    :func:`~apstools.export.export_runs`) given a manifest write
+    only the runs that are new or have changed since they were last
+    recorded, so repeated (such as nightly) exports of a catalog cost
+    in proportion to the new runs, not the size of the catalog.
+
+    Runs which have not ended (no stop document) have no fingerprint
+    and are never current:  they are exported again each time.
+
+    PARAMETERS
+
+    filename : str
+        Name of the SQLite file.  (Created if it does not exist.)
+
+    EXAMPLE::
+
+        manifest = ExportManifest("~/archive/manifest.sqlite")
+        headers = db(since="2020-06-01")
+        json_export(headers, "data-2020-06-02.jsonl", lines=True, manifest=manifest)
+
+    .. autosummary::
+
+       ~clear
+       ~destination
+       ~fingerprints
+       ~is_current
+       ~record
+    """
+
+    def __init__(self, filename):
+        self.filename = os.path.abspath(os.path.expanduser(filename))
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS exports ("
+                " uid TEXT PRIMARY KEY,"
+                " fingerprint TEXT,"
+                " destination TEXT,"
+                " time REAL)"
+            )
+
+    def __contains__(self, uid):
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT 1 FROM exports WHERE uid = ?", (uid,)
+            ).fetchone()
+        return row is not None
+
+    def __len__(self):
+        with self._connect() as conn:
+            n = conn.execute("SELECT COUNT(*) FROM exports").fetchone()[0]
+        return n
+
+    def _connect(self):
+        """connection to the SQLite file: commit (or rollback), then close"""
+        return _sqlite_connect(self.filename)
+
+    def clear(self):
+        """forget all runs (all will be exported again)"""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM exports")
+
+    def destination(self, uid):
+        """where run ``uid`` was last exported (``None`` if never)"""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT destination FROM exports WHERE uid = ?", (uid,)
+            ).fetchone()
+        if row is None:
+            return None
+        return row[0]
+
+    def fingerprints(self):
+        """dictionary ``{uid: fingerprint}`` of all runs recorded"""
+        with self._connect() as conn:
+            rows = conn.execute("SELECT uid, fingerprint FROM exports").fetchall()
+        return dict(rows)
+
+    def is_current(self, uid, fingerprint):
+        """Has run ``uid`` been exported with this ``fingerprint``?"""
+        if fingerprint is None:
+            return False
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT fingerprint FROM exports WHERE uid = ?", (uid,)
+            ).fetchone()
+        return row is not None and row[0] == fingerprint
+
+    def record(self, uid, fingerprint, destination=None):
+        """remember that run ``uid`` was exported (to ``destination``)"""
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO exports VALUES (?, ?, ?, ?)",
+                (uid, fingerprint, destination, time.time())
+            )
+
+
+def run_fingerprint(stop):
+    """
+    fingerprint of a run's content, from its ``stop`` document
+
+    Made from the uid of the stop document and its ``num_events``
+    (of each stream).  ``None`` if the run has not ended.
+    """
+    if stop is None or "uid" not in stop:
+        return None
+    num_events = dict(stop.get("num_events") or {})
+    return json.dumps([stop["uid"], num_events], sort_keys=True)
+
+
+@contextlib.contextmanager
+def _sqlite_connect(filename):
+    """connection to the SQLite file: commit (or rollback), then close"""
+    conn = sqlite3.connect(filename)
+    try:
+        with conn:
+            yield conn
+    finally:
+        conn.close()
+
+
 def ipython_profile_name():
     """
     return the name of the current ipython profile or `None`
@@ -1266,7 +2409,7 @@ def plot_prune_fifo(bec, n, y, x):
         return lp
 
 
-def print_snapshot_list(db, printing=True, **search_criteria):
+def print_snapshot_list(db, printing=True, index=None, **search_criteria):
     """
     print (stdout) a list of all snapshots in the databroker
 
@@ -1276,6 +2419,10 @@ def print_snapshot_list(db, printing=True, **search_criteria):
         print_snapshot_list(db, purpose="this is an example")
         print_snapshot_list(db, since="2018-12-21", until="2019")
 
+    If ``index`` (instance of :class:`RunIndex`) is given, answer
+    from this index instead of ``db``.  The index must keep the
+    ``iso8601`` and ``purpose`` keys (default in :class:`RunIndex`).
+
     EXAMPLE::
 
         In [16]: from apstools.utils import print_snapshot_list
@@ -1347,16 +2494,22 @@ def print_snapshot_list(db, printing=True, **search_criteria):
     t.addLabel("#items")
     t.addLabel("purpose")
     search_criteria["plan_name"] = "snapshot"
-    for i, h in enumerate(db(**search_criteria)):
-        uid = h.start["uid"].split("-")[0]
-        n = len(list(h.start.keys()))
-        t.addRow((i, uid, h.start["iso8601"], n, h.start["purpose"]))
+    if index is not None:
+        for i, run in enumerate(index.search(**search_criteria)):
+            uid = run["uid"].split("-")[0]
+            md = run["metadata"]
+            t.addRow((i, uid, md["iso8601"], run["num_keys"], md["purpose"]))
+    else:
+        for i, h in enumerate(db(**search_criteria)):
+            uid = h.start["uid"].split("-")[0]
+            n = len(list(h.start.keys()))
+            t.addRow((i, uid, h.start["iso8601"], n, h.start["purpose"]))
     if printing:
         print(t)
     return t
 
 
-def json_export(headers, filename, zipfilename=None):
+def json_export(headers, filename, zipfilename=None, lines=False, manifest=None):
     """
     write a list of headers (from databroker) to a file
 
@@ -1372,6 +2525,18 @@ def json_export(headers, filename, zipfilename=None):
 
         .. note::  If writing to a ZIP file, the data file is
            *only* written into the ZIP file.
+    lines : bool
+        If True, write `JSON Lines <https://jsonlines.org/>`_:
+        one ``[name, doc]`` document per line, written as each
+        document is read.  Memory used does not depend on the
+        number of headers.  Otherwise, write all documents as one
+        JSON list of datasets.
+        (default: ``False``)
+    manifest : str or :class:`ExportManifest`
+        If given, write only the headers which are new or have
+        changed since they were recorded in this manifest, then
+        record them.
+        (default: ``None``, write all headers)
 
     EXAMPLE::
 
@@ -1396,16 +2561,77 @@ def json_export(headers, filename, zipfilename=None):
 
         datasets = json_import("data.json)
 
+    EXAMPLE: WRITE ONLY THE NEW RUNS (NIGHTLY)
+
+    using :class:`~ExportManifest`::
+
+        json_export(
+            db(since="2020-06-01"),
+            "data-2020-06-02.jsonl",
+            lines=True,
+            manifest="~/archive/manifest.sqlite")
+
+    EXAMPLE: WRITE AND READ JSON LINES
+
+    using :meth:`~iter_json_import`::
+
+        json_export(headers, "data.jsonl", zipfilename="bluesky_data.zip", lines=True)
+        for name, doc in iter_json_import("data.jsonl", zipfilename="bluesky_data.zip"):
+            db.insert(name, doc)
+
     """
-    datasets = [list(h.documents()) for h in headers]
-    buf = json.dumps(datasets, cls=NumpyEncoder, indent=2)
+    fingerprints = {}
+    if manifest is not None:
+        if not isinstance(manifest, ExportManifest):
+            manifest = ExportManifest(manifest)
+        recorded = manifest.fingerprints()
+        changed = []
+        for h in headers:
+            uid = h.start["uid"]
+            fingerprints[uid] = run_fingerprint(h.stop)
+            if fingerprints[uid] is None or recorded.get(uid) != fingerprints[uid]:
+                changed.append(h)
+        logger.debug(
+            "json_export: %d of %d headers new or changed",
+            len(changed), len(fingerprints)
+        )
+        headers = changed
+
+    if not lines:
+        datasets = [list(h.documents()) for h in headers]
+        buf = json.dumps(datasets, cls=NumpyEncoder, indent=2)
 
-    if zipfilename is None:
-        with open(filename, "w") as fp:
-            fp.write(buf)
+        if zipfilename is None:
+            with open(filename, "w") as fp:
+                fp.write(buf)
+        else:
+            with zipfile.ZipFile(zipfilename, "w", allowZip64=True) as fp:
+                fp.writestr(filename, buf, compress_type=zipfile.ZIP_LZMA)
     else:
-        with zipfile.ZipFile(zipfilename, "w", allowZip64=True) as fp:
-            fp.writestr(filename, buf, compress_type=zipfile.ZIP_LZMA)
+        def write_lines(fp):
+            for h in headers:
+                for name, doc in h.documents():
+                    fp.write(json.dumps([name, doc], cls=NumpyEncoder))
+                    fp.write("\n")
+
+        if zipfilename is None:
+            with open(filename, "w") as fp:
+                write_lines(fp)
+        else:
+            with zipfile.ZipFile(
+                zipfilename, "w", compression=zipfile.ZIP_LZMA, allowZip64=True
+            ) as zf:
+                with zf.open(filename, "w", force_zip64=True) as member:
+                    with io.TextIOWrapper(member, encoding="utf-8") as fp:
+                        write_lines(fp)
+
+    if manifest is not None:
+        destination = os.path.abspath(zipfilename or filename)
+        if zipfilename is not None:
+            destination += f":{filename}"
+        for h in headers:
+            uid = h.start["uid"]
+            manifest.record(uid, fingerprints[uid], destination)
 
 
 def json_import(filename, zipfilename=None):
@@ -1433,19 +2659,357 @@ def json_import(filename, zipfilename=None):
                 for k, doc in h:
                     db.insert(k, doc)
 
+    To read one document at a time, use :meth:`~iter_json_import()`.
     """
-    if zipfilename is None:
-        with open(filename, "r") as fp:
-            buf = fp.read()
-            datasets = json.loads(buf)
-    else:
-        with zipfile.ZipFile(zipfilename, "r") as fp:
-            buf = fp.read(filename).decode("utf-8")
-            datasets = json.loads(buf)
-
+    datasets = []
+    for name, doc in iter_json_import(filename, zipfilename):
+        if name == "start" or len(datasets) == 0:
+            datasets.append([])
+        datasets[-1].append([name, doc])
     return datasets
 
 
+def iter_json_import(filename, zipfilename=None):
+    """
+    generator: ``(name, doc)`` of each document in file from :meth:`~json_export()`
+
+    Documents are read one at a time from a JSON Lines file
+    (``json_export(..., lines=True)``).  A JSON file (written
+    by ``json_export(..., lines=False)``) must be read completely
+    before the first document is generated.
+
+    EXAMPLE
+
+    Insert the documents into the databroker ``db``::
+
+        for name, doc in iter_json_import("data.jsonl", "bluesky_data.zip"):
+            db.insert(name, doc)
+
+    """
+    with contextlib.ExitStack() as stack:
+        if zipfilename is None:
+            fp = stack.enter_context(open(filename, "r"))
+        else:
+            zf = stack.enter_context(zipfile.ZipFile(zipfilename, "r"))
+            member = stack.enter_context(zf.open(filename, "r"))
+            fp = stack.enter_context(io.TextIOWrapper(member, encoding="utf-8"))
+
+        first = fp.readline()
+        if len(first) == 0:
+            return      # empty file, such as no runs to export
+        try:
+            item = json.loads(first)
+            lines = (
+                isinstance(item, list)
+                and len(item) == 2
+                and isinstance(item[0], str)
+            )
+        except ValueError:
+            lines = False   # such as "[" from: json.dumps(datasets, indent=2)
+
+        if lines:
+            yield tuple(item)
+            for line in fp:
+                if len(line.strip()) > 0:
+                    yield tuple(json.loads(line))
+        else:
+            for dataset in json.loads(first + fp.read()):
+                for name, doc in dataset:
+                    yield name, doc
+
+
+def npz_export(headers, filename, compressed=False):
+    """
+    write a list of headers (from databroker) to a columnar NumPy archive
+
+    The event data of each stream is written as columns (one ``.npy``
+    file for each data key, its timestamps, and the event ``time``,
+    ``seq_num``, and ``uid``) inside one ZIP file (an NPZ container).
+    The other documents, and where the events go among them, are in a
+    small JSON *skeleton* for each run.  Arrays are written in binary,
+    not text, so array-heavy runs are much smaller (and faster to read)
+    than with :func:`json_export`.  Columns which NumPy cannot store
+    without ``pickle`` (such as rows of different lengths) are kept
+    in the skeleton.
+
+    Members of the ZIP file::
+
+        {run uid}/{descriptor uid}/time.npy
+        {run uid}/{descriptor uid}/data/{key}.npy
+        {run uid}/{descriptor uid}/timestamps/{key}.npy
+        ...
+        {run uid}/skeleton.json
+
+    PARAMETERS
+
+    headers : list(headers) or `databroker._core.Results` object
+        list of databroker headers as returned from `db(...search criteria...)`
+    filename : str
+        name of the (ZIP) file to be written
+    compressed : bool
+        If True, compress the columns.  Compressed columns
+        cannot be memory-mapped.
+        (default: ``False``)
+
+    EXAMPLE::
+
+        npz_export(db(plan_name="count", since="2020-06-01"), "runs.npz")
+
+        columns = npz_columns("runs.npz", uid)      # memory-mapped
+        for name, doc in iter_npz_import("runs.npz"):
+            db.insert(name, doc)
+    """
+    compression = zipfile.ZIP_DEFLATED if compressed else zipfile.ZIP_STORED
+    with zipfile.ZipFile(
+        filename, "w", compression=compression, allowZip64=True
+    ) as zf:
+        for h in headers:
+            npz_write_run(zf, h.documents())
+
+
+def npz_write_run(zf, documents):
+    """
+    write the ``(name, doc)`` documents of one run into ZIP file ``zf``
+
+    The members are those described in :func:`npz_export`.  Use
+    this to write runs into an open ``zipfile.ZipFile``, such as
+    one file per run (as in :func:`~apstools.export.export_runs`).
+
+    PARAMETERS
+
+    zf : obj
+        instance of ``zipfile.ZipFile``, open for writing
+    documents : iterable
+        ``(name, doc)`` of one run, such as ``h.documents()``
+    """
+    order = []          # the documents, events as ranges of the columns
+    streams = {}        # columns of each descriptor
+    run_uid = None
+    for name, doc in documents:
+        if name in ("event", "event_page"):
+            if name == "event":
+                doc = event_model.pack_event_page(doc)
+            columns = streams[doc["descriptor"]]
+            for key in ("time", "seq_num", "uid"):
+                columns[key].extend(doc[key])
+            for group in ("data", "timestamps", "filled"):
+                for k, v in doc.get(group, {}).items():
+                    if k not in columns[group]:
+                        columns[group][k] = ColumnBuffer(dtype=object)
+                    columns[group][k].extend(v)
+            n = len(doc["seq_num"])
+            last = order[-1] if len(order) > 0 else []
+            if last[:2] == ["events", doc["descriptor"]]:
+                last[3] += n
+            else:
+                i0 = len(columns["seq_num"]) - n
+                order.append(["events", doc["descriptor"], i0, n])
+            continue
+
+        if name == "start":
+            run_uid = doc["uid"]
+        elif name == "descriptor":
+            streams[doc["uid"]] = dict(
+                name=doc.get("name"),
+                time=ColumnBuffer("float64"),
+                seq_num=ColumnBuffer("int64"),
+                uid=ColumnBuffer(dtype=object),
+                data={
+                    k: ColumnBuffer.from_data_key(entry)
+                    for k, entry in doc["data_keys"].items()
+                },
+                timestamps={
+                    k: ColumnBuffer("float64")
+                    for k in doc["data_keys"]
+                },
+                filled={},
+            )
+        order.append([name, doc])
+
+    skeleton = dict(
+        version=NPZ_ARCHIVE_VERSION, uid=run_uid, documents=order, streams={}
+    )
+    for descriptor_uid, columns in streams.items():
+        stream = dict(
+            name=columns["name"], length=len(columns["seq_num"]), npy=[], json={}
+        )
+        paths = {k: columns[k] for k in ("time", "seq_num", "uid")}
+        for group in ("data", "timestamps", "filled"):
+            for k, buffer in columns[group].items():
+                paths[f"{group}/{k}"] = buffer
+        for path, buffer in paths.items():
+            if len(buffer) == 0 and path not in ("time", "seq_num", "uid"):
+                continue
+            array = buffer.array
+            if array.dtype == object:
+                values = list(array)
+                if all(isinstance(v, str) for v in values):
+                    array = np.array(values, dtype=str)
+                else:   # not without pickle
+                    stream["json"][path] = values
+                    continue
+            member = f"{run_uid}/{descriptor_uid}/{path}.npy"
+            with zf.open(member, "w", force_zip64=True) as fp:
+                np.lib.format.write_array(fp, array, allow_pickle=False)
+            stream["npy"].append(path)
+        skeleton["streams"][descriptor_uid] = stream
+
+    zf.writestr(
+        f"{run_uid}/{NPZ_SKELETON}",
+        json.dumps(skeleton, cls=NumpyEncoder)
+    )
+
+
+def _npz_read_array(zf, member, mmap_mode="r"):
+    """
+    read the ``.npy`` ``member`` of ZIP file ``zf``
+
+    The array is memory-mapped from the ZIP file (not read) when
+    ``mmap_mode`` is given and the member is not compressed.
+    """
+    info = zf.getinfo(member)
+    readers = {
+        (1, 0): np.lib.format.read_array_header_1_0,
+        (2, 0): np.lib.format.read_array_header_2_0,
+    }
+    with zf.open(info) as fp:
+        version = np.lib.format.read_magic(fp)
+        if (
+            mmap_mode is not None
+            and info.compress_type == zipfile.ZIP_STORED
+            and version in readers
+        ):
+            shape, fortran_order, dtype = readers[version](fp)
+            header_size = fp.tell()
+            if int(np.prod(shape)) > 0:
+                # data begins after the member's local header in the ZIP file
+                with open(zf.filename, "rb") as f:
+                    f.seek(info.header_offset)
+                    local_header = f.read(30)
+                n_name, n_extra = struct.unpack("<HH", local_header[26:30])
+                offset = info.header_offset + 30 + n_name + n_extra + header_size
+                return np.memmap(
+                    zf.filename,
+                    dtype=dtype,
+                    mode=mmap_mode,
+                    offset=offset,
+                    shape=shape,
+                    order="F" if fortran_order else "C",
+                )
+    with zf.open(info) as fp:
+        return np.lib.format.read_array(fp, allow_pickle=False)
+
+
+def _npz_read_stream(zf, run_uid, descriptor_uid, stream, mmap_mode="r"):
+    """dictionary of the columns (by path) of one stream"""
+    columns = dict(stream["json"])
+    for path in stream["npy"]:
+        columns[path] = _npz_read_array(
+            zf, f"{run_uid}/{descriptor_uid}/{path}.npy", mmap_mode
+        )
+    return columns
+
+
+def _npz_skeletons(zf):
+    """generator: the skeleton of each run in ZIP file ``zf``"""
+    for member in zf.namelist():
+        if member.endswith(f"/{NPZ_SKELETON}"):
+            yield json.loads(zf.read(member))
+
+
+def iter_npz_import(filename, mmap_mode="r"):
+    """
+    generator: ``(name, doc)`` of each document in file from :meth:`~npz_export()`
+
+    Documents are rebuilt one at a time, as they are generated.
+    The columns of a stream are read (memory-mapped, unless
+    ``mmap_mode`` is ``None``) when its first event is needed.
+    Scalar event data are Python numbers (or text), array data
+    are NumPy arrays (views of the columns, not copies).
+
+    EXAMPLE
+
+    Insert the documents into the databroker ``db``::
+
+        for name, doc in iter_npz_import("runs.npz"):
+            db.insert(name, doc)
+    """
+    def value(column, i):
+        if isinstance(column, list) or column.ndim > 1:
+            return column[i]
+        return column[i].item()
+
+    with zipfile.ZipFile(filename, "r") as zf:
+        for skeleton in _npz_skeletons(zf):
+            streams = {}
+            for entry in skeleton["documents"]:
+                if entry[0] != "events":
+                    yield entry[0], entry[1]
+                    continue
+                descriptor_uid, i0, n = entry[1:]
+                if descriptor_uid not in streams:
+                    streams[descriptor_uid] = _npz_read_stream(
+                        zf,
+                        skeleton["uid"],
+                        descriptor_uid,
+                        skeleton["streams"][descriptor_uid],
+                        mmap_mode,
+                    )
+                columns = streams[descriptor_uid]
+                groups = defaultdict(dict)
+                for path in columns:
+                    if "/" in path:
+                        group, key = path.split("/", 1)
+                        groups[group][key] = columns[path]
+                for i in range(i0, i0 + n):
+                    doc = dict(
+                        descriptor=descriptor_uid,
+                        uid=value(columns["uid"], i),
+                        time=value(columns["time"], i),
+                        seq_num=value(columns["seq_num"], i),
+                    )
+                    for group in ("data", "timestamps", "filled"):
+                        doc[group] = {
+                            k: value(column, i)
+                            for k, column in groups[group].items()
+                        }
+                    yield "event", doc
+
+
+def npz_columns(filename, uid=None, stream="primary", mmap_mode="r"):
+    """
+    columns of one stream of a run in file from :meth:`~npz_export()`
+
+    Returns a dictionary of arrays (memory-mapped, unless ``mmap_mode``
+    is ``None``), one for each data key, and ``time`` of the events.
+    ``uid`` is the run (default: the first run in the file).  Raises
+    ``KeyError`` if the run or stream is not found.
+
+    EXAMPLE::
+
+        columns = npz_columns("runs.npz", uid)
+        print(columns["time"][-1] - columns["time"][0])
+    """
+    with zipfile.ZipFile(filename, "r") as zf:
+        for skeleton in _npz_skeletons(zf):
+            if uid is not None and skeleton["uid"] != uid:
+                continue
+            for descriptor_uid, entry in skeleton["streams"].items():
+                if entry["name"] == stream:
+                    columns = _npz_read_stream(
+                        zf, skeleton["uid"], descriptor_uid, entry, mmap_mode
+                    )
+                    result = {
+                        path.split("/", 1)[1]: column
+                        for path, column in columns.items()
+                        if path.startswith("data/")
+                    }
+                    result["time"] = columns["time"]
+                    return result
+            raise KeyError(f"stream '{stream}' not found in run {skeleton['uid']}")
+    raise KeyError(f"run {uid} not found in {filename}")
+
+
 def redefine_motor_position(motor, new_position):
     """set EPICS motor record's user coordinate to `new_position`"""
     yield from bps.mv(motor.set_use_switch, 1)
@@ -19,6 +19,7 @@ import apstools as package
 __entry_points__  = {
     'console_scripts': [
         'apsbss = apstools.beamtime.apsbss:main',
+        'apstools_export = apstools.export:export_cli',
         'apstools_plan_catalog = apstools.examples:main',
         'bluesky_snapshot = apstools.snapshot:snapshot_cli',
         'bluesky_snapshot_viewer = apstools.snapshot:snapshot_gui',
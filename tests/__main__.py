@@ -15,6 +15,7 @@ def suite(*args, **kw):
     from tests import test_beamtime
     from tests import test_simple
     from tests import test_filewriter
+    from tests import test_export
     from tests import test_export_json
     from tests import test_exceltable
     from tests import test_commandlist
@@ -22,6 +23,7 @@ def suite(*args, **kw):
     test_list = [
         test_simple,
         test_filewriter,
+        test_export,
         test_export_json,
         test_exceltable,
         test_commandlist,
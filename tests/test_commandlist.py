@@ -123,6 +123,44 @@ class Test_CommandList(unittest.TestCase):
         expected = "could not read "
         self.assertTrue(received.startswith(expected))
 
+    def test_IterExcelCommandFile(self):
+        for filename in (self.xl_file, self.xl_command_file):
+            commands = APS_plans.iter_Excel_command_file(filename)
+            self.assertFalse(isinstance(commands, list))
+            first = next(commands)      # before later rows are read
+            expected = APS_plans.parse_Excel_command_file(filename)
+            self.assertEqual(first, expected[0])
+            self.assertEqual([first] + list(commands), expected)
+
+        with self.assertRaises(FileNotFoundError):
+            next(APS_plans.iter_Excel_command_file(self.missing_file))
+
+    def test_WatchCommandFile(self):
+        import tempfile
+        with tempfile.TemporaryDirectory() as tempdir:
+            filename = os.path.join(tempdir, "actions.txt")
+            with open(filename, "w") as f:
+                f.write("one 1\ntwo 2\nthree 3\n")
+
+            commands = APS_plans._watch_command_file(
+                filename, APS_plans.get_command_list(filename))
+            self.assertEqual(next(commands)[0], "one")
+            self.assertEqual(next(commands)[0], "two")
+
+            # edit: before, at, and after the current command
+            with open(filename, "w") as f:
+                f.write("# comment\nzero 0\none 1\ntwo 2\nTHREE 3\nfour 4\n")
+            os.utime(filename, ns=(0, 0))   # mtime resolution
+
+            received = [(c[0], c[2]) for c in commands]
+            self.assertEqual(received, [("THREE", 5), ("four", 6)])
+
+        splice = APS_plans._command_list_splice_point
+        old = [("a", [], 1, ["a"]), ("b", [], 2, ["b"])]
+        self.assertEqual(splice(old, old, 1), (1, 0))
+        self.assertEqual(splice(old, old[:1] + [("x", [], 2, ["x"])] + old[1:], 1), (1, 0))
+        self.assertEqual(splice(old, old[1:], 1), (0, 1))
+
 
 def suite(*args, **kw):
     test_list = [
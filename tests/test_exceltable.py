@@ -4,7 +4,10 @@ simple unit tests for this package
 """
 
 import os
+import shutil
 import sys
+import tempfile
+import time
 import unittest
 
 PATH = os.path.dirname(__file__)
@@ -30,6 +33,46 @@ class Test_ExcelTable(unittest.TestCase):
         self.assertEqual(len(xl.db), 16)            # rows
         self.assertEqual(len(xl.db["0"]), 9)        # columns
 
+    def test_ExcelTable_read_once(self):
+        tempdir = tempfile.mkdtemp()
+        try:
+            xl_file = os.path.join(tempdir, "demo3.xlsx")
+            shutil.copy(self.xl_file, xl_file)
+
+            class Counting(apstools.utils.ExcelDatabaseFileGeneric):
+                entries = 0
+
+                def handle_single_entry(self, entry):
+                    Counting.entries += 1
+
+            xl = Counting(xl_file)
+            self.assertEqual(Counting.entries, len(xl.db), "once per row")
+
+            table = apstools.utils._read_excel_table(xl_file, 0, 3, True)
+            xl = Counting(xl_file)
+            self.assertIs(
+                apstools.utils._read_excel_table(xl_file, 0, 3, True),
+                table,
+                "file not read again")
+            self.assertEqual(len(xl.db), 9)
+            self.assertEqual(Counting.entries, 2 * len(xl.db))
+
+            # file changed
+            t = time.time() + 10
+            os.utime(xl_file, (t, t))
+            self.assertIsNot(
+                apstools.utils._read_excel_table(xl_file, 0, 3, True),
+                table)
+            self.assertEqual(len(Counting(xl_file).db), 9)
+
+            not_excel = os.path.join(tempdir, "commands.txt")
+            with open(not_excel, "w") as f:
+                f.write("not an Excel file\n")
+            with self.assertRaises(apstools.utils.ExcelReadError):
+                apstools.utils.ExcelDatabaseFileGeneric(not_excel)
+        finally:
+            shutil.rmtree(tempdir, ignore_errors=True)
+
 
 def suite(*args, **kw):
     test_list = [
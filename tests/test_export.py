@@ -0,0 +1,171 @@
+
+"""
+unit tests for the parallel export of runs
+"""
+
+import h5py
+import os
+import shutil
+import spec2nexus.spec
+import sys
+import tempfile
+import unittest
+
+
+_test_path = os.path.dirname(__file__)
+_path = os.path.join(_test_path, '..')
+if _path not in sys.path:
+    sys.path.insert(0, _path)
+
+from apstools import export
+from apstools.utils import ExportManifest
+from apstools.utils import iter_json_import
+from apstools.utils import iter_npz_import
+from apstools.utils import npz_columns
+from apstools.utils import run_fingerprint
+from tests.test_export_json import get_db
+
+
+class Test_Export(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.db = get_db()
+
+    def tearDown(self):
+        if os.path.exists(self.tempdir):
+            shutil.rmtree(self.tempdir, ignore_errors=True)
+
+    def test_export_runs(self):
+        cat = self.db.v2.search({"plan_name": "scan"})  # no external data
+        uids = list(cat)
+        for fmt in export.EXPORT_FORMATS:
+            directory = os.path.join(self.tempdir, fmt)
+            reports = []
+
+            def progress(*args):
+                reports.append(args)
+
+            results = export.export_runs(
+                cat, directory, fmt=fmt, workers=2, progress=progress)
+            self.assertEqual(list(results), uids, fmt)
+            self.assertEqual(set(results.values()), {"exported"}, fmt)
+            self.assertEqual(len(reports), len(uids), fmt)
+            self.assertEqual(reports[-1][:2], (len(uids), len(uids)), fmt)
+            self.assertEqual(
+                sorted(os.listdir(directory)),
+                sorted([os.path.basename(export.export_file_name(directory, uid, fmt)) for uid in uids]),
+                f"{fmt}: one file for each run, nothing else")
+
+            uid = uids[0]
+            fname = export.export_file_name(directory, uid, fmt)
+            if fmt == "json":
+                documents = list(iter_json_import(fname))
+                self.assertEqual(documents[0][0], "start")
+                self.assertEqual(documents[0][1]["uid"], uid)
+                self.assertEqual(documents[-1][0], "stop")
+            elif fmt == "npz":
+                documents = list(iter_npz_import(fname))
+                self.assertEqual(documents[0][1]["uid"], uid)
+                self.assertEqual(documents[-1][0], "stop")
+                columns = npz_columns(fname, uid)
+                self.assertEqual(
+                    len(columns["time"]),
+                    documents[-1][1]["num_events"]["primary"])
+            elif fmt == "nexus":
+                with h5py.File(fname, "r") as nxroot:
+                    self.assertIn("/entry/instrument/bluesky/streams/primary", nxroot)
+                    self.assertEqual(nxroot.attrs["file_name"], fname)
+            else:
+                sdf = spec2nexus.spec.SpecDataFile(fname)
+                self.assertEqual(len(sdf.getScanNumbers()), 1)
+                with open(fname) as f:
+                    self.assertEqual(f.readline().strip(), f"#F {fname}")
+
+            # resume: nothing more to export
+            os.remove(fname)
+            reports = []
+            results = export.export_runs(cat, directory, fmt=fmt, progress=progress)
+            self.assertEqual(results[uid], "exported", fmt)
+            self.assertEqual(
+                [k for k, v in results.items() if v == "skipped"], uids[1:], fmt)
+            self.assertEqual(len(reports), 1, fmt)
+
+            results = export.export_runs(cat, directory, fmt=fmt, resume=False, workers=1)
+            self.assertEqual(set(results.values()), {"exported"}, fmt)
+
+        with self.assertRaises(ValueError):
+            export.export_runs(cat, self.tempdir, fmt="no such format")
+
+        # image files of these runs are not available
+        cat = self.db.v2.search({"plan_name": "count"})
+        directory = os.path.join(self.tempdir, "failures")
+        results = export.export_runs(cat, directory, fmt="nexus", workers=2)
+        failed = [uid for uid, status in results.items() if status.startswith("failed: ")]
+        self.assertGreater(len(failed), 0)
+        for uid in failed:
+            fname = export.export_file_name(directory, uid, "nexus")
+            self.assertFalse(os.path.exists(fname), "no partial files")
+        self.assertEqual(
+            len(os.listdir(directory)), len(results) - len(failed),
+            "no temporary files")
+
+    def test_manifest(self):
+        cat = self.db.v2.search({"plan_name": "scan"})
+        uids = list(cat)
+        directory = os.path.join(self.tempdir, "nightly")
+        manifest = ExportManifest(os.path.join(self.tempdir, "manifest.sqlite"))
+
+        results = export.export_runs(cat, directory, workers=2, manifest=manifest)
+        self.assertEqual(set(results.values()), {"exported"})
+        self.assertEqual(len(manifest), len(uids))
+        self.assertEqual(
+            manifest.destination(uids[0]),
+            export.export_file_name(directory, uids[0], "json"))
+
+        results = export.export_runs(
+            cat, directory, workers=2, manifest=manifest.filename)
+        self.assertEqual(set(results.values()), {"skipped"})
+
+        # run changed since it was exported, file of another run was removed
+        manifest.record(uids[0], run_fingerprint({"uid": "earlier stop"}))
+        os.remove(export.export_file_name(directory, uids[-1], "json"))
+        results = export.export_runs(cat, directory, workers=2, manifest=manifest)
+        self.assertEqual(
+            [uid for uid, status in results.items() if status == "exported"],
+            [uids[0], uids[-1]])
+        self.assertEqual(
+            manifest.fingerprints()[uids[0]],
+            run_fingerprint(cat[uids[0]].metadata["stop"]))
+
+    def test_memory_limit(self):
+        cat = self.db.v2.search({"plan_name": "scan"})
+        uids = list(cat)[:2]
+        cat = self.db.v2.search({"uid": {"$in": uids}})
+        directory = os.path.join(self.tempdir, "limited")
+        results = export.export_runs(
+            cat, directory, fmt="nexus", workers=1, memory_limit=2**40)
+        self.assertEqual(set(results.values()), {"exported"})
+
+    def test_parse_query(self):
+        self.assertEqual(
+            export.parse_query(["plan_name=count", "scan_id = 5", "purpose=a=b"]),
+            dict(plan_name="count", scan_id=5, purpose="a=b"))
+        with self.assertRaises(ValueError):
+            export.parse_query(["plan_name"])
+
+
+def suite(*args, **kw):
+    test_list = [
+        Test_Export,
+        ]
+
+    test_suite = unittest.TestSuite()
+    for test_case in test_list:
+        test_suite.addTest(unittest.makeSuite(test_case))
+    return test_suite
+
+
+if __name__ == "__main__":
+    runner=unittest.TextTestRunner()
+    runner.run(suite())
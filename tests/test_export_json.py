@@ -3,6 +3,8 @@
 unit tests for the SPEC filewriter
 """
 
+import event_model
+import numpy as np
 import os
 import shutil
 import sys
@@ -16,7 +18,10 @@ _path = os.path.join(_test_path, '..')
 if _path not in sys.path:
     sys.path.insert(0, _path)
 
-from apstools.utils import json_export, json_import
+from apstools.utils import ExportManifest
+from apstools.utils import iter_json_import, json_export, json_import
+from apstools.utils import iter_npz_import, npz_columns, npz_export
+from apstools.utils import run_fingerprint
 
 
 TEST_JSON_FILE = "data.json"
@@ -100,6 +105,164 @@ class Test_JsonExport(unittest.TestCase):
             "found matching start document"
             )
 
+    def test_export_import_lines(self):
+        db = get_db()
+        headers = list(db(plan_name="count"))[0:3]
+        expected = json_import(TEST_JSON_FILE, TEST_ZIP_FILE)
+
+        for zipfilename in (None, os.path.join(self.tempdir, "export3.zip")):
+            filename = "export3.jsonl"
+            if zipfilename is None:
+                filename = os.path.join(self.tempdir, filename)
+            json_export(headers, filename, zipfilename=zipfilename, lines=True)
+
+            documents = iter_json_import(filename, zipfilename)
+            self.assertEqual(next(documents)[0], "start", "lazy, one at a time")
+            documents.close()
+
+            documents = list(iter_json_import(filename, zipfilename))
+            self.assertEqual(
+                len(documents),
+                sum([len(list(h.documents())) for h in headers]))
+            self.assertEqual(
+                [doc["uid"] for name, doc in documents if name == "start"],
+                [h.start["uid"] for h in headers])
+
+            testdata = json_import(filename, zipfilename)
+            self.assertEqual(len(testdata), 3, "file contains three datasets")
+            for dataset in testdata:
+                tag, doc = dataset[0]
+                self.assertEqual(tag, "start", "found start document")
+                known = [
+                    ds for ds in expected
+                    if ds[0][1]["uid"] == doc["uid"]
+                ]
+                self.assertEqual(len(known), 1)
+                self.assertEqual(
+                    [name for name, doc in dataset],
+                    [name for name, doc in known[0]])
+
+        # iterate the (not JSON Lines) test data
+        documents = list(iter_json_import(TEST_JSON_FILE, TEST_ZIP_FILE))
+        self.assertEqual(len(documents), sum([len(ds) for ds in expected]))
+
+    def test_npz_export_import(self):
+        db = get_db()
+        headers = list(db(plan_name="count"))[0:3]
+        filename = os.path.join(self.tempdir, "export.npz")
+        npz_export(headers, filename)
+
+        expected = [(name, doc) for h in headers for name, doc in h.documents()]
+        documents = iter_npz_import(filename)
+        self.assertEqual(next(documents)[0], "start", "lazy, one at a time")
+        documents.close()
+        documents = list(iter_npz_import(filename))
+        self.assertEqual(
+            [name for name, doc in documents],
+            [name for name, doc in expected])
+        for (name, doc), (_, known) in zip(documents, expected):
+            if name == "event":
+                for k in ("uid", "time", "seq_num", "data", "timestamps"):
+                    self.assertEqual(doc[k], known[k], k)
+            else:
+                self.assertEqual(doc, dict(known), name)
+
+        # array data
+        class Header:
+            def __init__(self, docs):
+                self.docs = docs
+
+            def documents(self):
+                return iter(self.docs)
+
+        run = event_model.compose_run()
+        stream = run.compose_descriptor(
+            name="primary",
+            data_keys=dict(
+                image=dict(source="sim", dtype="array", shape=[8, 5]),
+                label=dict(source="sim", dtype="string", shape=[]),
+                ragged=dict(source="sim", dtype="array", shape=[]),
+            ))
+        docs = [("start", run.start_doc), ("descriptor", stream.descriptor_doc)]
+        images = np.arange(6*8*5).reshape((6, 8, 5))
+        for i, image in enumerate(images):
+            data = dict(image=image, label=f"n{i}", ragged=list(range(i)))
+            docs.append((
+                "event",
+                stream.compose_event(data=data, timestamps={k: i for k in data})
+            ))
+        docs.append(("stop", run.compose_stop()))
+
+        for compressed in (False, True):
+            npz_export([Header(docs)], filename, compressed=compressed)
+            columns = npz_columns(filename)
+            self.assertEqual(isinstance(columns["image"], np.memmap), not compressed)
+            self.assertTrue(np.array_equal(columns["image"], images))
+            self.assertEqual(list(columns["label"]), [f"n{i}" for i in range(6)])
+            self.assertEqual(columns["ragged"][3], [0, 1, 2], "not without pickle")
+            self.assertEqual(len(columns["time"]), 6)
+            for mmap_mode in ("r", None):
+                events = [
+                    doc
+                    for name, doc in iter_npz_import(filename, mmap_mode)
+                    if name == "event"
+                ]
+                self.assertTrue(np.array_equal(events[4]["data"]["image"], images[4]))
+                self.assertEqual(events[4]["data"]["label"], "n4")
+                self.assertEqual(events[4]["uid"], docs[6][1]["uid"])
+
+        with np.load(filename) as npz:  # standard NPZ container
+            self.assertEqual(
+                len([f for f in npz.files if f.endswith("/data/image")]), 1)
+        with self.assertRaises(KeyError):
+            npz_columns(filename, uid="no such run")
+        with self.assertRaises(KeyError):
+            npz_columns(filename, stream="baseline")
+
+    def test_export_manifest(self):
+        db = get_db()
+        headers = list(db(plan_name="count"))[0:5]
+        uids = [h.start["uid"] for h in headers]
+        manifest = ExportManifest(os.path.join(self.tempdir, "manifest.sqlite"))
+
+        def exported(filename, headers):
+            filename = os.path.join(self.tempdir, filename)
+            json_export(headers, filename, lines=True, manifest=manifest)
+            return [
+                doc["uid"]
+                for name, doc in iter_json_import(filename)
+                if name == "start"
+            ]
+
+        self.assertEqual(exported("night1.jsonl", headers[:3]), uids[:3])
+        self.assertEqual(len(manifest), 3)
+        self.assertEqual(
+            exported("night2.jsonl", headers), uids[3:], "only the new runs")
+        self.assertEqual(exported("night3.jsonl", headers), [], "no new runs")
+        self.assertEqual(
+            manifest.destination(uids[0]),
+            os.path.join(self.tempdir, "night1.jsonl"))
+
+        # run changed since it was exported
+        manifest.record(uids[1], run_fingerprint({"uid": "earlier stop"}))
+        self.assertEqual(exported("night4.jsonl", headers), uids[1:2])
+
+        self.assertIsNone(run_fingerprint(None))
+        self.assertIsNone(run_fingerprint({}), "run has not ended")
+        stop = dict(headers[0].stop)
+        self.assertTrue(manifest.is_current(uids[0], run_fingerprint(stop)))
+        stop["num_events"] = dict(primary=stop["num_events"]["primary"] + 1)
+        self.assertFalse(manifest.is_current(uids[0], run_fingerprint(stop)))
+        self.assertFalse(manifest.is_current(uids[0], None))
+
+        # by name of the manifest file
+        filename = os.path.join(self.tempdir, "night5.json")
+        json_export(headers, filename, manifest=manifest.filename)
+        self.assertEqual(json_import(filename), [])
+        manifest.clear()
+        self.assertNotIn(uids[0], manifest)
+        self.assertEqual(exported("night6.jsonl", headers), uids)
+
 
 def suite(*args, **kw):
     test_list = [
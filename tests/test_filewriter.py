@@ -3,11 +3,13 @@
 unit tests for the filewriters
 """
 
+import event_model
 import h5py
 import json
+import numpy as np
 import os
 import shutil
-import spec2nexus
+import spec2nexus.spec
 import sys
 import tempfile
 import unittest
@@ -41,6 +43,116 @@ def write_stream(specwriter, stream):
         specwriter.receiver(tag, doc)
 
 
+def as_event_pages(stream):
+    """combine consecutive events (same descriptor) into event_page documents"""
+    documents = []
+    events = []
+    for tag, doc in stream + [("end", {})]:
+        if tag == "event" and (len(events) == 0 or events[0]["descriptor"] == doc["descriptor"]):
+            events.append(doc)
+            continue
+        if len(events) > 0:
+            documents.append(["event_page", event_model.pack_event_page(*events)])
+            events = []
+        if tag == "event":
+            events.append(doc)
+        elif tag != "end":
+            documents.append([tag, doc])
+    return documents
+
+
+def external_image_run(path, num_files=2, num_frames=3, frame_shape=(4, 5), chunk_frames=1):
+    """
+    document stream of a run with area detector images in HDF5 files
+
+    Each HDF5 file has chunks of ``chunk_frames`` frames (as NumFramesChunks).
+
+    :returns: (documents, images) where images is the full image stack
+    """
+    t0 = 1600000000.0
+    run_uid = "run-0123456789"
+    desc_uid = "descriptor-0123456789"
+    images = []
+    documents = [
+        ["start", dict(
+            uid=run_uid, time=t0, scan_id=1, plan_name="count",
+            plan_type="generator", detectors=["adsim"],
+        )],
+        ["descriptor", dict(
+            uid=desc_uid, run_start=run_uid, time=t0, name="primary",
+            data_keys=dict(
+                adsim_image=dict(
+                    source="PV:adsim:image1", dtype="array",
+                    shape=[1] + list(frame_shape), external="FILESTORE:"),
+                I0=dict(source="PV:I0", dtype="number", shape=[]),
+            ),
+            hints=dict(adsim=dict(fields=["adsim_image"])),
+        )],
+    ]
+    seq_num = 0
+    for i in range(num_files):
+        resource_uid = f"resource-{i}"
+        fname = f"image_{i:03d}.h5"
+        data = np.arange(num_frames * np.prod(frame_shape), dtype="uint16")
+        data = data.reshape((num_frames,) + tuple(frame_shape)) + 1000 * i
+        images.append(data)
+        with h5py.File(os.path.join(path, fname), "w") as root:
+            root.create_dataset(
+                "/entry/data/data", data=data,
+                chunks=(chunk_frames,) + tuple(frame_shape),
+                maxshape=(None,) + tuple(frame_shape))
+        documents.append(["resource", dict(
+            uid=resource_uid, spec="AD_HDF5", root=path, resource_path=fname,
+            resource_kwargs=dict(frame_per_point=num_frames), run_start=run_uid,
+            path_semantics="posix",
+        )])
+        datum_id = f"{resource_uid}/0"
+        documents.append(["datum", dict(
+            datum_id=datum_id, resource=resource_uid,
+            datum_kwargs=dict(point_number=0),
+        )])
+        seq_num += 1
+        t = t0 + seq_num
+        documents.append(["event", dict(
+            uid=f"event-{seq_num}", descriptor=desc_uid, time=t, seq_num=seq_num,
+            data=dict(adsim_image=datum_id, I0=float(seq_num)),
+            timestamps=dict(adsim_image=t, I0=t),
+            filled=dict(adsim_image=False),
+        )])
+    documents.append(["stop", dict(
+        uid="stop-0123456789", run_start=run_uid, time=t0 + seq_num + 1,
+        exit_status="success", num_events=dict(primary=seq_num),
+    )])
+    return documents, np.concatenate(images)
+
+
+def waveform_run(rows, shape=(5,)):
+    """document stream of a run with one waveform, ``shape`` in the descriptor"""
+    t0 = 1600000000.0
+    documents = [
+        ["start", dict(
+            uid="run-waveform", time=t0, scan_id=1, plan_name="count",
+            plan_type="generator", detectors=["wf"],
+        )],
+        ["descriptor", dict(
+            uid="descriptor-waveform", run_start="run-waveform", time=t0,
+            name="primary", hints={},
+            data_keys=dict(value=dict(source="PV:wf", dtype="array", shape=list(shape))),
+        )],
+    ]
+    for i, row in enumerate(rows, start=1):
+        documents.append(["event", dict(
+            uid=f"event-{i}", descriptor="descriptor-waveform", time=t0 + i,
+            seq_num=i, data=dict(value=row), timestamps=dict(value=t0 + i),
+            filled={},
+        )])
+    documents.append(["stop", dict(
+        uid="stop-waveform", run_start="run-waveform", time=t0 + len(rows) + 1,
+        exit_status="success", num_events=dict(primary=len(rows)),
+    )])
+    return documents
+
+
 def get_test_data():
     """get document streams as dict from zip file"""
     with zipfile.ZipFile(ZIP_FILE, "r") as fp:
@@ -133,6 +245,93 @@ class Test_FileWriterCallbackBase(MyTestBase):
             self.assertEqual(len(callback.acquisitions), len(callback.streams))
             self.assertGreater(callback.scan_id, 0)
 
+    def test_event_page(self):
+        for plan_name, document_set in self.db.items():
+            by_event = apstools.filewriters.FileWriterCallbackBase()
+            by_page = apstools.filewriters.FileWriterCallbackBase()
+            with Capture_stdout():
+                write_stream(by_event, document_set)
+                write_stream(by_page, as_event_pages(document_set))
+            self.assertEqual(by_page.acquisitions, by_event.acquisitions, plan_name)
+
+    def test_column_buffers(self):
+        for plan_name, document_set in self.db.items():
+            callback = apstools.filewriters.FileWriterCallbackBase()
+            with Capture_stdout():
+                write_stream(callback, document_set)
+            for uid, acquisition in callback.acquisitions.items():
+                for k, v in acquisition["data"].items():
+                    msg = f"{plan_name}: {k}"
+                    self.assertIsInstance(v["data"], apstools.filewriters.ColumnBuffer, msg)
+                    self.assertEqual(v["time"].array.dtype, np.float64, msg)
+                    self.assertEqual(len(v["data"]), len(v["time"]), msg)
+                    if v["dtype"] in ("integer", "number") and len(v["data"]) > 0:
+                        self.assertNotEqual(v["data"].array.dtype, object, msg)
+
+    def test_column_buffer(self):
+        buf = apstools.filewriters.ColumnBuffer()
+        self.assertEqual(len(buf), 0)
+        for i in range(100):
+            buf.append(i)
+        self.assertEqual(buf.dtype, np.int64)
+        self.assertEqual(buf, list(range(100)))
+        self.assertLess(len(buf._storage), 2 * 100)     # geometric growth
+        buf.extend([100.5, 101.5])      # promote
+        self.assertEqual(buf.dtype, np.float64)
+        self.assertEqual(buf[-1], 101.5)
+        self.assertEqual(buf[0], 0)
+        buf.append(None)                # not numeric
+        self.assertEqual(buf.dtype, object)
+        self.assertEqual(len(buf), 103)
+        self.assertIsNone(buf[-1])
+        self.assertEqual(buf[1], 1)
+
+        buf = apstools.filewriters.ColumnBuffer.from_data_key(
+            dict(dtype="array", shape=[2, 3]))
+        frames = np.arange(24).reshape((4, 2, 3))
+        buf.extend(frames[:3])
+        buf.append(frames[3])
+        self.assertEqual(buf.array.shape, (4, 2, 3))
+        self.assertTrue(np.shares_memory(buf.array, buf._storage))  # no copy
+        self.assertTrue(np.array_equal(np.asarray(buf), frames))
+        buf.append(np.arange(5))        # not the shape
+        self.assertEqual(buf.dtype, object)
+        self.assertEqual(len(buf), 5)
+
+        # waveform with NORD < NELM: rows are not the descriptor shape
+        buf = apstools.filewriters.ColumnBuffer.from_data_key(
+            dict(dtype="array", shape=[5]))
+        buf.extend([[1, 2, 3], [4, 5, 6]])
+        buf.append([7, 8, 9])
+        self.assertEqual(buf.dtype, np.int64)
+        self.assertEqual(buf.array.shape, (3, 3))
+
+        buf = apstools.filewriters.ColumnBuffer()
+        buf.extend([1.5, 2.5])
+        buf.append("text")              # not numeric
+        self.assertEqual(buf.dtype, object)
+        self.assertEqual(list(buf), [1.5, 2.5, "text"])
+
+        buf = apstools.filewriters.ColumnBuffer()
+        buf.extend(list(range(10)))
+        buf.spill(self.tempdir)
+        self.assertTrue(buf.on_disk)
+        self.assertEqual(buf.nbytes, 0)
+        scratch = buf._scratch
+        buf.extend(list(range(10, 1000)))  # grow the scratch file
+        buf.append(1000.5)                  # promote
+        self.assertTrue(buf.on_disk)
+        self.assertEqual(buf.dtype, np.float64)
+        self.assertEqual(buf, list(range(1000)) + [1000.5])
+        buf.clear()
+        self.assertFalse(buf.on_disk)
+        self.assertTrue(scratch.closed)
+
+        buf = apstools.filewriters.ColumnBuffer.from_data_key(
+            dict(dtype="string", shape=[]))
+        buf.extend(["a", "bcd"])
+        self.assertEqual(list(buf), ["a", "bcd"])
+
 
 class Test_NXWriterAPS(MyTestBase):
 
@@ -189,6 +388,284 @@ class Test_NXWriter(MyTestBase):
             self.assertIn(axes[0], nxdata)
             self.assertNotEqual(axes[0], signal)
 
+    def test_background_writer(self):
+        callback = apstools.filewriters.NXWriter()
+        callback.background_writer = True
+        callback.file_path = self.tempdir
+
+        file_names = []
+        for plan_name in self.db:
+            self.replay(plan_name, callback)
+            file_names.append(callback.make_file_name())
+        callback.flush()
+        for fname in file_names:
+            self.assertTrue(os.path.exists(fname), fname)
+            with h5py.File(fname, "r") as nxroot:
+                self.assertIn("/entry/instrument/bluesky/streams", nxroot)
+        callback.join()
+        self.assertIsNone(callback._writer_thread)
+
+        class Broken(apstools.filewriters.FileWriterCallbackBase):
+            background_writer = True
+
+            def writer(self):
+                raise IOError("cannot write")
+
+        callback = Broken()
+        self.replay("tune_mr", callback)
+        with Capture_stderr():
+            with self.assertRaises(RuntimeError) as context:
+                callback.join()
+        self.assertIn("cannot write", str(context.exception))
+        callback.flush()     # errors were reported
+
+    def test_background_writer_join(self):
+        import subprocess
+        import threading
+
+        class Slow(apstools.filewriters.FileWriterCallbackBase):
+            background_writer = True
+            go = threading.Event()
+            written = []
+
+            def writer(self):
+                self.go.wait(5)
+                self.written.append(self.uid)
+
+        callback = Slow()
+        self.replay("tune_mr", callback)
+        self.assertEqual(Slow.written, [], "run is queued")
+        Slow.go.set()
+        callback.join()
+        self.assertEqual(Slow.written, [callback.uid], "written after join()")
+
+        # session ends with a run still queued: written at exit
+        marker = os.path.join(self.tempdir, "written_at_exit")
+        script = "\n".join([
+            "import time",
+            "import apstools.filewriters",
+            "class Slow(apstools.filewriters.FileWriterCallbackBase):",
+            "    background_writer = True",
+            "    def writer(self):",
+            "        time.sleep(0.5)",
+            f"        open({marker!r}, 'w').write(self.uid)",
+            "callback = Slow()",
+            "callback.receiver('start', dict(uid='abc', time=0, scan_id=1, plan_name='count'))",
+            "callback.receiver('stop', dict(uid='xyz', run_start='abc', time=1, exit_status='success'))",
+        ])
+        subprocess.run(
+            [sys.executable, "-c", script], check=True,
+            cwd=os.path.join(os.path.dirname(__file__), ".."))
+        with open(marker) as f:
+            self.assertEqual(f.read(), "abc")
+
+    def test_spill_to_disk(self):
+        plan_name = "tune_mr"
+        in_memory = apstools.filewriters.NXWriter()
+        in_memory.file_name = os.path.join(self.tempdir, "in_memory.hdf")
+        on_disk = apstools.filewriters.NXWriter()
+        on_disk.file_name = os.path.join(self.tempdir, "on_disk.hdf")
+        on_disk.spill_threshold = 0
+        on_disk.spill_directory = self.tempdir
+        self.replay(plan_name, in_memory)
+        self.replay(plan_name, on_disk)
+
+        buffers = [
+            v["time"]
+            for acquisition in on_disk.acquisitions.values()
+            for v in acquisition["data"].values()
+        ]
+        self.assertTrue(all([buf.on_disk for buf in buffers]))
+        self.assertEqual(sum([buf.nbytes for buf in buffers]), 0)
+        self.assertEqual(on_disk.acquisitions, in_memory.acquisitions)
+
+        def datasets(fname):
+            found = {}
+            with h5py.File(fname, "r") as nxroot:
+                def visit(name, obj):
+                    if isinstance(obj, h5py.Dataset) and "file_time" not in name:
+                        found[name] = obj[()]
+                nxroot.visititems(visit)
+            return found
+
+        expected = datasets(in_memory.file_name)
+        received = datasets(on_disk.file_name)
+        self.assertEqual(sorted(received), sorted(expected))
+        for k, v in expected.items():
+            self.assertTrue(np.array_equal(received[k], v), k)
+
+    def test_streaming(self):
+        def compare(a, b, msg):
+            a = [to_string(v) for v in a.flatten()] if a.dtype.kind in "OS" else a
+            b = [to_string(v) for v in b.flatten()] if b.dtype.kind in "OS" else b
+            self.assertEqual(len(a), len(b), msg)
+            for u, v in zip(a, b):
+                if isinstance(u, str):
+                    self.assertEqual(u, v, msg)
+                else:
+                    self.assertTrue(np.array_equal(u, v, equal_nan=True), msg)
+
+        for plan_name in "tune_mr snapshot Flyscan".split():
+            document_set = self.db[plan_name]
+            results = {}
+            for mode, stream, streaming in (
+                    ("buffered", document_set, False),
+                    ("streamed", document_set, True),
+                    ("paged", as_event_pages(document_set), True),
+            ):
+                callback = apstools.filewriters.NXWriter()
+                callback.streaming = streaming
+                callback.file_name = os.path.join(self.tempdir, f"{plan_name}-{mode}.hdf")
+                with Capture_stdout():
+                    with Capture_stderr():
+                        write_stream(callback, stream)
+                self.assertIsNone(callback.root)
+                results[mode] = callback.file_name
+
+            with h5py.File(results["buffered"], "r") as expected:
+                for mode in ("streamed", "paged"):
+                    with h5py.File(results[mode], "r") as nxroot:
+                        self.assertEqual(
+                            nxroot.attrs["default"],
+                            expected.attrs["default"])
+                        self.assertIn("/entry/data", nxroot, plan_name)
+                        streams = expected["/entry/instrument/bluesky/streams"]
+                        for stream_name, group in streams.items():
+                            for k, subgroup in group.items():
+                                for field in subgroup:
+                                    addr = f"{subgroup.name}/{field}"
+                                    msg = f"{plan_name} {mode} {addr}"
+                                    self.assertIn(addr, nxroot, msg)
+                                    compare(
+                                        np.atleast_1d(nxroot[addr][()]),
+                                        np.atleast_1d(subgroup[field][()]),
+                                        msg)
+
+    def test_external_data(self):
+        for mode in apstools.filewriters.NEXUS_EXTERNAL_DATA_MODES:
+            for num_files in (1, 2):
+                path = os.path.join(self.tempdir, f"{mode}-{num_files}")
+                os.mkdir(path)
+                documents, images = external_image_run(path, num_files=num_files)
+                callback = apstools.filewriters.NXWriter()
+                callback.external_data = mode
+                callback.file_name = os.path.join(path, "nexus.hdf")
+                msg = f"external_data={mode}, {num_files} file(s)"
+
+                if mode == "copy" and num_files > 1:
+                    with self.assertRaises(ValueError, msg=msg):
+                        write_stream(callback, documents)
+                    continue
+
+                with Capture_stderr():
+                    write_stream(callback, documents)
+                with h5py.File(callback.file_name, "r") as nxroot:
+                    addr = "/entry/instrument/bluesky/streams/primary/adsim_image/value"
+                    self.assertIn(addr, nxroot, msg)
+                    link = nxroot.get(addr, getlink=True)
+                    ds = nxroot[addr]
+                    if mode == "copy":
+                        self.assertIsInstance(link, h5py.HardLink, msg)
+                        self.assertFalse(ds.is_virtual, msg)
+                    elif mode == "link" and num_files == 1:
+                        self.assertIsInstance(link, h5py.ExternalLink, msg)
+                    else:
+                        self.assertTrue(ds.is_virtual, msg)
+                    self.assertTrue(np.array_equal(ds[()], images), msg)
+                    self.assertTrue(
+                        np.array_equal(nxroot["/entry/data/adsim_image"][()], images),
+                        msg)
+
+        callback.external_data = "no such mode"
+        with self.assertRaises(ValueError):
+            write_stream(callback, documents)
+
+    def test_external_copy(self):
+        frame_shape = (4, 5)
+        frame_bytes = 2 * np.prod(frame_shape)  # uint16
+        for compression, limit in (
+                (None, 1),                  # one frame at a time
+                ("lzf", 2 * frame_bytes),
+                ("gzip", 10 * frame_bytes),
+                (9, 10 * 1024 * 1024),
+        ):
+            path = os.path.join(self.tempdir, f"copy-{compression}")
+            os.mkdir(path)
+            documents, images = external_image_run(
+                path, num_files=1, num_frames=7, frame_shape=frame_shape)
+            callback = apstools.filewriters.NXWriter()
+            callback.external_compression = compression
+            callback.external_memory_limit = limit
+            callback.file_name = os.path.join(path, "nexus.hdf")
+            msg = f"compression={compression}, limit={limit}"
+            with Capture_stderr():
+                write_stream(callback, documents)
+            with h5py.File(callback.file_name, "r") as nxroot:
+                ds = nxroot["/entry/instrument/bluesky/streams/primary/adsim_image/value"]
+                self.assertEqual(ds.compression, {9: "gzip"}.get(compression, compression), msg)
+                if compression == 9:
+                    self.assertEqual(ds.compression_opts, 9, msg)
+                self.assertEqual(ds.chunks, (1,) + frame_shape, msg)
+                self.assertEqual(ds.dtype, images.dtype, msg)
+                self.assertTrue(np.array_equal(ds[()], images), msg)
+
+        # NumFramesChunks larger than the number of frames captured
+        path = os.path.join(self.tempdir, "copy-short")
+        os.mkdir(path)
+        documents, images = external_image_run(
+            path, num_files=1, num_frames=3, frame_shape=frame_shape, chunk_frames=10)
+        callback = apstools.filewriters.NXWriter()
+        callback.file_name = os.path.join(path, "nexus.hdf")
+        with Capture_stderr():
+            write_stream(callback, documents)
+        with h5py.File(callback.file_name, "r") as nxroot:
+            ds = nxroot["/entry/instrument/bluesky/streams/primary/adsim_image/value"]
+            self.assertEqual(ds.chunks, (3,) + frame_shape)
+            self.assertTrue(np.array_equal(ds[()], images))
+
+        callback = apstools.filewriters.NXWriter()
+        callback.external_compression = "no such filter"
+        callback.file_name = os.path.join(path, "bad.hdf")
+        with self.assertRaises(ValueError):
+            write_stream(callback, documents)
+
+    def test_waveform_shape(self):
+        for rows, dtype in (
+                # waveform with NORD < NELM: rows are not the descriptor shape
+                ([[1, 2, 3], [4, 5, 6], [7, 8, 9]], np.int64),
+                # later rows do not fit the first (streamed) dataset
+                ([[1, 2, 3], [4.5, 5, 6], [7, 8, 9]], np.float64),
+                ([[1, 2, 3], [4, 5, 6, 7, 8], [9]], None),     # ragged
+        ):
+            for streaming in (False, True):
+                msg = f"streaming={streaming} rows={rows}"
+                callback = apstools.filewriters.NXWriter()
+                callback.streaming = streaming
+                callback.file_name = os.path.join(self.tempdir, "waveform.hdf")
+                with Capture_stdout(), Capture_stderr():
+                    write_stream(callback, waveform_run(rows, shape=(5,)))
+                with h5py.File(callback.file_name, "r") as nxroot:
+                    group = nxroot["/entry/instrument/bluesky/streams/primary/value"]
+                    self.assertEqual(group["time"].shape, (3,), msg)
+                    if dtype is None:
+                        continue    # ragged: not written
+                    self.assertEqual(group["value"].dtype, dtype, msg)
+                    self.assertTrue(np.array_equal(group["value"][()], rows), msg)
+
+        # two descriptors in one stream: reported at stop, not during the run
+        documents = waveform_run([[1, 2, 3]])
+        descriptor = dict(documents[1][1], uid="descriptor-2")
+        documents.insert(2, ["descriptor", descriptor])
+        callback = apstools.filewriters.NXWriter()
+        callback.streaming = True
+        callback.file_name = os.path.join(self.tempdir, "two-descriptors.hdf")
+        with Capture_stdout(), Capture_stderr():
+            for tag, doc in documents[:-1]:
+                callback.receiver(tag, doc)
+            with self.assertRaises(ValueError):
+                callback.receiver(*documents[-1])
+        self.assertEqual(callback._stream_datasets, {})
+
     def test_make_file_name(self):
         callback = apstools.filewriters.NXWriter()
 
@@ -407,6 +884,198 @@ class Test_SpecWriterCallback(MyTestBase):
             self.assertEqual(specwriter.scan_id, s, f"scan_id set to {n}, actually {s}")
             self.assertEqual(RE.md["scan_id"], s, f"RE.md['scan_id'] set to {n}, actually {s}")
 
+    def test_streaming(self):
+        def scan_text(filename):
+            with open(filename) as f:
+                buf = f.read()
+            return buf[buf.find("\n#S "):]
+
+        for plan_name in self.db:
+            buffered_file = os.path.join(self.tempdir, f"{plan_name}_buffered.dat")
+            streamed_file = os.path.join(self.tempdir, f"{plan_name}_streamed.dat")
+            buffered = apstools.filewriters.SpecWriterCallback(
+                filename=buffered_file)
+            streamed = apstools.filewriters.SpecWriterCallback(
+                filename=streamed_file, streaming=True)
+
+            for tag, doc in self.db[plan_name]:
+                buffered.receiver(tag, doc)
+                streamed.receiver(tag, doc)
+                if tag == "event":
+                    # rows are not buffered in memory
+                    for v in streamed.data.values():
+                        self.assertEqual(len(v), 0, plan_name)
+
+            self.assertIsNone(streamed._stream_file, plan_name)
+            self.assertEqual(
+                scan_text(streamed_file),
+                scan_text(buffered_file),
+                plan_name)
+
+        # same uid cannot be written again
+        streamed = apstools.filewriters.SpecWriterCallback(
+            filename=streamed_file, streaming=True)
+        with self.assertRaises(ValueError):
+            for tag, doc in self.db[plan_name]:
+                streamed.receiver(tag, doc)
+
+    def test_scan_index(self):
+        testfile = os.path.join(self.tempdir, "indexed.dat")
+        specwriter = apstools.filewriters.SpecWriterCallback(filename=testfile)
+        uids = {}
+        for plan_name in "tune_mr tune_ar count".split():
+            write_stream(specwriter, self.db[plan_name])
+            uids[plan_name] = specwriter.uid
+
+        index_file = testfile + "." + apstools.filewriters.SPEC_INDEX_FILE_EXTENSION
+        self.assertTrue(os.path.exists(index_file))
+
+        index = apstools.filewriters.SpecScanIndex(testfile)
+        self.assertEqual(len(index), 3)
+        self.assertEqual(index.size, os.path.getsize(testfile))
+        sdf = spec2nexus.spec.SpecDataFile(testfile)
+        self.assertEqual(
+            sorted(index.scan_numbers(), key=float),
+            sdf.getScanNumbers())
+        with open(testfile, "rb") as f:
+            for plan_name, uid in uids.items():
+                self.assertIn(uid, index)
+                scan_number = index.uids[uid]
+                f.seek(index.offsets[scan_number])
+                line = f.readline().decode()
+                self.assertTrue(line.startswith(f"#S {scan_number} "), plan_name)
+                self.assertIn(plan_name, line)
+
+        # same uid cannot be written again
+        with self.assertRaises(ValueError):
+            specwriter.write_scan()
+
+        # appended by another writer: index is updated
+        with open(testfile, "a") as f:
+            f.write("\n#S 108  other()\n#MD uid = abcdef\n#L a b\n1 2\n")
+        index.refresh()
+        self.assertEqual(len(index), 4)
+        self.assertEqual(index.uids["abcdef"], "108.1")
+        self.assertEqual(specwriter.usefile(testfile), 108)
+
+        # file replaced: index is rebuilt
+        with open(testfile, "w") as f:
+            f.write("#F x\n#E 1\n#D x\n#C x\n\n#S 3  replaced()\n#L a b\n1 2\n")
+        index.refresh()
+        self.assertEqual(index.scan_numbers(), ["3"])
+        self.assertNotIn(uids["count"], index)
+        self.assertEqual(specwriter.usefile(testfile), 3)
+
+    def test_file_reader(self):
+        testfile = os.path.join(self.tempdir, "reader.dat")
+        specwriter = apstools.filewriters.SpecWriterCallback(filename=testfile)
+        for plan_name in "tune_mr tune_ar count snapshot".split():
+            write_stream(specwriter, self.db[plan_name])
+
+        sdf = spec2nexus.spec.SpecDataFile(testfile)
+        with apstools.filewriters.SpecDataFileReader(testfile) as reader:
+            self.assertEqual(len(reader), 4)
+            self.assertEqual(
+                sorted(reader.scan_numbers(), key=float),
+                sdf.getScanNumbers())
+            for scan_number in reader.scan_numbers():
+                scan = sdf.getScan(scan_number)
+                self.assertTrue(
+                    reader.get_scan_text(scan_number).startswith(
+                        f"#S {scan_number} "))
+                self.assertEqual(reader.get_scan_labels(scan_number), scan.L)
+                data = reader.get_scan_data(scan_number)
+                self.assertEqual(list(data.keys()), scan.L)
+                for k, v in data.items():
+                    self.assertEqual(v.dtype, float)
+                    self.assertEqual(list(v), scan.data[k], k)
+
+        with self.assertRaises(IOError):
+            apstools.filewriters.SpecDataFileReader(testfile + "-no-such-file")
+
+    def test_event_page(self):
+        def scan_text(filename):
+            with open(filename) as f:
+                buf = f.read()
+            return buf[buf.find("\n#S "):]
+
+        for plan_name, document_set in self.db.items():
+            pages = as_event_pages(document_set)
+            self.assertIn("event_page", [tag for tag, doc in pages])
+            bulk = [
+                ("bulk_events", {doc["descriptor"]: list(event_model.unpack_event_page(doc))})
+                if tag == "event_page" else (tag, doc)
+                for tag, doc in pages
+            ]
+            results = {}
+            for mode, stream, streaming in (
+                    ("event", document_set, False),
+                    ("event_page", pages, False),
+                    ("streamed_page", pages, True),
+                    ("bulk_events", bulk, False),
+            ):
+                testfile = os.path.join(self.tempdir, f"{plan_name}_{mode}.dat")
+                specwriter = apstools.filewriters.SpecWriterCallback(
+                    filename=testfile, streaming=streaming)
+                write_stream(specwriter, stream)
+                results[mode] = scan_text(testfile)
+            for mode in "event_page streamed_page bulk_events".split():
+                self.assertEqual(results[mode], results["event"], f"{plan_name} {mode}")
+
+    def test_descriptor_precision(self):
+        testfile = os.path.join(self.tempdir, "precision.dat")
+        specwriter = apstools.filewriters.SpecWriterCallback(
+            filename=testfile, use_descriptor_precision=True)
+        write_stream(specwriter, self.db["tune_mr"])
+        self.assertEqual(specwriter.precisions["I0_USAXS"], 0)
+        self.assertEqual(specwriter.precisions["m_stage_r_user_setpoint"], 7)
+
+        sdf = spec2nexus.spec.SpecDataFile(testfile)
+        scan = sdf.getScan(108)
+        self.assertEqual(scan.data["m_stage_r_user_setpoint"][0], 8.826977)
+        self.assertEqual(scan.data["m_stage_r_user_setpoint"][1], 8.8268437)
+        # no precision given for Epoch_float
+        self.assertEqual(scan.data["Epoch_float"][0], 1.2477173805236816)
+
+        # text is reported in #U lines
+        specwriter.newfile(os.path.join(self.tempdir, "text.dat"))
+        write_stream(specwriter, self.db["snapshot"])
+        with open(specwriter.spec_filename) as f:
+            buf = f.read()
+        self.assertIn("\n#U 0 ", buf)
+
+    def test_mixed_type_columns(self):
+        def baseline(columns):
+            # the cell-by-cell formatting of release 1.3.x
+            lines = []
+            for i, row in enumerate(zip(*columns.values())):
+                str_data = {}
+                s = []
+                for k, datum in zip(columns, row):
+                    if isinstance(datum, str):
+                        str_data[k] = datum
+                        datum = i
+                    s.append(str(datum))
+                lines.append(" ".join(s))
+                for k, v in str_data.items():
+                    lines.append(f"#U {i} {k} {v}")
+            return lines
+
+        specwriter = apstools.filewriters.SpecWriterCallback(
+            filename=os.path.join(self.tempdir, "mixed.dat"))
+        columns = dict(
+            a=[1, 2],
+            b=["x", 3.0],       # str and number
+            c=[1, 2.5],         # int and float
+            d=["t", "u"],
+            e=[0.1, 0.25],
+        )
+        specwriter.data = dict(columns)
+        received = specwriter._format_data_rows(0, list(columns.values()))
+        self.assertEqual(received, baseline(columns))
+        self.assertEqual(received[0], "1 0 1 0 0.1")
+        self.assertEqual(received[3], "2 3.0 2.5 1 0.25")
+
     def test__rebuild_scan_command(self):
         from apstools.filewriters import _rebuild_scan_command
 
@@ -3,9 +3,14 @@
 simple unit tests for this package
 """
 
+import datetime
 import ophyd.sim
 import os
+import pandas
+import shutil
 import sys
+import tempfile
+import threading
 import time
 import unittest
 
@@ -73,6 +78,127 @@ class Test_Utils(unittest.TestCase):
             for v in str(table).strip().splitlines()])
         self.assertEqual(received, expected)    # fails since timestamps do not match
 
+    def test_device_read2table_timeout(self):
+        release = threading.Event()
+
+        class StuckSignal(ophyd.Signal):
+            def read(self):
+                release.wait(5)
+                return super().read()
+
+        class MyDevice(ophyd.Device):
+            fine = ophyd.Component(ophyd.Signal, value=1)
+            stuck = ophyd.Component(StuckSignal, value=2)
+
+        device = MyDevice(name="device")
+        t0 = time.time()
+        table = APS_utils.device_read2table(device, timeout=0.2, printing=False)
+        self.assertLess(time.time() - t0, 2, "one deadline, does not stall")
+        release.set()
+        self.assertEqual(
+            [row[:2] for row in table.rows],
+            [("device_fine", 1), ("device_stuck", "TIMEOUT")])
+
+    def test_pv_value_cache(self):
+        class CountingSignal(ophyd.Signal):
+            reads = 0
+
+            def read(self):
+                CountingSignal.reads += 1
+                return super().read()
+
+        signals = [CountingSignal(name=f"s{i}", value=i) for i in range(3)]
+        cache = APS_utils.PVValueCache(max_size=2)
+        self.assertEqual(cache.get(signals[0]), 0)
+        self.assertEqual(cache.get(signals[0]), 0)
+        self.assertEqual(CountingSignal.reads, 1, "second value from memory")
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+        signals[0].put(10)      # as from the monitor
+        reading = cache.read(signals[0])
+        self.assertEqual(reading["value"], 10)
+        self.assertEqual(reading["timestamp"], signals[0].timestamp)
+        self.assertEqual(CountingSignal.reads, 1)
+
+        # least recently used is removed (and unsubscribed)
+        cache.get(signals[1])
+        cache.get(signals[0])
+        cache.get(signals[2])
+        self.assertEqual(len(cache), 2)
+        self.assertNotIn(signals[1], cache)
+        self.assertEqual(
+            len(signals[1]._callbacks[signals[1].SUB_VALUE]), 0, "unsubscribed")
+        signals[1].put(11)
+        self.assertEqual(cache.get(signals[1]), 11)
+
+        # stale values are read again
+        cache = APS_utils.PVValueCache(max_age=0.05)
+        cache.get(signals[0])
+        reads = CountingSignal.reads
+        time.sleep(0.1)
+        cache.get(signals[0])
+        self.assertEqual(CountingSignal.reads, reads + 1)
+
+        # idle signals are removed
+        cache.idle_timeout = 0.05
+        time.sleep(0.1)
+        cache.prune()
+        self.assertEqual(len(cache), 0)
+
+        # used by the inspection tools
+        class MyDevice(ophyd.Device):
+            a = ophyd.Component(CountingSignal, value=1)
+            b = ophyd.Component(CountingSignal, value=2)
+
+        device = MyDevice(name="device")
+        cache = APS_utils.enable_pv_cache()
+        try:
+            reads = CountingSignal.reads
+            for i in range(3):
+                table = APS_utils.device_read2table(device, printing=False)
+            self.assertEqual(CountingSignal.reads, reads + 2, "read once")
+            self.assertEqual([row[1] for row in table.rows], [1, 2])
+            device.b.put(3)
+            table = APS_utils.device_read2table(device, printing=False)
+            self.assertEqual([row[1] for row in table.rows], [1, 3])
+        finally:
+            APS_utils.disable_pv_cache()
+        self.assertEqual(len(cache), 0)
+        table = APS_utils.device_read2table(device, printing=False)
+        self.assertEqual(CountingSignal.reads, reads + 4, "no cache")
+
+    def test_bulk_call(self):
+        def slow(item):
+            if item == "disconnected":
+                raise TimeoutError("no connection")
+            time.sleep(0.1)
+            return item.upper()
+
+        items = "one two disconnected four".split() * 5
+        t0 = time.time()
+        results = APS_utils._bulk_call(slow, items, timeout=5, workers=20)
+        self.assertLess(time.time() - t0, 1, "concurrent")
+        self.assertEqual(
+            results,
+            ["TIMEOUT" if v == "disconnected" else v.upper() for v in items])
+        self.assertEqual(APS_utils._bulk_call(slow, [], timeout=1), [])
+
+        with self.assertRaises(ZeroDivisionError):
+            APS_utils._bulk_call(lambda item: 1 / item, [1, 0])
+
+    def test_ophyd_structure_paths(self):
+        from apstools.synApps.sscan import SscanDevice
+        APS_utils._ophyd_structure_paths.cache_clear()
+        paths = APS_utils._ophyd_structure_paths(SscanDevice)
+        self.assertIn("scan1.positioners.p1.readback_pv", paths)
+        self.assertIn("scan4.detectors.d70.input_pv", paths)
+        self.assertEqual(len(paths), len(set(paths)))
+        self.assertIs(APS_utils._ophyd_structure_paths(SscanDevice), paths)
+        self.assertGreater(APS_utils._ophyd_structure_paths.cache_info().hits, 0)
+        self.assertEqual(
+            APS_utils._ophyd_structure_paths(ophyd.sim.SynAxis), (),
+            "no EPICS signals")
+
     def test_dictionary_table(self):
         md = {
             'login_id': 'jemian:wow.aps.anl.gov',
@@ -203,6 +329,91 @@ class Test_Utils(unittest.TestCase):
                 self.assertTrue(k in rr, msg)
         self.assertEqual(num, len(table.rows))
 
+    def test_wait_for_connections(self):
+        class LateSignal(ophyd.Signal):
+            """connects after ``delay`` (s), or never"""
+
+            def __init__(self, *args, delay=None, **kwargs):
+                super().__init__(*args, **kwargs)
+                self._metadata["connected"] = False
+                if delay is not None:
+                    threading.Timer(delay, self.connect).start()
+
+            def connect(self):
+                self._metadata["connected"] = True
+                self._run_metadata_callbacks()
+
+        signals = [
+            LateSignal(name=f"s{i}", delay=0.05 * (i % 4))
+            for i in range(40)
+        ]
+        signals[0].connect()    # already connected
+        latencies = []
+        t0 = time.time()
+        waiting = APS_utils._wait_for_connections(signals, 5, latencies=latencies)
+        self.assertLess(time.time() - t0, 2, "returns when all connect")
+        self.assertEqual(waiting, [])
+        self.assertEqual(len(latencies), len(signals))
+
+        signals = [LateSignal(name="early", delay=0), LateSignal(name="never")]
+        t0 = time.time()
+        waiting = APS_utils._wait_for_connections(signals, 0.3)
+        self.assertGreaterEqual(time.time() - t0, 0.3, "waits until deadline")
+        self.assertEqual(waiting, signals[1:])
+
+        self.assertEqual(APS_utils._wait_for_connections([], 5), [])
+
+    def test_run_statistics(self):
+        def ts(*args):
+            return datetime.datetime(*args).timestamp()
+
+        runs = pandas.DataFrame(
+            [
+                # plan_name, time, stop_time, exit_status
+                ("scan", ts(2020, 4, 30, 10, 15), ts(2020, 4, 30, 10, 45), "success"),
+                ("scan", ts(2020, 4, 30, 10, 50), ts(2020, 4, 30, 11, 20), "abort"),
+                ("count", ts(2020, 4, 30, 11, 0), ts(2020, 4, 30, 11, 6), "success"),
+                ("scan", ts(2020, 5, 1, 0, 0), ts(2020, 5, 1, 1, 0), "success"),
+                ("count", ts(2020, 12, 31, 23, 0), None, None),  # not ended
+            ],
+            columns="plan_name time stop_time exit_status".split(),
+        )
+
+        stats = APS_utils.run_statistics(runs, "hour")
+        row = stats.loc[(pandas.Timestamp(2020, 4, 30, 10), "scan")]
+        self.assertEqual(row["runs"], 2)
+        self.assertAlmostEqual(row["duration_total"], 3600)
+        self.assertAlmostEqual(row["duration_max"], 1800)
+        self.assertAlmostEqual(row["duty_cycle"], 1)
+        self.assertAlmostEqual(row["success"], 0.5)
+        self.assertAlmostEqual(row["abort"], 0.5)
+
+        stats = APS_utils.run_statistics(runs, "day")
+        row = stats.loc[(pandas.Timestamp(2020, 4, 30), "count")]
+        self.assertAlmostEqual(row["duty_cycle"], 360 / 86400)
+
+        stats = APS_utils.run_statistics(runs, "week")     # starts Monday
+        self.assertEqual(
+            sorted(set(stats.index.get_level_values("period"))),
+            [pandas.Timestamp(2020, 4, 27), pandas.Timestamp(2020, 12, 28)])
+        self.assertEqual(stats.loc[(pandas.Timestamp(2020, 4, 27), "scan")]["runs"], 3)
+
+        stats = APS_utils.run_statistics(runs, "cycle")
+        self.assertEqual(
+            list(stats.index),
+            [("2020-1", "count"), ("2020-1", "scan"), ("2020-2", "scan"), ("2020-3", "count")])
+        row = stats.loc[("2020-3", "count")]
+        self.assertEqual(row["runs"], 1)
+        self.assertEqual(row["none"], 1)
+        self.assertTrue(pandas.isnull(row["duration_total"]) or row["duration_total"] == 0)
+        cycle_1 = (ts(2020, 5, 1) - ts(2020, 1, 1))
+        duty = stats["duty_cycle"].groupby(level="period").sum()
+        self.assertAlmostEqual(duty["2020-1"], (3600 + 360) / cycle_1)
+
+        self.assertEqual(len(APS_utils.run_statistics(runs[:0])), 0)
+        with self.assertRaises(ValueError):
+            APS_utils.run_statistics(runs, "fortnight")
+
     def test_show_ophyd_symbols(self):
         sims = ophyd.sim.hw().__dict__
         # wont_show = ("flyer1", "flyer2", "new_trivial_flyer", "trivial_flyer")
@@ -261,6 +472,106 @@ class Test_With_Database(unittest.TestCase):
             40,
             "command row should be 40 char or less")
 
+    def test_run_index(self):
+        tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tempdir, ignore_errors=True)
+        index = APS_utils.RunIndex(
+            os.path.join(tempdir, "runs.sqlite"), db=self.db,
+            keys=["detectors", "iso8601", "purpose"])
+        self.assertEqual(len(index), 0)
+        self.assertIsNone(index.watermark)
+        self.assertEqual(index.sync(), len(self.db.v2))
+        self.assertEqual(len(index), len(self.db.v2))
+        self.assertLess(index.sync(), 3, "only since the watermark")
+        self.assertEqual(len(index), len(self.db.v2))
+
+        # (order of runs in the test catalog is not by time)
+        for kwargs in (
+                dict(num=100),
+                dict(num=100, show_command=False, keys=["detectors"]),
+                dict(num=100, plan_name="count", exit_status="success"),
+        ):
+            expected = APS_utils.listruns(printing=False, db=self.db, **kwargs)
+            received = APS_utils.listruns(printing=False, index=index, **kwargs)
+            self.assertEqual(received.labels, expected.labels, str(kwargs))
+            self.assertEqual(sorted(received.rows), sorted(expected.rows), str(kwargs))
+        table = APS_utils.listruns(printing=False, index=index, num=10)
+        self.assertEqual(len(table.rows), 10)
+        times = [row[1] for row in table.rows]
+        self.assertEqual(times, sorted(times, reverse=True), "most recent first")
+        with self.assertRaises(ValueError):
+            APS_utils.listruns(printing=False, index=index, keys=["not indexed"])
+        with self.assertRaises(ValueError):
+            index.search(not_indexed="value")
+
+        with Capture_stdout() as expected:
+            expected_stats = APS_utils.summarize_runs(db=self.db, period="day")
+        with Capture_stdout() as received:
+            received_stats = APS_utils.summarize_runs(index=index, period="day")
+        self.assertEqual(str(received), str(expected))
+        self.assertTrue(received_stats.equals(expected_stats))
+        self.assertEqual(received_stats["runs"].sum(), len(self.db.v2))
+
+        table = APS_utils.print_snapshot_list(self.db, printing=False, index=index)
+        self.assertEqual(len(table.rows), 0)
+
+        index = APS_utils.RunIndex(index.filename, db=self.db, keys=["detectors"])
+        self.assertEqual(index.sync(), len(self.db.v2), "keys changed: rebuild")
+
+    def test_run_index_open_runs(self):
+        tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tempdir, ignore_errors=True)
+        index = APS_utils.RunIndex(
+            os.path.join(tempdir, "runs.sqlite"), open_window=3600)
+
+        def add_run(uid, t, stop_time):
+            with index._connect() as conn:
+                conn.execute(
+                    "INSERT INTO runs VALUES (?, ?, 1, 'count', NULL, ?, 1, '', '{}')",
+                    (uid, t, stop_time))
+
+        add_run("orphan", 1000.0, None)     # session was killed
+        self.assertEqual(index.watermark, 1000.0)
+        add_run("ended", 1000.0 + 86400, 1000.0 + 86410)
+        self.assertEqual(index.watermark, 1000.0 + 86400, "orphan is ignored")
+        add_run("running", 1000.0 + 86500, None)
+        add_run("latest", 1000.0 + 86600, 1000.0 + 86610)
+        self.assertEqual(index.watermark, 1000.0 + 86500, "recent open run")
+
+    def test_fetch_runs(self):
+        cat = self.db.v2
+        expected = list(cat)
+        for workers in (1, 4):
+            latencies = []
+            runs = list(APS_utils.fetch_runs(cat, workers=workers, latencies=latencies))
+            self.assertEqual([run[0] for run in runs], expected, "catalog order")
+            self.assertEqual(len(latencies), len(expected))
+            for uid, start, stop, latency in runs:
+                self.assertEqual(start["uid"], uid)
+                self.assertEqual(stop["run_start"], uid)
+
+        class SlowCatalog(dict):
+            """reading each run waits for the database"""
+            def __getitem__(self, uid):
+                time.sleep(0.02)
+                return super().__getitem__(uid)
+
+        slow = SlowCatalog({uid: cat[uid] for uid in expected[:40]})
+        t0 = time.time()
+        runs = APS_utils.fetch_runs(slow, workers=8)
+        self.assertEqual([run[0] for run in runs], expected[:40])
+        self.assertLess(time.time() - t0, 0.02 * 40 / 2, "concurrent reads")
+
+        runs = APS_utils.fetch_runs(slow, workers=8)
+        self.assertEqual(next(runs)[0], expected[0])
+        runs.close()        # stop reading, ignore runs read ahead
+
+        table = APS_utils._latency_histogram([0.0005, 0.015, 0.012, 7])
+        self.assertEqual(
+            table.rows,
+            [("0 - 1", 1), ("10 - 20", 2), ("5000 - ...", 1)]
+        )
+
     def test_replay(self):
         replies = []
         def cb1(key, doc):
@@ -300,6 +611,50 @@ class Test_With_Database(unittest.TestCase):
             self.assertLess(v - previous, 0, msg)
             previous = v
 
+        # several callbacks, one pass, with or without reading ahead
+        headers = self.db(plan_name="count")
+        expected = [(k, doc) for h in headers for k, doc in h.documents()]
+        for prefetch in (0, 1, APS_utils.REPLAY_PREFETCH):
+            replies, others = [], []
+            APS_utils.replay(
+                headers,
+                callback=[
+                    lambda k, doc: replies.append((k, doc)),
+                    lambda k, doc: others.append(k),
+                ],
+                prefetch=prefetch)
+            self.assertEqual(len(replies), len(expected), prefetch)
+            self.assertEqual([k for k, doc in replies], others, prefetch)
+            self.assertEqual(
+                sorted([k for k, doc in replies]),
+                sorted([k for k, doc in expected]),
+                prefetch)
+            self.assertEqual(
+                {doc["uid"] for k, doc in replies if k == "start"},
+                {doc["uid"] for k, doc in expected if k == "start"},
+                prefetch)
+
+        def cb3(key, doc):
+            if key == "event":
+                raise RuntimeError("callback failed")
+
+        threads = threading.active_count()
+        with self.assertRaises(RuntimeError):
+            APS_utils.replay(headers, callback=cb3)
+        self.assertEqual(threading.active_count(), threads, "stopped reading")
+
+        # pacing: original timing, faster
+        h = self.db[-1]
+        duration = h.stop["time"] - h.start["time"]
+        speed = duration / 0.5      # replay in about 0.5 s
+        t0 = time.time()
+        APS_utils.replay(h, callback=cb2, speed=speed)
+        elapsed = time.time() - t0
+        self.assertGreater(elapsed, 0.9 * duration / speed)
+        self.assertLess(elapsed, duration / speed + 1)
+        with self.assertRaises(ValueError):
+            APS_utils.replay(h, callback=cb2, speed=0)
+
 
 def suite(*args, **kw):
     test_list = [